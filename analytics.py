@@ -0,0 +1,133 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, timezone
+from typing import List, Optional
+from app.database import get_async_db
+from app.models.user import User
+from app.schemas.returns import PortfolioReturns, CompositeReturns, HouseholdReturns
+from app.schemas.risk_metrics import PortfolioRisk
+from app.core.auth import check_permissions
+from app.core.responses import SerializedRoute
+from app.routers.households import get_org_household
+from app.routers.portfolios import get_org_portfolio
+from app.services.performance import (
+    composite_returns, household_portfolio_ids, organization_portfolio_ids, portfolio_returns
+)
+from app.services.risk import portfolio_risk
+
+router = APIRouter(route_class=SerializedRoute)
+
+def resolve_period(start: Optional[date], end: Optional[date]):
+    """Default the period end to today and check its order"""
+    end = end or datetime.now(timezone.utc).date()
+    if start and start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Period start must not be after its end"
+        )
+    return start, end
+
+def no_history(detail: str = "No transaction history for this period"):
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
+
+@router.get("/portfolios/returns", response_model=List[PortfolioReturns])
+async def get_portfolios_returns(
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    client_id: Optional[str] = Query(None),
+    current_user: User = Depends(check_permissions(["portfolios:view", "reports:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Time- and money-weighted returns of every active portfolio in the
+    organization (or of one client), computed in a single batch.
+    
+    `from` defaults to each portfolio's inception and `to` to today.
+    """
+    start, end = resolve_period(start, end)
+    portfolio_ids = await db.run_sync(organization_portfolio_ids, current_user.organization_id, client_id)
+    return await db.run_sync(portfolio_returns, portfolio_ids, start, end)
+
+@router.get("/portfolios/{portfolio_id}/returns", response_model=PortfolioReturns)
+async def get_portfolio_returns(
+    portfolio_id: str,
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    current_user: User = Depends(check_permissions(["portfolios:view", "reports:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Time- and money-weighted returns of one portfolio"""
+    start, end = resolve_period(start, end)
+    await get_org_portfolio(db, portfolio_id, current_user.organization_id)
+    
+    results = await db.run_sync(portfolio_returns, [portfolio_id], start, end)
+    if not results:
+        raise no_history()
+    return results[0]
+
+@router.get("/households/{household_id}/returns", response_model=HouseholdReturns)
+async def get_household_returns(
+    household_id: str,
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    current_user: User = Depends(check_permissions(["portfolios:view", "reports:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Returns of all the household members' portfolios taken together"""
+    start, end = resolve_period(start, end)
+    await get_org_household(db, household_id, current_user.organization_id)
+    
+    portfolio_ids = await db.run_sync(household_portfolio_ids, household_id)
+    result = await db.run_sync(composite_returns, portfolio_ids, start, end)
+    if result is None:
+        raise no_history()
+    return {"household_id": household_id, **result}
+
+@router.get("/organization/returns", response_model=CompositeReturns)
+async def get_organization_returns(
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    current_user: User = Depends(check_permissions(["portfolios:view", "reports:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Returns of every active portfolio in the organization taken together"""
+    start, end = resolve_period(start, end)
+    portfolio_ids = await db.run_sync(organization_portfolio_ids, current_user.organization_id)
+    result = await db.run_sync(composite_returns, portfolio_ids, start, end)
+    if result is None:
+        raise no_history()
+    return result
+
+@router.get("/portfolios/risk", response_model=List[PortfolioRisk])
+async def get_portfolios_risk(
+    client_id: Optional[str] = Query(None),
+    confidence: float = Query(0.95, ge=0.5, le=0.999),
+    lookback_days: int = Query(365, ge=30, le=3650),
+    as_of: Optional[date] = Query(None),
+    current_user: User = Depends(check_permissions(["portfolios:view", "reports:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Volatility, VaR/CVaR and exposures of every active portfolio with
+    holdings in the organization (or of one client), scored in batches
+    against one covariance matrix from the stored price history"""
+    return await db.run_sync(
+        portfolio_risk, current_user.organization_id, None, client_id, confidence, lookback_days, as_of
+    )
+
+@router.get("/portfolios/{portfolio_id}/risk", response_model=PortfolioRisk)
+async def get_portfolio_risk(
+    portfolio_id: str,
+    confidence: float = Query(0.95, ge=0.5, le=0.999),
+    lookback_days: int = Query(365, ge=30, le=3650),
+    as_of: Optional[date] = Query(None),
+    current_user: User = Depends(check_permissions(["portfolios:view", "reports:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Risk figures of one portfolio"""
+    await get_org_portfolio(db, portfolio_id, current_user.organization_id)
+    
+    results = await db.run_sync(
+        portfolio_risk, current_user.organization_id, [portfolio_id], None, confidence, lookback_days, as_of
+    )
+    if not results:
+        raise no_history("Portfolio has no holdings")
+    return results[0]
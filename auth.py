@@ -1,12 +1,17 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, List
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.models.user import User
+from app.core.cache import TTLCache
+from app.core.entity_cache import cache_model, entity_cache
 import os
 
 # Security configuration
@@ -14,12 +19,61 @@ SECRET_KEY = os.getenv("JWT_SECRET", "your-super-secret-jwt-key-change-in-produc
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Authenticated user cache. With the entity cache's shared tier configured
+# (ENTITY_CACHE_URL), every lookup checks the user's version there, so a
+# change made on any worker applies at once. Without it, changes reach other
+# workers only when their copy expires: keep the TTL short.
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "15"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+
+# Maximum number of bcrypt operations running at once
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt releases the GIL, so a small thread pool runs hashes in parallel
+# without blocking the event loop; extra requests queue for a free worker
+_password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_CONCURRENCY,
+    thread_name_prefix="password-hash"
+)
+
 # JWT Bearer scheme
 security = HTTPBearer()
 
+class UserPrincipal:
+    """Read-only snapshot of an authenticated user, shared between requests"""
+    __slots__ = (
+        "id", "organization_id", "email", "first_name", "last_name",
+        "role", "permissions", "is_active", "last_login", "created_at"
+    )
+    
+    def __init__(self, user: User):
+        self.id = user.id
+        self.organization_id = user.organization_id
+        self.email = user.email
+        self.first_name = user.first_name
+        self.last_name = user.last_name
+        self.role = user.role
+        self.permissions = frozenset(user.permissions or ())
+        self.is_active = user.is_active
+        self.last_login = user.last_login
+        self.created_at = user.created_at
+
+# (principal, shared version) pairs keyed by user id (the JWT "sub")
+user_cache = TTLCache(maxsize=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+def invalidate_users(user_ids: List[str]):
+    """Drop cached principals, e.g. after deactivation or a permission change"""
+    for user_id in user_ids:
+        user_cache.delete(user_id)
+
+# Updated or deleted users are dropped once the transaction commits, and
+# their shared version is bumped for the other workers
+cache_model(User, "user")
+entity_cache.on_invalidate("user", invalidate_users)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against a hashed password"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -28,6 +82,16 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing pool instead of the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the hashing pool instead of the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -54,8 +118,8 @@ def verify_token(token: str) -> dict:
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_async_db)
+) -> UserPrincipal:
     """Get the current authenticated user"""
     token = credentials.credentials
     payload = verify_token(token)
@@ -67,33 +131,45 @@ async def get_current_user(
             detail="Invalid authentication credentials"
         )
     
+    # Read before loading, so a change committed meanwhile shows as newer
+    version = await entity_cache.shared_version("user", user_id)
+    cached = user_cache.get(user_id)
+    if cached is not None and (version is None or cached[1] == version):
+        return cached[0]
+    
     # Get user from database
-    user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+    result = await db.execute(select(User).where(User.id == user_id, User.is_active == True))
+    user = result.scalars().first()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found or inactive"
         )
     
-    return user
+    principal = UserPrincipal(user)
+    user_cache.set(user_id, (principal, version))
+    return principal
+
+def require_permissions(current_user: UserPrincipal, required: frozenset):
+    """Raise 403 unless the user holds every permission in `required`"""
+    # Admins have all permissions
+    if current_user.role == "admin":
+        return
+    
+    # Check if user has all required permissions
+    missing_permissions = required - current_user.permissions
+    if missing_permissions:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Insufficient permissions. Missing: {', '.join(sorted(missing_permissions))}"
+        )
 
 def check_permissions(required_permissions: List[str]):
     """Decorator to check if user has required permissions"""
-    def permission_checker(current_user: User = Depends(get_current_user)):
-        user_permissions = current_user.permissions or []
-        
-        # Admins have all permissions
-        if current_user.role == "admin":
-            return current_user
-            
-        # Check if user has all required permissions
-        missing_permissions = set(required_permissions) - set(user_permissions)
-        if missing_permissions:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail=f"Insufficient permissions. Missing: {', '.join(missing_permissions)}"
-            )
-        
+    required = frozenset(required_permissions)
+    
+    def permission_checker(current_user: UserPrincipal = Depends(get_current_user)):
+        require_permissions(current_user, required)
         return current_user
     
     return permission_checker
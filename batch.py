@@ -0,0 +1,41 @@
+import os
+from typing import Iterable, List, Union
+from fastapi import HTTPException, status
+
+# Most ids one batch request may ask for (one IN (...) query)
+MAX_BATCH_IDS = int(os.getenv("MAX_BATCH_IDS", "1000"))
+
+def parse_ids(ids: Union[str, Iterable[str]]) -> List[str]:
+    """Ids from a comma-separated string or a list, de-duplicated in order"""
+    if isinstance(ids, str):
+        ids = ids.split(",")
+    unique = list(dict.fromkeys(id.strip() for id in ids if id and id.strip()))
+    
+    if not unique:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one id is required"
+        )
+    if len(unique) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_IDS} ids may be requested at once"
+        )
+    return unique
+
+async def fetch_batch(db, query, model, ids: List[str], not_found: str) -> dict:
+    """Load many entities by primary key with one IN (...) query.
+    
+    `query` is the resource's tenant-scoped select; ids it doesn't return
+    (missing or belonging to another organization) are reported as 404s,
+    exactly as the single-item endpoint would.
+    """
+    result = await db.execute(query.where(model.id.in_(ids)))
+    found = {entity.id: entity for entity in result.scalars()}
+    return {
+        "items": [found[id] for id in ids if id in found],
+        "errors": [
+            {"id": id, "status": status.HTTP_404_NOT_FOUND, "detail": not_found}
+            for id in ids if id not in found
+        ],
+    }
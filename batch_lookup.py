@@ -0,0 +1,16 @@
+from pydantic import BaseModel, Field
+from typing import Generic, List, TypeVar
+
+T = TypeVar("T")
+
+class BatchRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1)  # Capped at MAX_BATCH_IDS
+
+class BatchError(BaseModel):
+    id: str
+    status: int  # HTTP status the single-item endpoint would have returned
+    detail: str
+
+class BatchResponse(BaseModel, Generic[T]):
+    items: List[T]  # Found entities, in the order requested
+    errors: List[BatchError]  # One entry per id that wasn't returned
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latency of non-auth requests during a login storm.
+
+Runs an in-process ASGI app with a stand-in /api/portfolios read and two
+login endpoints - one hashing on the event loop (the old behaviour) and one
+using the bounded hashing pool - then measures read latency while logins run
+concurrently.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import httpx
+from fastapi import FastAPI
+
+from app.core.auth import get_password_hash, verify_password, verify_password_async, PASSWORD_HASH_CONCURRENCY
+
+PASSWORD = "SecureAdmin2024!"
+PASSWORD_HASH = get_password_hash(PASSWORD)
+READ_INTERVAL = 0.01
+
+app = FastAPI()
+
+@app.post("/login/blocking")
+async def login_blocking():
+    return {"ok": verify_password(PASSWORD, PASSWORD_HASH)}
+
+@app.post("/login/offloaded")
+async def login_offloaded():
+    return {"ok": await verify_password_async(PASSWORD, PASSWORD_HASH)}
+
+@app.get("/api/portfolios")
+async def portfolios():
+    return []
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run(mode: str, logins: int, concurrency: int, reads: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        login_queue = asyncio.Queue()
+        for _ in range(logins):
+            login_queue.put_nowait(None)
+
+        async def login_worker():
+            while not login_queue.empty():
+                login_queue.get_nowait()
+                await client.post(f"/login/{mode}")
+
+        async def reader():
+            # Reads are issued on a fixed schedule and timed from when they were
+            # due, so time spent waiting for a blocked event loop is counted
+            latencies = []
+            first = time.perf_counter()
+            for i in range(reads):
+                due = first + i * READ_INTERVAL
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+                await client.get("/api/portfolios")
+                latencies.append((time.perf_counter() - due) * 1000)
+            return latencies
+
+        start = time.perf_counter()
+        workers = [asyncio.create_task(login_worker()) for _ in range(concurrency)]
+        latencies = await reader()
+        await asyncio.gather(*workers)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "logins": logins,
+        "login_concurrency": concurrency,
+        "hash_pool_size": PASSWORD_HASH_CONCURRENCY,
+        "elapsed_seconds": round(elapsed, 3),
+        "read_p50_ms": round(statistics.median(latencies), 2),
+        "read_p99_ms": round(percentile(latencies, 99), 2),
+        "read_max_ms": round(max(latencies), 2),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    results = [
+        asyncio.run(run(mode, args.logins, args.concurrency, args.reads))
+        for mode in ("blocking", "offloaded")
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(
+                f"{result['mode']:>10}: read p50 {result['read_p50_ms']:8.2f} ms  "
+                f"p99 {result['read_p99_ms']:8.2f} ms  max {result['read_max_ms']:8.2f} ms  "
+                f"({result['logins']} logins in {result['elapsed_seconds']}s)"
+            )
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark: response serialization throughput per resource.
+
+Loads a list response of ORM rows for each resource from a scratch SQLite
+database and serializes it two ways: FastAPI's classic response_model path
+(validate from attributes, dump to Python dicts, json.dumps in JSONResponse)
+and the SerializedRoute path (validate loaded column values, dump straight
+to JSON bytes). Reports rows/sec and the CPU saved.
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import List
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import select
+
+from app.core.responses import loaded_values
+from app.database import Base, SessionLocal, engine
+from app.models.client import Client, Household
+from app.models.portfolio import Holding, Portfolio
+from app.models.scenario import Scenario
+from app.schemas.client import ClientResponse, HouseholdResponse
+from app.schemas.portfolio import HoldingResponse, PortfolioResponse, ScenarioResponse
+
+NOW = datetime(2024, 6, 1, 9, 30, tzinfo=timezone.utc)
+
+def make_client(n: int) -> Client:
+    return Client(
+        id=str(uuid.uuid4()), organization_id="bench", adviser_id=str(uuid.uuid4()),
+        client_number=f"C{n:06d}", first_name=f"First{n}", last_name=f"Last{n}",
+        email=f"client{n}@example.com", phone="+44 20 7946 0000",
+        date_of_birth=datetime(1970, 1, 1) + timedelta(days=n % 10000),
+        address={"street": f"{n} High Street", "city": "London", "postcode": "EC1A 1BB", "country": "GB"},
+        marital_status="married", employment_status="employed", employer="Acme", job_title="Engineer",
+        annual_income=Decimal("85000.00") + n, net_worth=Decimal("420000.00") + n,
+        risk_tolerance="moderate", investment_experience="experienced",
+        objectives=["retirement", "education"], dependents=[{"name": "Child", "age": 9}],
+        status="active", source="referral", notes="Annual review due",
+        created_at=NOW, updated_at=NOW,
+    )
+
+def make_portfolio(n: int) -> Portfolio:
+    return Portfolio(
+        id=str(uuid.uuid4()), client_id=str(uuid.uuid4()), name=f"Portfolio {n}", description="Core",
+        account_type="ISA", provider="Platform", account_number=f"A{n:08d}",
+        total_value=Decimal("125000.50") + n, currency="GBP", model_portfolio="Balanced",
+        asset_allocation={"equity": 60, "bond": 30, "cash": 10}, benchmark_index="FTSE All-World",
+        is_active=True, created_at=NOW, updated_at=NOW,
+    )
+
+def make_holding(n: int) -> Holding:
+    return Holding(
+        id=str(uuid.uuid4()), portfolio_id=str(uuid.uuid4()), symbol=f"SYM{n % 500}", name="Global Equity",
+        asset_class="equity", sector="Diversified", region="Global", quantity=Decimal("152.250000"),
+        average_cost=Decimal("98.1200"), current_price=Decimal("104.5500"), market_value=Decimal("15917.74"),
+        unrealized_gain_loss=Decimal("978.97"), weight=Decimal("12.73"), last_updated=NOW, created_at=NOW,
+    )
+
+def make_scenario(n: int) -> Scenario:
+    return Scenario(
+        id=str(uuid.uuid4()), client_id=str(uuid.uuid4()), name=f"Retirement {n}", description="Base case",
+        type="retirement", current_age=45, target_age=67, current_savings=Decimal("150000.00"),
+        monthly_contribution=Decimal("750.00"), expected_return=Decimal("5.50"), inflation_rate=Decimal("2.50"),
+        target_amount=Decimal("900000.00"), projected_value=Decimal("1012345.67"), projected_income=Decimal("40493.83"),
+        assumptions={"fees": 0.45}, results={"success_probability": 0.82, "percentiles": {"p10": 610000, "p90": 1650000}},
+        is_active=True, created_at=NOW, updated_at=NOW,
+    )
+
+def make_household(n: int) -> Household:
+    return Household(
+        id=str(uuid.uuid4()), organization_id="bench", name=f"Household {n}", primary_client_id=str(uuid.uuid4()),
+        joint_income=Decimal("140000.00"), joint_net_worth=Decimal("910000.00"), created_at=NOW, updated_at=NOW,
+    )
+
+RESOURCES = {
+    "clients": (Client, make_client, ClientResponse),
+    "portfolios": (Portfolio, make_portfolio, PortfolioResponse),
+    "holdings": (Holding, make_holding, HoldingResponse),
+    "scenarios": (Scenario, make_scenario, ScenarioResponse),
+    "households": (Household, make_household, HouseholdResponse),
+}
+
+def classic(adapter: TypeAdapter, rows: list) -> bytes:
+    """What FastAPI does for a response_model by default"""
+    content = adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json")
+    return JSONResponse(content).body
+
+def serialized(adapter: TypeAdapter, rows: list) -> bytes:
+    """What SerializedRoute does"""
+    return adapter.dump_json(adapter.validate_python(loaded_values(rows), from_attributes=True))
+
+def measure(serialize, adapter: TypeAdapter, rows: list, repeat: int) -> float:
+    """Best CPU seconds per call over `repeat` runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        serialize(adapter, rows)
+        best = min(best, time.process_time() - started)
+    return best
+
+def run(resource: str, rows: int, repeat: int) -> dict:
+    mapped, make, model = RESOURCES[resource]
+    adapter = TypeAdapter(List[model])
+    
+    # Rows as a router sees them: loaded by a query, every column populated
+    session = SessionLocal()
+    session.add_all(make(n) for n in range(rows))
+    session.commit()
+    items = session.execute(select(mapped).limit(rows)).scalars().all()
+    
+    # Both paths must produce the same document
+    assert json.loads(classic(adapter, items)) == json.loads(serialized(adapter, items))
+    
+    classic_seconds = measure(classic, adapter, items, repeat)
+    serialized_seconds = measure(serialized, adapter, items, repeat)
+    session.close()
+    return {
+        "resource": resource,
+        "rows": rows,
+        "classic_rows_per_second": round(rows / classic_seconds),
+        "serialized_rows_per_second": round(rows / serialized_seconds),
+        "cpu_saved": round(1 - serialized_seconds / classic_seconds, 3),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000, help="Rows per list response")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--resource", choices=sorted(RESOURCES), action="append")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+    
+    Base.metadata.create_all(bind=engine)
+    results = [run(resource, args.rows, args.repeat) for resource in args.resource or RESOURCES]
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(
+                f"{result['resource']:>10}: classic {result['classic_rows_per_second']:>9,} rows/s  "
+                f"serialized {result['serialized_rows_per_second']:>9,} rows/s  "
+                f"({result['cpu_saved']:.0%} less CPU)"
+            )
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput and latency of the API's read paths under load.
+
+Boots app.main:app in-process against a scratch database, seeds it with
+realistic volumes of clients, portfolios, holdings, transactions, scenarios
+and households, then drives each workload with concurrent clients. Reports
+req/s, p50/p95/p99 latency and SQL statements per request, and compares
+them against a stored baseline.
+
+    python benchmark.py                                   # SQLite in a temp dir
+    python benchmark.py --database postgres               # embedded PostgreSQL (pip install pgserver)
+    DATABASE_URL=postgresql://... python benchmark.py --database env
+    python benchmark.py --json --save-baseline benchmark_baseline.json
+    python benchmark.py --compare benchmark_baseline.json # exits 1 on a regression
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, List, NamedTuple
+
+# Relative change in req/s, p95 latency or queries per request reported as
+# a regression
+DEFAULT_TOLERANCE = 0.15
+
+class Workload(NamedTuple):
+    name: str
+    router: str
+    request: Callable[[dict, random.Random], dict]  # Keyword arguments for client.request
+
+def _get(url: str, **kwargs) -> dict:
+    return {"method": "GET", "url": url, **kwargs}
+
+WORKLOADS = [
+    Workload("clients.list", "clients", lambda ids, rng: _get(f"/api/clients/?limit=50&skip={rng.randrange(0, 400, 50)}")),
+    Workload("clients.list.revalidate", "clients", lambda ids, rng: _get(
+        "/api/clients/?limit=50", headers={"If-None-Match": ids["clients_page_etag"]}
+    )),
+    Workload("clients.search", "clients", lambda ids, rng: _get(f"/api/clients/?search=last{rng.randrange(100)}&limit=20")),
+    Workload("clients.detail", "clients", lambda ids, rng: _get(f"/api/clients/{rng.choice(ids['clients'])}")),
+    Workload("clients.overview", "clients", lambda ids, rng: _get(f"/api/clients/{rng.choice(ids['clients'])}/overview")),
+    Workload("clients.batch", "clients", lambda ids, rng: _get(f"/api/clients/batch?ids={','.join(rng.sample(ids['clients'], 20))}")),
+    Workload("portfolios.list", "portfolios", lambda ids, rng: _get(f"/api/portfolios/?client_id={rng.choice(ids['clients'])}")),
+    Workload("portfolios.detail", "portfolios", lambda ids, rng: _get(f"/api/portfolios/{rng.choice(ids['portfolios'])}")),
+    Workload("portfolios.holdings", "portfolios", lambda ids, rng: _get(f"/api/portfolios/{rng.choice(ids['portfolios'])}/holdings")),
+    Workload("portfolios.history", "portfolios", lambda ids, rng: _get(
+        f"/api/portfolios/{rng.choice(ids['portfolios'])}/history?granularity=week"
+    )),
+    Workload("scenarios.list", "scenarios", lambda ids, rng: _get(f"/api/scenarios/?client_id={rng.choice(ids['clients'])}")),
+    Workload("scenarios.detail", "scenarios", lambda ids, rng: _get(f"/api/scenarios/{rng.choice(ids['scenarios'])}")),
+    Workload("households.list", "households", lambda ids, rng: _get(f"/api/households/?limit=50&skip={rng.randrange(0, 200, 50)}")),
+    Workload("households.summary", "households", lambda ids, rng: _get(f"/api/households/{rng.choice(ids['households'])}/summary")),
+    Workload("analytics.returns", "analytics", lambda ids, rng: _get(
+        f"/api/analytics/portfolios/{rng.choice(ids['portfolios'])}/returns"
+    )),
+]
+
+def configure_database(choice: str) -> str:
+    """Point DATABASE_URL at the chosen scratch database; the app reads it
+    when first imported"""
+    if choice == "env":
+        if not os.getenv("DATABASE_URL"):
+            sys.exit("--database env needs DATABASE_URL (it will be seeded, so use a scratch database)")
+    elif choice == "postgres":
+        try:
+            import pgserver
+        except ImportError:
+            sys.exit("--database postgres needs the pgserver package (pip install pgserver)")
+        server = pgserver.get_server(tempfile.mkdtemp(prefix="benchmark-pg-"), cleanup_mode="delete")
+        os.environ["DATABASE_URL"] = server.get_uri()
+    else:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="benchmark-"), "benchmark.db")
+    return os.environ["DATABASE_URL"]
+
+def seed(session, scale: float, rng: random.Random) -> dict:
+    """Insert organizations of data in bulk and return the first one's ids"""
+    from sqlalchemy import insert
+    
+    from app.core.auth import ADMIN_PERMISSIONS
+    from app.models.client import Client, FinancialGoal, Household, HouseholdClient, build_search_document
+    from app.models.portfolio import Holding, Portfolio, PortfolioTransaction
+    from app.models.scenario import Scenario
+    from app.models.user import User
+    from app.services.household_rollup import refresh_stale_households
+    from app.services.snapshots import take_snapshots
+    
+    clients_per_organization = max(20, int(500 * scale))
+    symbols = [(f"SYM{n:03d}", ("equity", "bond", "cash", "property")[n % 4]) for n in range(200)]
+    start = datetime(2024, 1, 1)
+    ids = {}
+    
+    for org in range(2):
+        organization_id = str(uuid.uuid4())
+        user_id = str(uuid.uuid4())
+        session.execute(insert(User), [{
+            "id": user_id, "organization_id": organization_id, "email": f"bench{org}@example.com",
+            "password_hash": "x", "first_name": "Bench", "last_name": "User", "role": "adviser",
+            "permissions": ADMIN_PERMISSIONS,
+        }])
+        rows: Dict[type, List[dict]] = {model: [] for model in (
+            Client, FinancialGoal, Portfolio, Holding, PortfolioTransaction, Scenario, Household, HouseholdClient
+        )}
+        
+        for n in range(clients_per_organization):
+            client = {
+                "id": str(uuid.uuid4()), "organization_id": organization_id, "client_number": f"C{n:06d}",
+                "first_name": f"First{n}", "last_name": f"Last{n}", "email": f"client{n}@example.com",
+                "annual_income": Decimal(rng.randrange(30000, 250000)), "net_worth": Decimal(rng.randrange(50000, 3000000)),
+                "status": "active" if n % 4 else "prospect", "risk_tolerance": "moderate",
+                "created_at": start + timedelta(minutes=n), "updated_at": start + timedelta(minutes=n),
+            }
+            client["search_document"] = build_search_document(Client(**client))
+            rows[Client].append(client)
+            rows[FinancialGoal].append({
+                "id": str(uuid.uuid4()), "client_id": client["id"], "name": "Retirement",
+                "target_amount": Decimal(750000), "target_date": start + timedelta(days=9000),
+            })
+            rows[Scenario].append({
+                "id": str(uuid.uuid4()), "client_id": client["id"], "name": "Retirement", "type": "retirement",
+                "current_age": 30 + n % 30, "target_age": 67, "current_savings": Decimal(rng.randrange(1000, 500000)),
+                "monthly_contribution": Decimal(500), "expected_return": Decimal("5.50"),
+                "created_at": start + timedelta(minutes=n), "updated_at": start + timedelta(minutes=n),
+            })
+            if n % 2 == 0:
+                household_id = str(uuid.uuid4())
+                rows[Household].append({
+                    "id": household_id, "organization_id": organization_id, "name": f"Household {n}",
+                    "primary_client_id": client["id"], "created_at": start + timedelta(minutes=n),
+                })
+            rows[HouseholdClient].append({"id": str(uuid.uuid4()), "household_id": household_id, "client_id": client["id"]})
+            
+            for p in range(2):
+                portfolio_id = str(uuid.uuid4())
+                holdings = [
+                    (symbol, asset_class, Decimal(rng.randrange(10, 500)), Decimal(rng.randrange(50, 300)))
+                    for symbol, asset_class in rng.sample(symbols, 15)
+                ]
+                rows[Portfolio].append({
+                    "id": portfolio_id, "client_id": client["id"], "name": ("ISA", "Pension")[p], "account_type": ("ISA", "SIPP")[p],
+                    "total_value": sum(quantity * price for _, _, quantity, price in holdings), "is_active": True,
+                    "created_at": start + timedelta(minutes=n), "updated_at": start + timedelta(minutes=n),
+                })
+                for symbol, asset_class, quantity, price in holdings:
+                    rows[Holding].append({
+                        "id": str(uuid.uuid4()), "portfolio_id": portfolio_id, "symbol": symbol, "name": symbol,
+                        "asset_class": asset_class, "quantity": quantity, "average_cost": price, "current_price": price,
+                        "market_value": quantity * price,
+                    })
+                rows[PortfolioTransaction].append({
+                    "id": str(uuid.uuid4()), "portfolio_id": portfolio_id, "type": "deposit",
+                    "amount": Decimal(100000), "net_amount": Decimal(100000), "trade_date": start,
+                })
+                for t in range(40):
+                    symbol, _, quantity, price = holdings[t % len(holdings)]
+                    amount = (quantity * price / 4).quantize(Decimal("0.01"))
+                    rows[PortfolioTransaction].append({
+                        "id": str(uuid.uuid4()), "portfolio_id": portfolio_id, "type": "buy" if t % 5 else "sell",
+                        "symbol": symbol, "quantity": quantity / 4, "price": price, "amount": amount, "net_amount": amount,
+                        "trade_date": start + timedelta(days=t * 9),
+                    })
+        
+        for model, model_rows in rows.items():
+            session.execute(insert(model), model_rows)
+        
+        if org == 0:
+            ids = {
+                "user_id": user_id,
+                "clients": [row["id"] for row in rows[Client]],
+                "portfolios": [row["id"] for row in rows[Portfolio]],
+                "scenarios": [row["id"] for row in rows[Scenario]],
+                "households": [row["id"] for row in rows[Household]],
+            }
+    
+    for day in range(0, 90, 3):
+        take_snapshots(session, date(2024, 1, 1) + timedelta(days=day))
+    refresh_stale_households(session)
+    session.commit()
+    return ids
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def drive(client, workload: Workload, ids: dict, requests: int, concurrency: int, rng: random.Random) -> dict:
+    """Issue `requests` requests from `concurrency` concurrent clients"""
+    from app.core.metrics import db_queries
+    
+    pending = [workload.request(ids, rng) for _ in range(requests)]
+    latencies, errors = [], 0
+    
+    async def worker():
+        nonlocal errors
+        while pending:
+            request = pending.pop()
+            started = time.perf_counter()
+            response = await client.request(**request)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+    
+    queries_before = db_queries.total()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    
+    return {
+        "workload": workload.name,
+        "router": workload.router,
+        "requests": requests,
+        "errors": errors,
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "queries_per_request": round((db_queries.total() - queries_before) / requests, 2),
+    }
+
+async def run(args) -> dict:
+    import httpx
+    
+    from app.core.auth import create_access_token
+    from app.database import DB_ASYNC_MODE, SessionLocal, create_tables, engine
+    from app.main import app
+    
+    rng = random.Random(args.seed)
+    create_tables()
+    session = SessionLocal()
+    seeded = time.perf_counter()
+    ids = seed(session, args.scale, rng)
+    seed_seconds = time.perf_counter() - seeded
+    session.close()
+    
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': ids['user_id']})}"}
+    transport = httpx.ASGITransport(app=app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", headers=headers) as client:
+        ids["clients_page_etag"] = (await client.get("/api/clients/?limit=50")).headers.get("etag", '""')
+        for workload in WORKLOADS:
+            if args.workload and not any(workload.name.startswith(name) for name in args.workload):
+                continue
+            # Warm-up requests fill connection pools and caches, as in steady state
+            await drive(client, workload, ids, args.warmup, args.concurrency, rng)
+            results.append(await drive(client, workload, ids, args.requests, args.concurrency, rng))
+    
+    return {
+        "environment": {
+            "database": engine.dialect.name,
+            "db_async_mode": DB_ASYNC_MODE,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "clients_per_organization": len(ids["clients"]),
+            "seed_seconds": round(seed_seconds, 2),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "date": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions of each workload against the baseline"""
+    previous = {result["workload"]: result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        base = previous.get(result["workload"])
+        if base is None:
+            continue
+        if result["requests_per_second"] < base["requests_per_second"] * (1 - tolerance):
+            regressions.append(f"{result['workload']}: {result['requests_per_second']} req/s (baseline {base['requests_per_second']})")
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result['workload']}: p95 {result['p95_ms']} ms (baseline {base['p95_ms']})")
+        # Cache hits make the count fractional and slightly noisy; an extra
+        # statement per request still stands out
+        if result["queries_per_request"] > base["queries_per_request"] * (1 + tolerance) + 0.05:
+            regressions.append(f"{result['workload']}: {result['queries_per_request']} queries/request (baseline {base['queries_per_request']})")
+        if result["errors"] > base["errors"]:
+            regressions.append(f"{result['workload']}: {result['errors']} errors (baseline {base['errors']})")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database", choices=("sqlite", "postgres", "env"), default="sqlite")
+    parser.add_argument("--scale", type=float, default=1.0, help="1.0 seeds 500 clients, 1,000 portfolios and 15,000 holdings per organization")
+    parser.add_argument("--requests", type=int, default=500, help="Timed requests per workload")
+    parser.add_argument("--warmup", type=int, default=50, help="Untimed requests per workload")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workload", action="append", help="Only run workloads with this prefix (repeatable)")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write the results to PATH")
+    parser.add_argument("--compare", metavar="PATH", help="Compare with a saved baseline; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+    
+    configure_database(args.database)
+    report = asyncio.run(run(args))
+    
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+            baseline_file.write("\n")
+    
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for result in report["results"]:
+            print(
+                f"{result['workload']:>24}: {result['requests_per_second']:>8.1f} req/s  "
+                f"p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  "
+                f"{result['queries_per_request']:5.2f} queries/req" + (f"  {result['errors']} errors" if result["errors"] else "")
+            )
+    
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,46 @@
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from decimal import Decimal
+from typing import List, Optional
+
+ASSET_CLASSES = {"equity", "bond", "cash", "property", "commodity", "alternative"}
+
+class HoldingImportRow(BaseModel):
+    """One holding from a custodian feed, keyed by (portfolio_id, symbol)"""
+    model_config = ConfigDict(str_strip_whitespace=True)
+    
+    portfolio_id: Optional[str] = None  # Required by the organization-wide import
+    symbol: str = Field(..., min_length=1, max_length=32)  # Ticker or ISIN
+    name: Optional[str] = None  # Defaults to the symbol
+    asset_class: str
+    sector: Optional[str] = None
+    region: Optional[str] = None
+    quantity: Decimal = Field(..., ge=0)
+    average_cost: Optional[Decimal] = Field(None, ge=0)
+    current_price: Decimal = Field(..., ge=0)
+    market_value: Optional[Decimal] = None  # Defaults to quantity * current_price
+    
+    @field_validator("symbol")
+    @classmethod
+    def normalize_symbol(cls, value: str) -> str:
+        return value.upper()
+    
+    @field_validator("asset_class")
+    @classmethod
+    def check_asset_class(cls, value: str) -> str:
+        value = value.lower()
+        if value not in ASSET_CLASSES:
+            raise ValueError(f"must be one of {', '.join(sorted(ASSET_CLASSES))}")
+        return value
+
+class HoldingImportError(BaseModel):
+    row: int  # 1-based position in the submitted rows
+    field: Optional[str] = None
+    message: str
+
+class HoldingImportResult(BaseModel):
+    received: int
+    upserted: int
+    rejected: int
+    portfolios_updated: int
+    errors: List[HoldingImportError]
+    errors_truncated: bool = False
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Query plan check: fail when a router query can't use an index.
+
+Seeds a scratch database, calls each read endpoint in-process, captures the
+SQL it issues and runs EXPLAIN on every SELECT. Any full scan of a tenant
+table (a Seq Scan on PostgreSQL, a bare SCAN on SQLite) is reported and the
+script exits non-zero, so a missing-index regression fails CI.
+
+    DATABASE_URL=postgresql://... python check_query_plans.py
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "query_plans.db")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+
+from app import database
+from app.database import SessionLocal, create_tables, engine
+from app.core.auth import ADMIN_PERMISSIONS, create_access_token
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.models.client import Client, FinancialGoal, Household, HouseholdClient
+from app.models.portfolio import Holding, Portfolio, PortfolioTransaction
+from app.models.scenario import Scenario
+from app.models.security_price import MARKET_FEED, SecurityPrice
+from app.models.user import User
+from app.main import app
+from app.services.snapshots import take_snapshots
+
+# Tables that must never be read in full by a request
+TENANT_TABLES = {
+    "users", "clients", "households", "household_clients", "financial_goals",
+    "portfolios", "holdings", "portfolio_transactions", "scenarios",
+    "portfolio_snapshots", "security_prices",
+}
+
+ORGANIZATIONS = 3
+CLIENTS_PER_ORGANIZATION = 50
+
+def seed(session) -> dict:
+    """Populate a few organizations and return ids to request against"""
+    ids = {}
+    start = datetime(2024, 1, 1)
+    for org in range(ORGANIZATIONS):
+        organization_id = str(uuid.uuid4())
+        user = User(
+            organization_id=organization_id, email=f"plans-{organization_id}@example.com",
+            password_hash="x", first_name="Plan", last_name="Check", role="adviser",
+            permissions=ADMIN_PERMISSIONS
+        )
+        household = Household(organization_id=organization_id, name=f"Household {org}")
+        session.add_all([user, household])
+        session.flush()
+        
+        for n in range(CLIENTS_PER_ORGANIZATION):
+            client = Client(
+                organization_id=organization_id, client_number=f"C{n:05d}",
+                first_name=f"First{n}", last_name=f"Last{n}", email=f"client{n}@example.com",
+                status="active" if n % 3 else "prospect"
+            )
+            session.add(client)
+            session.flush()
+            portfolio = Portfolio(client_id=client.id, name="Main", account_type="ISA")
+            scenario = Scenario(
+                client_id=client.id, name="Retirement", type="retirement", current_age=40,
+                target_age=67, current_savings=10000, monthly_contribution=500, expected_return=5
+            )
+            session.add_all([
+                portfolio, scenario,
+                HouseholdClient(household_id=household.id, client_id=client.id),
+                FinancialGoal(client_id=client.id, name="Retire", target_amount=500000, target_date=start + timedelta(days=9000)),
+            ])
+            session.flush()
+            for i, symbol in enumerate(["VWRL", "VAGP", "IGLT"]):
+                session.add(Holding(
+                    portfolio_id=portfolio.id, symbol=symbol, name=symbol, asset_class="equity",
+                    quantity=10 + i, current_price=100, market_value=1000 + 100 * i
+                ))
+                session.add(PortfolioTransaction(
+                    portfolio_id=portfolio.id, type="buy", amount=1000, net_amount=1000,
+                    trade_date=start + timedelta(days=i)
+                ))
+        
+        if org == 0:
+            ids.update(
+                user_id=user.id, client_id=client.id, portfolio_id=portfolio.id,
+                scenario_id=scenario.id, household_id=household.id
+            )
+    
+    for day in range(30):
+        take_snapshots(session, (start + timedelta(days=day)).date())
+        session.add_all([
+            SecurityPrice(organization_id=MARKET_FEED, symbol=symbol, price_date=(start + timedelta(days=day)).date(), price=100 + day)
+            for symbol in ["VWRL", "VAGP", "IGLT"]
+        ])
+    
+    session.commit()
+    return ids
+
+def endpoints(ids: dict) -> list:
+    """Read endpoints to check, one per router query shape"""
+    return [
+        "/api/clients/?limit=10",
+        "/api/clients/?status=active&limit=10",
+        "/api/clients/?search=last1",
+        "/api/clients/export",
+        f"/api/clients/{ids['client_id']}",
+        f"/api/clients/batch?ids={ids['client_id']},missing",
+        f"/api/clients/{ids['client_id']}/goals",
+        f"/api/clients/{ids['client_id']}/overview",
+        "/api/households/?limit=10",
+        f"/api/households/{ids['household_id']}",
+        f"/api/households/batch?ids={ids['household_id']}",
+        f"/api/households/{ids['household_id']}/summary",
+        "/api/portfolios/?limit=10",
+        f"/api/portfolios/?client_id={ids['client_id']}",
+        f"/api/portfolios/{ids['portfolio_id']}",
+        f"/api/portfolios/batch?ids={ids['portfolio_id']}",
+        f"/api/portfolios/{ids['portfolio_id']}/holdings",
+        f"/api/portfolios/{ids['portfolio_id']}/history?from=2024-01-10&granularity=week",
+        "/api/portfolios/holdings/export?format=ndjson",
+        "/api/portfolios/transactions/export?from=2024-01-02",
+        "/api/scenarios/?limit=10",
+        f"/api/scenarios/?client_id={ids['client_id']}",
+        f"/api/scenarios/{ids['scenario_id']}",
+        f"/api/scenarios/batch?ids={ids['scenario_id']}",
+        f"/api/analytics/portfolios/{ids['portfolio_id']}/returns",
+        f"/api/analytics/households/{ids['household_id']}/returns",
+        f"/api/analytics/portfolios/{ids['portfolio_id']}/risk?as_of=2024-01-30",
+        f"/api/analytics/portfolios/risk?client_id={ids['client_id']}&as_of=2024-01-30",
+    ]
+
+class StatementRecorder:
+    """Collects the SELECT statements issued while active"""
+    
+    def __init__(self):
+        self.statements = []
+        self.active = False
+    
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active and statement.lstrip().upper().startswith("SELECT"):
+            self.statements.append((statement, parameters))
+
+def full_scans(conn, statement: str, parameters) -> list:
+    """Tenant tables the plan for a statement reads in full"""
+    if conn.dialect.name == "postgresql":
+        plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scans, nodes = [], [plan[0]["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in TENANT_TABLES:
+                scans.append(node["Relation Name"])
+            nodes.extend(node.get("Plans", []))
+        return scans
+    
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    scans = []
+    for row in rows:
+        match = re.match(r"SCAN (\w+)(?: AS \w+)?$", row[-1])
+        if match and match.group(1) in TENANT_TABLES:
+            scans.append(match.group(1))
+    return scans
+
+def check(verbose: bool = False) -> list:
+    create_tables()
+    session = SessionLocal()
+    try:
+        ids = seed(session)
+    finally:
+        session.close()
+    
+    recorder = StatementRecorder()
+    engines = [engine] + ([database.async_engine.sync_engine] if database.async_engine is not None else [])
+    for source in engines:
+        event.listen(source, "before_cursor_execute", recorder)
+    
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": ids["user_id"]})}
+    client = TestClient(app)
+    urls = endpoints(ids)
+    
+    # Follow one cursor so the keyset query shape is covered as well
+    first_page = client.get("/api/clients/?limit=10", headers=headers)
+    if first_page.headers.get(NEXT_CURSOR_HEADER):
+        urls.append(f"/api/clients/?limit=10&cursor={first_page.headers[NEXT_CURSOR_HEADER]}")
+    
+    failures = []
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("ANALYZE"))
+            # Make the planner pick any usable index on small tables
+            conn.execute(text("SET enable_seqscan = off"))
+        
+        for url in urls:
+            recorder.statements.clear()
+            recorder.active = True
+            response = client.get(url, headers=headers)
+            recorder.active = False
+            
+            if response.status_code != 200:
+                failures.append((url, f"HTTP {response.status_code}", response.text[:200]))
+                continue
+            
+            for statement, parameters in recorder.statements:
+                scans = full_scans(conn, statement, parameters)
+                if scans:
+                    failures.append((url, f"full scan of {', '.join(sorted(set(scans)))}", " ".join(statement.split())))
+                elif verbose:
+                    print(f"   ok  {url}: {' '.join(statement.split())[:120]}")
+    
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every checked statement")
+    args = parser.parse_args()
+    
+    print("🔍 Checking router query plans...")
+    failures = check(args.verbose)
+    if not failures:
+        print("✅ Every router query uses an index")
+        return 0
+    
+    for url, problem, statement in failures:
+        print(f"❌ {url}: {problem}")
+        print(f"   {statement}")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Text, DateTime, Numeric, Boolean, JSON, Integer
-from sqlalchemy.sql import func
+from sqlalchemy import Column, String, Text, DateTime, Numeric, Boolean, JSON, Integer, Index, event
+from sqlalchemy.sql import func, true
 from sqlalchemy.orm import relationship
 from app.database import Base
 import uuid
@@ -33,8 +33,38 @@ class Client(Base):
     notes = Column(Text)
     last_review_date = Column(DateTime)
     next_review_date = Column(DateTime)
+    search_document = Column(Text)  # Lowercased name, email and client number for search
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    # Read-only collections for eager loading; lazy="raise" turns any
+    # accidental per-row load into an error instead of an N+1 query.
+    # Client.portfolios and Client.scenarios are declared with their models.
+    goals = relationship(
+        "FinancialGoal", primaryjoin="Client.id == foreign(FinancialGoal.client_id)",
+        order_by="FinancialGoal.target_date", viewonly=True, lazy="raise"
+    )
+    
+    __table_args__ = (
+        Index("ix_clients_org_client_number", "organization_id", "client_number", unique=True),
+        Index("ix_clients_org_status", "organization_id", "status"),
+        Index("ix_clients_org_created", "organization_id", "created_at", "id"),
+        # Trigram index for substring search (plain index on other databases)
+        Index(
+            "ix_clients_search_document_trgm", "search_document",
+            postgresql_using="gin", postgresql_ops={"search_document": "gin_trgm_ops"}
+        ),
+    )
+
+def build_search_document(client: Client) -> str:
+    """Text searched by the client search box"""
+    parts = (client.first_name, client.last_name, client.email, client.client_number)
+    return " ".join(part.strip().lower() for part in parts if part)
+
+@event.listens_for(Client, "before_insert")
+@event.listens_for(Client, "before_update")
+def _maintain_search_document(mapper, connection, target):
+    target.search_document = build_search_document(target)
 
 class Household(Base):
     __tablename__ = "households"
@@ -45,8 +75,18 @@ class Household(Base):
     primary_client_id = Column(String)
     joint_income = Column(Numeric(12, 2))
     joint_net_worth = Column(Numeric(12, 2))
+    # Rollup of the members' figures, maintained by app.services.household_rollup
+    total_assets = Column(Numeric(14, 2))  # Active portfolios of all members
+    asset_allocation = Column(JSON, default=dict)  # {equity: 62.5, bond: 30.0, cash: 7.5}
+    member_count = Column(Integer, default=0)
+    summary_stale = Column(Boolean, nullable=False, default=True, server_default=true())
+    summary_refreshed_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index("ix_households_org_created", "organization_id", "created_at", "id"),
+    )
 
 class HouseholdClient(Base):
     __tablename__ = "household_clients"
@@ -56,6 +96,11 @@ class HouseholdClient(Base):
     client_id = Column(String, nullable=False)
     relationship_type = Column(Text, default="member")  # primary, spouse, partner, child, etc.
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_household_clients_household", "household_id", "client_id"),
+        Index("ix_household_clients_client", "client_id"),
+    )
 
 class FinancialGoal(Base):
     __tablename__ = "financial_goals"
@@ -70,4 +115,8 @@ class FinancialGoal(Base):
     priority = Column(Text, default="medium")  # high, medium, low
     status = Column(Text, default="active")  # active, achieved, paused, cancelled
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index("ix_financial_goals_client", "client_id"),
+    )
\ No newline at end of file
@@ -0,0 +1,114 @@
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Set
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+
+from app.models.client import Client, FinancialGoal
+from app.models.portfolio import Holding, Portfolio
+from app.models.scenario import Scenario
+
+# Sections of the overview: model, permission needed to see it
+SECTIONS = {
+    "client": (Client, "clients:view"),
+    "goals": (FinancialGoal, "clients:view"),
+    "portfolios": (Portfolio, "portfolios:view"),
+    "holdings": (Holding, "portfolios:view"),
+    "scenarios": (Scenario, "planning:view"),
+}
+
+# Internal columns that never leave the database
+EXCLUDED_COLUMNS = {"search_document"}
+
+def _columns(model) -> List[str]:
+    return [column.key for column in model.__table__.columns if column.key not in EXCLUDED_COLUMNS]
+
+def parse_fields(fields: Optional[str]) -> Dict[str, Optional[Set[str]]]:
+    """Sections and columns requested by a `fields` parameter.
+    
+    `fields` is a comma-separated list of sections ("portfolios") and
+    section columns ("holdings.symbol"). A bare section returns all of its
+    columns; `id` is always returned. Holdings imply their portfolios.
+    Omitting `fields` selects everything.
+    """
+    if not fields:
+        return {section: None for section in SECTIONS}
+    
+    selected: Dict[str, Optional[Set[str]]] = {}
+    for item in filter(None, (part.strip() for part in fields.split(","))):
+        section, _, column = item.partition(".")
+        if section not in SECTIONS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown overview section: {section}"
+            )
+        if not column:
+            selected[section] = None
+            continue
+        if column not in _columns(SECTIONS[section][0]):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown field: {item}"
+            )
+        if section not in selected or selected[section] is not None:
+            selected.setdefault(section, {"id"}).add(column)
+    
+    if "holdings" in selected:
+        selected.setdefault("portfolios", {"id"})
+    return selected
+
+def load_client_overview(session: Session, client_id: str, organization_id: str, sections) -> Optional[Client]:
+    """Load a client and the requested collections in one batch.
+    
+    The client query carries the organization check; each collection is a
+    single selectinload query, so the total is at most five statements
+    however many portfolios and holdings the client has.
+    """
+    options = []
+    if "goals" in sections:
+        options.append(selectinload(Client.goals))
+    if "portfolios" in sections:
+        portfolios = selectinload(Client.portfolios)
+        options.append(portfolios.selectinload(Portfolio.holdings) if "holdings" in sections else portfolios)
+    if "scenarios" in sections:
+        options.append(selectinload(Client.scenarios))
+    
+    return session.execute(
+        select(Client)
+        .where(Client.id == client_id, Client.organization_id == organization_id)
+        .options(*options)
+    ).scalars().first()
+
+def _value(value):
+    if isinstance(value, Decimal):
+        return str(value)  # Same as the API: no float rounding
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def _row(instance, columns: Optional[Set[str]]) -> dict:
+    return {
+        name: _value(getattr(instance, name))
+        for name in _columns(type(instance)) if columns is None or name in columns
+    }
+
+def serialize_overview(client: Client, sections) -> dict:
+    """Nest the loaded collections under the client, keeping only the
+    selected sections and columns"""
+    overview = {"id": client.id}
+    if "client" in sections:
+        overview["client"] = _row(client, sections["client"])
+    if "goals" in sections:
+        overview["goals"] = [_row(goal, sections["goals"]) for goal in client.goals]
+    if "portfolios" in sections:
+        overview["portfolios"] = []
+        for portfolio in client.portfolios:
+            row = _row(portfolio, sections["portfolios"])
+            if "holdings" in sections:
+                row["holdings"] = [_row(holding, sections["holdings"]) for holding in portfolio.holdings]
+            overview["portfolios"].append(row)
+    if "scenarios" in sections:
+        overview["scenarios"] = [_row(scenario, sections["scenarios"]) for scenario in client.scenarios]
+    return overview
@@ -0,0 +1,217 @@
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import and_, case, event, func, or_, select
+from sqlalchemy.orm import Session, object_session
+from app.database import engine
+from app.models.client import Client
+
+# "trigram" (PostgreSQL pg_trgm) or "memory" (in-process index, for SQLite)
+CLIENT_SEARCH_BACKEND = os.getenv("CLIENT_SEARCH_BACKEND") or (
+    "trigram" if engine.dialect.name == "postgresql" else "memory"
+)
+
+# Session.info key for index changes waiting on the transaction's commit
+PENDING_KEY = "client_search_index"
+
+def normalize_terms(term: str) -> List[str]:
+    """Split a search box value into lowercase tokens"""
+    return [token for token in term.lower().split() if token]
+
+def _escape_like(token: str) -> str:
+    return token.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def trigrams(text: str) -> Set[str]:
+    """Padded character trigrams, as pg_trgm computes them per word"""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+class TrigramClientSearch:
+    """Ranked substring search backed by a pg_trgm GIN index on search_document"""
+    
+    async def search(self, db, organization_id: str, term: str, status: Optional[str], skip: int, limit: int) -> List[Client]:
+        tokens = normalize_terms(term)
+        if not tokens:
+            return []
+        
+        document = Client.search_document
+        # Every token must appear somewhere; the trigram index serves LIKE '%token%'
+        matches = [document.like(f"%{_escape_like(token)}%", escape="\\") for token in tokens]
+        # Tokens that start a word (name, email or client number prefixes) rank first
+        prefix_hits = sum(
+            case(
+                (or_(
+                    document.like(f"{_escape_like(token)}%", escape="\\"),
+                    document.like(f"% {_escape_like(token)}%", escape="\\")
+                ), 1),
+                else_=0
+            )
+            for token in tokens
+        )
+        
+        query = select(Client).where(and_(Client.organization_id == organization_id, *matches))
+        if status:
+            query = query.where(Client.status == status)
+        query = query.order_by(
+            prefix_hits.desc(),
+            func.similarity(document, " ".join(tokens)).desc(),
+            Client.id
+        ).offset(skip).limit(limit)
+        
+        result = await db.execute(query)
+        return result.scalars().all()
+
+class InMemoryClientIndex:
+    """In-process trigram index over search documents, used where pg_trgm is unavailable.
+    
+    Organizations are loaded on first search and kept current by ORM events
+    on Client, applied when their transaction commits.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded: Set[str] = set()
+        self._documents: Dict[str, Dict[str, str]] = defaultdict(dict)  # org -> id -> document
+        self._statuses: Dict[str, Dict[str, str]] = defaultdict(dict)  # org -> id -> status
+        self._postings: Dict[str, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))  # org -> trigram -> ids
+    
+    def _add(self, organization_id: str, client_id: str, document: str, status: Optional[str]):
+        self._remove(organization_id, client_id)
+        self._documents[organization_id][client_id] = document
+        self._statuses[organization_id][client_id] = status
+        postings = self._postings[organization_id]
+        for gram in trigrams(document):
+            postings[gram].add(client_id)
+    
+    def _remove(self, organization_id: str, client_id: str):
+        document = self._documents[organization_id].pop(client_id, None)
+        if document is None:
+            return
+        self._statuses[organization_id].pop(client_id, None)
+        postings = self._postings[organization_id]
+        for gram in trigrams(document):
+            postings[gram].discard(client_id)
+    
+    def apply(self, changes: Dict[Tuple[str, str], Optional[Tuple[str, str]]]):
+        """Apply committed changes: (org, id) -> (document, status), or None
+        for a deleted client. Organizations not yet loaded are skipped."""
+        with self._lock:
+            for (organization_id, client_id), row in changes.items():
+                if row is None:
+                    self._remove(organization_id, client_id)
+                elif organization_id in self._loaded:
+                    self._add(organization_id, client_id, row[0] or "", row[1])
+    
+    def clear(self):
+        with self._lock:
+            self._loaded.clear()
+            self._documents.clear()
+            self._statuses.clear()
+            self._postings.clear()
+    
+    def load(self, organization_id: str, rows):
+        with self._lock:
+            for client_id, document, status in rows:
+                self._add(organization_id, client_id, document or "", status)
+            self._loaded.add(organization_id)
+    
+    def is_loaded(self, organization_id: str) -> bool:
+        return organization_id in self._loaded
+    
+    def rank(self, organization_id: str, term: str, status: Optional[str] = None) -> List[str]:
+        """Ids of matching clients, best match first"""
+        tokens = normalize_terms(term)
+        if not tokens:
+            return []
+        
+        with self._lock:
+            documents = self._documents[organization_id]
+            statuses = self._statuses[organization_id]
+            postings = self._postings[organization_id]
+            
+            candidates: Optional[Set[str]] = None
+            for token in tokens:
+                # Only grams inside the token are guaranteed to occur in a match
+                token_grams = {gram for gram in trigrams(token) if " " not in gram}
+                if not token_grams:
+                    continue
+                hits = set.intersection(*(postings.get(gram, set()) for gram in token_grams))
+                candidates = hits if candidates is None else candidates & hits
+            if candidates is None:
+                candidates = set(documents)
+            
+            query_grams = trigrams(" ".join(tokens))
+            scored: List[Tuple[int, float, str]] = []
+            for client_id in candidates:
+                if status and statuses.get(client_id) != status:
+                    continue
+                document = documents[client_id]
+                if not all(token in document for token in tokens):
+                    continue
+                words = document.split()
+                prefix_hits = sum(any(word.startswith(token) for word in words) for token in tokens)
+                document_grams = trigrams(document)
+                similarity = len(query_grams & document_grams) / len(query_grams | document_grams)
+                scored.append((-prefix_hits, -similarity, client_id))
+        
+        scored.sort()
+        return [client_id for _, _, client_id in scored]
+    
+    async def search(self, db, organization_id: str, term: str, status: Optional[str], skip: int, limit: int) -> List[Client]:
+        if not self.is_loaded(organization_id):
+            result = await db.execute(
+                select(Client.id, Client.search_document, Client.status)
+                .where(Client.organization_id == organization_id)
+            )
+            self.load(organization_id, result.all())
+        
+        # Filter and page in the index, so only one page of rows is loaded
+        page = self.rank(organization_id, term, status)[skip:skip + limit]
+        if not page:
+            return []
+        
+        query = select(Client).where(Client.organization_id == organization_id, Client.id.in_(page))
+        result = await db.execute(query)
+        clients = {client.id: client for client in result.scalars().all()}
+        return [clients[client_id] for client_id in page if client_id in clients]
+
+memory_index = InMemoryClientIndex()
+
+def _pending(target) -> Optional[dict]:
+    session = object_session(target)
+    return None if session is None else session.info.setdefault(PENDING_KEY, {})
+
+# Rows are captured at flush, when they are still loaded, and reach the
+# index only once the transaction commits
+@event.listens_for(Client, "after_insert")
+@event.listens_for(Client, "after_update")
+def _index_client(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending[(target.organization_id, target.id)] = (target.search_document, target.status)
+
+@event.listens_for(Client, "after_delete")
+def _unindex_client(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending[(target.organization_id, target.id)] = None
+
+@event.listens_for(Session, "after_commit")
+def _index_committed(session: Session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        memory_index.apply(pending)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session):
+    session.info.pop(PENDING_KEY, None)
+
+search_backend = TrigramClientSearch() if CLIENT_SEARCH_BACKEND == "trigram" else memory_index
+
+async def search_clients(db, organization_id: str, term: str, status: Optional[str] = None, skip: int = 0, limit: int = 100) -> List[Client]:
+    """Ranked client search: word-prefix matches first, then by trigram similarity"""
+    return await search_backend.search(db, organization_id, term, status, skip, limit)
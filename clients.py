@@ -1,89 +1,213 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, select
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
-from app.database import get_db
+from app.database import get_async_db
 from app.models.client import Client, FinancialGoal
 from app.models.user import User
 from app.schemas.client import (
     ClientCreate, ClientUpdate, ClientResponse,
     FinancialGoalCreate, FinancialGoalUpdate, FinancialGoalResponse
 )
-from app.core.auth import get_current_user, check_permissions
+from app.schemas.batch_lookup import BatchRequest, BatchResponse
+from app.schemas.goals import GoalSolveRequest, GoalSolveResponse
+from app.core.auth import get_current_user, check_permissions, require_permissions
+from app.core.pagination import paginate
+from app.core.batch import fetch_batch, parse_ids
+from app.core.entity_cache import CachedEntity, cache_entry, entity_cache
+from app.core.http_cache import conditional_response, page_not_modified
+from app.core.responses import SerializedRoute
+from app.services.client_overview import SECTIONS, load_client_overview, parse_fields, serialize_overview
+from app.services.client_search import search_clients
+from app.services.export import clients_export, export_response
+from app.services.goal_solver import load_goal_inputs, solve_goals
 
-router = APIRouter()
+router = APIRouter(route_class=SerializedRoute)
+
+async def get_org_client(db: AsyncSession, client_id: str, organization_id: str) -> Client:
+    """Load a client belonging to the organization or raise 404"""
+    result = await db.execute(
+        select(Client).where(
+            and_(
+                Client.id == client_id,
+                Client.organization_id == organization_id
+            )
+        )
+    )
+    client = result.scalars().first()
+    
+    if not client:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Client not found"
+        )
+    
+    return client
+
+async def load_client_entry(db: AsyncSession, client_id: str) -> Optional[CachedEntity]:
+    """Load a client for the entity cache"""
+    result = await db.execute(select(Client).where(Client.id == client_id))
+    client = result.scalars().first()
+    return cache_entry(client, client.organization_id) if client else None
 
 @router.get("/", response_model=List[ClientResponse])
 async def get_clients(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
     status: Optional[str] = Query(None),
     current_user: User = Depends(check_permissions(["clients:view"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all clients for the current organization with optional filtering"""
-    query = db.query(Client).filter(Client.organization_id == current_user.organization_id)
+    """Get all clients for the current organization with optional filtering.
     
-    # Apply search filter
+    Pass the X-Next-Cursor header of a full page as `cursor` to fetch the next
+    page by keyset instead of by offset. Searches match every word of `search`
+    against name, email and client number, best matches first. Unsearched
+    pages carry an ETag and answer If-None-Match with 304 Not Modified.
+    """
+    # Search results are ranked by relevance and paged by offset
     if search:
-        search_filter = or_(
-            Client.first_name.ilike(f"%{search}%"),
-            Client.last_name.ilike(f"%{search}%"),
-            Client.email.ilike(f"%{search}%"),
-            Client.client_number.ilike(f"%{search}%")
-        )
-        query = query.filter(search_filter)
+        return await search_clients(db, current_user.organization_id, search, status, skip, limit)
+    
+    query = select(Client).where(Client.organization_id == current_user.organization_id)
     
     # Apply status filter
     if status:
-        query = query.filter(Client.status == status)
+        query = query.where(Client.status == status)
+    
+    # Compare the page's versions with the client's copy before loading it
+    not_modified = await page_not_modified(db, request, response, query, Client, skip, limit, cursor)
+    if not_modified:
+        return not_modified
     
     # Apply pagination
-    clients = query.offset(skip).limit(limit).all()
-    return clients
+    result = await db.execute(paginate(query, Client, skip, limit, cursor))
+    return result.scalars().all()
+
+@router.get("/export")
+async def export_clients(
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    status: Optional[str] = Query(None),
+    current_user: User = Depends(check_permissions(["clients:view", "reports:export"]))
+):
+    """Stream every client of the organization as CSV or NDJSON"""
+    return export_response(clients_export(current_user.organization_id, status), export_format, "clients")
+
+async def fetch_clients(db: AsyncSession, current_user: User, ids: List[str]) -> dict:
+    """Load the organization's clients with the given ids in one query"""
+    query = select(Client).where(Client.organization_id == current_user.organization_id)
+    return await fetch_batch(db, query, Client, ids, "Client not found")
+
+@router.get("/batch", response_model=BatchResponse[ClientResponse])
+async def get_clients_batch(
+    ids: str = Query(..., description="Comma-separated client IDs"),
+    current_user: User = Depends(check_permissions(["clients:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get up to MAX_BATCH_IDS clients by ID in one query; ids that aren't
+    found are listed in `errors`"""
+    return await fetch_clients(db, current_user, parse_ids(ids))
+
+@router.post("/batch", response_model=BatchResponse[ClientResponse])
+async def post_clients_batch(
+    batch: BatchRequest,
+    current_user: User = Depends(check_permissions(["clients:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Same as GET /batch, for id lists too long for a URL"""
+    return await fetch_clients(db, current_user, parse_ids(batch.ids))
 
 @router.get("/{client_id}", response_model=ClientResponse)
 async def get_client(
     client_id: str,
+    request: Request,
+    response: Response,
     current_user: User = Depends(check_permissions(["clients:view"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get a specific client by ID"""
-    client = db.query(Client).filter(
-        and_(
-            Client.id == client_id,
-            Client.organization_id == current_user.organization_id
+    """Get a specific client by ID, read through the entity cache; honours
+    If-None-Match"""
+    client = await entity_cache.get(
+        "client", client_id, current_user.organization_id, lambda: load_client_entry(db, client_id)
+    )
+    
+    if not client:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Client not found"
         )
-    ).first()
     
+    return conditional_response(request, response, client.etag, client.last_modified) or client.values
+
+@router.get("/{client_id}/overview")
+async def get_client_overview(
+    client_id: str,
+    fields: Optional[str] = Query(None),
+    current_user: User = Depends(check_permissions(["clients:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Client page data in one call: the client, goals, portfolios with
+    their holdings, and scenarios.
+    
+    `fields` limits the sections and columns returned, e.g.
+    `fields=client.first_name,client.last_name,portfolios,holdings.symbol`.
+    Only the requested sections are queried, one batched query each.
+    """
+    sections = parse_fields(fields)
+    require_permissions(current_user, frozenset(SECTIONS[section][1] for section in sections))
+    
+    client = await db.run_sync(load_client_overview, client_id, current_user.organization_id, sections)
     if not client:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Client not found"
         )
     
-    return client
+    return serialize_overview(client, sections)
+
+async def client_number_taken(db: AsyncSession, organization_id: str, client_number: str, client_id: Optional[str] = None) -> bool:
+    """Whether another client of the organization has this client number"""
+    query = select(Client.id).where(
+        and_(
+            Client.client_number == client_number,
+            Client.organization_id == organization_id
+        )
+    )
+    if client_id:
+        query = query.where(Client.id != client_id)
+    result = await db.execute(query)
+    return result.first() is not None
+
+async def commit_client(db: AsyncSession, status_code: int):
+    """Commit a client write; a client number taken meanwhile by a
+    concurrent request violates the unique index and is reported as such"""
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status_code,
+            detail="Client number already exists in organization"
+        )
 
 @router.post("/", response_model=ClientResponse)
 async def create_client(
     client_data: ClientCreate,
     current_user: User = Depends(check_permissions(["clients:create"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new client"""
     # Ensure client belongs to current user's organization
     client_data.organization_id = current_user.organization_id
     
     # Check if client number is unique within organization
-    existing_client = db.query(Client).filter(
-        and_(
-            Client.client_number == client_data.client_number,
-            Client.organization_id == current_user.organization_id
-        )
-    ).first()
-    
-    if existing_client:
+    if await client_number_taken(db, current_user.organization_id, client_data.client_number):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Client number already exists in organization"
@@ -92,8 +216,8 @@ async def create_client(
     # Create new client
     db_client = Client(**client_data.model_dump())
     db.add(db_client)
-    db.commit()
-    db.refresh(db_client)
+    await commit_client(db, status.HTTP_400_BAD_REQUEST)
+    await db.refresh(db_client)
     
     return db_client
 
@@ -102,30 +226,28 @@ async def update_client(
     client_id: str,
     client_data: ClientUpdate,
     current_user: User = Depends(check_permissions(["clients:edit"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update an existing client"""
     # Find client
-    client = db.query(Client).filter(
-        and_(
-            Client.id == client_id,
-            Client.organization_id == current_user.organization_id
-        )
-    ).first()
+    client = await get_org_client(db, client_id, current_user.organization_id)
     
-    if not client:
+    # Update client fields
+    update_data = client_data.model_dump(exclude_unset=True)
+    new_number = update_data.get("client_number")
+    if new_number and new_number != client.client_number and await client_number_taken(
+        db, current_user.organization_id, new_number, client.id
+    ):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Client not found"
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Client number already exists in organization"
         )
     
-    # Update client fields
-    update_data = client_data.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(client, field, value)
     
-    db.commit()
-    db.refresh(client)
+    await commit_client(db, status.HTTP_409_CONFLICT)
+    await db.refresh(client)
     
     return client
 
@@ -133,25 +255,14 @@ async def update_client(
 async def delete_client(
     client_id: str,
     current_user: User = Depends(check_permissions(["clients:delete"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a client (soft delete by setting status to 'former')"""
-    client = db.query(Client).filter(
-        and_(
-            Client.id == client_id,
-            Client.organization_id == current_user.organization_id
-        )
-    ).first()
-    
-    if not client:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Client not found"
-        )
+    client = await get_org_client(db, client_id, current_user.organization_id)
     
     # Soft delete by setting status
     client.status = "former"
-    db.commit()
+    await db.commit()
     
     return {"message": "Client deleted successfully"}
 
@@ -160,47 +271,25 @@ async def delete_client(
 async def get_client_goals(
     client_id: str,
     current_user: User = Depends(check_permissions(["clients:view"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all financial goals for a client"""
     # Verify client exists and belongs to organization
-    client = db.query(Client).filter(
-        and_(
-            Client.id == client_id,
-            Client.organization_id == current_user.organization_id
-        )
-    ).first()
+    await get_org_client(db, client_id, current_user.organization_id)
     
-    if not client:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Client not found"
-        )
-    
-    goals = db.query(FinancialGoal).filter(FinancialGoal.client_id == client_id).all()
-    return goals
+    result = await db.execute(select(FinancialGoal).where(FinancialGoal.client_id == client_id))
+    return result.scalars().all()
 
 @router.post("/{client_id}/goals", response_model=FinancialGoalResponse)
 async def create_client_goal(
     client_id: str,
     goal_data: FinancialGoalCreate,
     current_user: User = Depends(check_permissions(["planning:create"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new financial goal for a client"""
     # Verify client exists and belongs to organization
-    client = db.query(Client).filter(
-        and_(
-            Client.id == client_id,
-            Client.organization_id == current_user.organization_id
-        )
-    ).first()
-    
-    if not client:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Client not found"
-        )
+    await get_org_client(db, client_id, current_user.organization_id)
     
     # Ensure goal belongs to the correct client
     goal_data.client_id = client_id
@@ -208,7 +297,39 @@ async def create_client_goal(
     # Create new goal
     db_goal = FinancialGoal(**goal_data.model_dump())
     db.add(db_goal)
-    db.commit()
-    db.refresh(db_goal)
+    await db.commit()
+    await db.refresh(db_goal)
+    
+    return db_goal
+
+@router.post("/{client_id}/goals/solve", response_model=GoalSolveResponse)
+async def solve_client_goals(
+    client_id: str,
+    options: GoalSolveRequest = GoalSolveRequest(),
+    current_user: User = Depends(check_permissions(["clients:view", "planning:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Allocate the client's portfolios and a monthly budget across all of
+    their active goals by priority.
+    
+    Nothing is stored, so the UI can call this on every change of the
+    inputs. Set `volatility` to size allocations by simulation instead of
+    closed-form growth.
+    """
+    await get_org_client(db, client_id, current_user.organization_id)
+    goals, assets = await db.run_sync(load_goal_inputs, client_id)
     
-    return db_goal
\ No newline at end of file
+    # The simulation is CPU-bound; keep it off the event loop
+    solution = await run_in_threadpool(
+        solve_goals,
+        goals,
+        assets if options.include_portfolios else 0.0,
+        options.monthly_contribution,
+        options.expected_return,
+        volatility=options.volatility,
+        confidence=options.confidence,
+        paths=options.paths,
+        seed=options.seed,
+        as_of=options.as_of
+    )
+    return {"client_id": client_id, **solution}
@@ -1,6 +1,10 @@
 from sqlalchemy import create_engine, MetaData
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from app.core.metrics import instrument_engine
+from app.migrations import lock_migrations, prepare_database, run_migrations
 import os
 from dotenv import load_dotenv
 
@@ -11,17 +15,84 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable not set")
 
+# Connection pool configuration
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# How request handlers reach the database:
+#   "threaded" - the sync engine, with each call run on a worker thread
+#   "native"   - an async driver (asyncpg for PostgreSQL, aiosqlite for SQLite)
+DB_ASYNC_MODE = os.getenv("DB_ASYNC_MODE", "threaded")
+
+# Async drivers for each sync dialect
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def _pool_options(url) -> dict:
+    """Pool sizing for server databases (SQLite uses its own pool classes)"""
+    if url.get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": 300,
+    }
+
+def get_async_database_url(url: str):
+    """Translate the configured URL to its async driver equivalent"""
+    url = make_url(url)
+    if url.drivername not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {url.drivername}")
+    url = url.set(drivername=ASYNC_DRIVERS[url.drivername])
+    # asyncpg takes "ssl" rather than libpq's "sslmode"
+    if "sslmode" in url.query:
+        query = dict(url.query)
+        query["ssl"] = query.pop("sslmode")
+        url = url.set(query=query)
+    return url
+
 # Create engine
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
-    pool_recycle=300,
-    echo=False  # Set to True for SQL debugging
+    echo=False,  # Set to True for SQL debugging
+    **_pool_options(make_url(DATABASE_URL))
 )
+instrument_engine(engine, "sync")
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Sessions handed to async route handlers never expire loaded objects on
+# commit, so serializing a response can't trigger lazy IO on the event loop
+ThreadedSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
+)
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC_MODE == "native":
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    
+    async_url = get_async_database_url(DATABASE_URL)
+    async_engine = create_async_engine(
+        async_url,
+        pool_pre_ping=True,
+        echo=False,
+        **_pool_options(async_url)
+    )
+    instrument_engine(async_engine.sync_engine, "async")
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+elif DB_ASYNC_MODE != "threaded":
+    raise ValueError(f"Unknown DB_ASYNC_MODE: {DB_ASYNC_MODE}")
+
 # Base class for models
 Base = declarative_base()
 metadata = MetaData()
@@ -34,6 +105,93 @@ def get_db():
     finally:
         db.close()
 
+class ThreadedAsyncSession:
+    """AsyncSession-compatible wrapper that runs a sync Session on worker threads.
+    
+    Only one call is in flight at a time, so the underlying Session is never
+    used from two threads at once.
+    """
+    
+    def __init__(self, session):
+        self.sync_session = session
+    
+    def _execute(self, statement, params=None, **kwargs):
+        result = self.sync_session.execute(statement, params, **kwargs)
+        # Fetch rows on the worker thread, as AsyncSession buffers them too
+        if not getattr(result, "returns_rows", True):
+            return result
+        return result.freeze()()
+    
+    async def execute(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self._execute, statement, params, **kwargs)
+    
+    async def scalar(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params, **kwargs)
+    
+    async def scalars(self, statement, params=None, **kwargs):
+        result = await self.execute(statement, params, **kwargs)
+        return result.scalars()
+    
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+    
+    async def run_sync(self, fn, *args, **kwargs):
+        """Call fn(session, *args, **kwargs) on a worker thread"""
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+    
+    def add(self, instance):
+        self.sync_session.add(instance)
+    
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+    
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+    
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+    
+    async def refresh(self, instance, attribute_names=None):
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+    
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+    
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+    
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+async def get_async_db():
+    """Dependency to get a database session for async route handlers"""
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            yield session
+        return
+    
+    session = ThreadedAsyncSession(ThreadedSessionLocal())
+    try:
+        yield session
+    finally:
+        await session.close()
+
+def dialect_insert(session):
+    """INSERT construct supporting ON CONFLICT for the session's database"""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Upserts are not supported on {dialect}")
+    return insert
+
 def create_tables():
-    """Create all database tables"""
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    """Create all database tables and apply pending migrations"""
+    prepare_database(engine)
+    # Under the migration lock, so workers starting together don't race
+    with engine.begin() as conn:
+        lock_migrations(conn)
+        Base.metadata.create_all(bind=conn)
+    run_migrations(engine)
\ No newline at end of file
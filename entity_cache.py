@@ -0,0 +1,344 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, NamedTuple, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session, object_session
+
+from app.core.cache import TTLCache
+from app.core.http_cache import entity_etag
+from app.core.metrics import Gauge, registry
+from app.core.responses import dumps
+from app.models.client import Client
+from app.models.portfolio import Portfolio
+
+try:
+    import redis
+except ImportError:  # Optional; without it there is no shared tier
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Per-process tier. Kept short: other workers' writes only reach it by expiry
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", "10000"))
+ENTITY_CACHE_LOCAL_TTL = float(os.getenv("ENTITY_CACHE_LOCAL_TTL_SECONDS", "5"))
+
+# Shared tier across workers: a redis:// URL, "memory" for an in-process
+# stand-in, or unset for none
+ENTITY_CACHE_URL = os.getenv("ENTITY_CACHE_URL")
+ENTITY_CACHE_SHARED_TTL = int(os.getenv("ENTITY_CACHE_SHARED_TTL_SECONDS", "300"))
+
+# Session.info key collecting the entities a transaction has written
+PENDING_KEY = "entity_cache_invalidations"
+
+class MemoryBackend:
+    """In-process stand-in for the shared tier, with the same interface as
+    RedisBackend. Values are stored as bytes, as they would be in Redis."""
+    
+    def __init__(self, maxsize: int = 100000):
+        self._cache = TTLCache(maxsize=maxsize)
+    
+    def get(self, key: str) -> Optional[bytes]:
+        return self._cache.get(key)
+    
+    def get_many(self, *keys: str) -> list:
+        return [self._cache.get(key) for key in keys]
+    
+    def set(self, key: str, value: bytes, ttl: int):
+        self._cache.set(key, value, ttl)
+    
+    def incr(self, keys: Iterable[str], ttl: int):
+        for key in keys:
+            self._cache.set(key, str(int(self._cache.get(key) or 0) + 1).encode(), ttl)
+    
+    def delete(self, *keys: str):
+        for key in keys:
+            self._cache.delete(key)
+
+class RedisBackend:
+    """Shared tier on any Redis-compatible server"""
+    
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("ENTITY_CACHE_URL is set but the redis package is not installed")
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5)
+    
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+    
+    def get_many(self, *keys: str) -> list:
+        return self._client.mget(keys)
+    
+    def set(self, key: str, value: bytes, ttl: int):
+        self._client.set(key, value, ex=ttl)
+    
+    def incr(self, keys: Iterable[str], ttl: int):
+        """Increment counters, each expiring ttl seconds after its last change"""
+        pipeline = self._client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.incr(key)
+            pipeline.expire(key, ttl)
+        pipeline.execute()
+    
+    def delete(self, *keys: str):
+        self._client.delete(*keys)
+
+def shared_backend(url: Optional[str]):
+    """The shared tier configured by a URL, if any"""
+    if not url:
+        return None
+    if url == "memory":
+        return MemoryBackend()
+    return RedisBackend(url)
+
+class CachedEntity(NamedTuple):
+    """A cached row: its column values (as the API returns them), owning
+    organization and HTTP validators"""
+    values: dict
+    organization_id: str
+    etag: str
+    
+    @property
+    def last_modified(self) -> Optional[datetime]:
+        updated_at = self.values.get("updated_at") or self.values.get("created_at")
+        return datetime.fromisoformat(updated_at) if updated_at else None
+
+def cache_entry(instance, organization_id: str) -> CachedEntity:
+    """Snapshot a loaded ORM row for the cache"""
+    values = {attr.key: getattr(instance, attr.key) for attr in sa_inspect(type(instance)).column_attrs}
+    # Round-trip through JSON so every tier hands back identical values
+    return CachedEntity(json.loads(dumps(values)), organization_id, entity_etag(instance))
+
+class EntityCache:
+    """Two-tier read-through cache of single rows keyed by kind and id.
+    
+    Lookups check the local LRU, then the shared tier, then call the
+    loader. Concurrent misses for the same key in a process share one load.
+    Entries record their organization, and a lookup from another tenant is
+    a miss, so cached rows never cross organizations. Entities written in
+    a transaction are dropped from both tiers once it commits.
+    
+    Each key has a version counter in the shared tier, bumped by every
+    invalidation. A shared entry is stored with the version read before
+    its row was loaded and only served while that version is current, so
+    a worker that loaded a row before another worker's commit can't put
+    the old row back.
+    """
+    
+    def __init__(self, local: TTLCache, shared=None, shared_ttl: int = ENTITY_CACHE_SHARED_TTL, namespace: str = "entity"):
+        self.local = local
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.namespace = namespace
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._listeners: Dict[str, list] = {}
+        # Bumped by every invalidation, so a load that raced one isn't stored
+        self._generation = 0
+        self.shared_hits = 0
+        self.loads = 0
+        self.coalesced = 0
+        self.shared_errors = 0
+    
+    def on_invalidate(self, kind: str, listener: Callable[[list], None]):
+        """Also call listener(ids) whenever entities of this kind are
+        invalidated, for caches kept outside this one"""
+        self._listeners.setdefault(kind, []).append(listener)
+    
+    def key(self, kind: str, id: str) -> str:
+        return f"{self.namespace}:{kind}:{id}"
+    
+    def version_key(self, key: str) -> str:
+        return f"{key}:version"
+    
+    @property
+    def version_ttl(self) -> int:
+        # Outlives any entry written under the version, so a lapsed counter
+        # can't restart at a number an old entry still carries
+        return self.shared_ttl * 2
+    
+    async def get(
+        self, kind: str, id: str, organization_id: str,
+        load: Callable[[], Awaitable[Optional[CachedEntity]]]
+    ) -> Optional[CachedEntity]:
+        """Return the organization's entity, loading it on a miss; None when
+        it doesn't exist or belongs to another organization"""
+        key = self.key(kind, id)
+        entry = self.local.get(key)
+        if entry is None:
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.coalesced += 1
+                entry = await asyncio.shield(inflight)
+            else:
+                entry = await self._fill(key, load)
+        
+        if entry is None or entry.organization_id != organization_id:
+            return None
+        return entry
+    
+    async def _fill(self, key: str, load) -> Optional[CachedEntity]:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            entry = await self._read_through(key, load)
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # Waiters re-raise it; don't log it as unretrieved
+            raise
+        else:
+            future.set_result(entry)
+            return entry
+        finally:
+            del self._inflight[key]
+    
+    async def _read_through(self, key: str, load) -> Optional[CachedEntity]:
+        generation = self._generation
+        version = None
+        if self.shared is not None:
+            found = await self._shared_call(self.shared.get_many, self.version_key(key), key)
+            if found:
+                version = int(found[0] or 0)
+                if found[1]:
+                    stored_version, *fields = json.loads(found[1])
+                    if stored_version == version:
+                        self.shared_hits += 1
+                        entry = CachedEntity(*fields)
+                        self.local.set(key, entry)
+                        return entry
+        
+        self.loads += 1
+        entry = await load()
+        if entry is None or generation != self._generation:
+            return entry
+        
+        self.local.set(key, entry)
+        if version is not None:
+            await self._shared_call(self.shared.set, key, dumps([version, *entry]), self.shared_ttl)
+        return entry
+    
+    async def _shared_call(self, method, *args):
+        """Call the shared tier off the event loop; an outage degrades to
+        database reads instead of failing requests"""
+        try:
+            return await run_in_threadpool(method, *args)
+        except Exception:
+            self.shared_errors += 1
+            logger.warning("Entity cache shared tier unavailable", exc_info=True)
+            return None
+    
+    async def shared_version(self, kind: str, id: str) -> Optional[int]:
+        """The entity's invalidation count in the shared tier, for caches
+        kept elsewhere to check their copies against; None without a shared
+        tier or while it is unavailable"""
+        if self.shared is None:
+            return None
+        found = await self._shared_call(self.shared.get_many, self.version_key(self.key(kind, id)))
+        return int(found[0] or 0) if found else None
+    
+    def invalidate(self, kind: str, ids: Iterable[str]):
+        """Drop entities from both tiers"""
+        ids = list(ids)
+        keys = [self.key(kind, id) for id in ids]
+        if not keys:
+            return
+        self._generation += 1
+        for key in keys:
+            self.local.delete(key)
+        for listener in self._listeners.get(kind, ()):
+            listener(ids)
+        if self.shared is None:
+            return
+        # Commits of native async sessions run their hooks on the event loop:
+        # hand the shared tier's I/O to a worker thread there
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._invalidate_shared(keys)
+        else:
+            loop.run_in_executor(None, self._invalidate_shared, keys)
+    
+    def _invalidate_shared(self, keys: list):
+        try:
+            self.shared.incr([self.version_key(key) for key in keys], self.version_ttl)
+            self.shared.delete(*keys)
+        except Exception:
+            self.shared_errors += 1
+            logger.warning("Entity cache shared tier unavailable", exc_info=True)
+    
+    def stats(self) -> dict:
+        """Per-tier counters for monitoring"""
+        local = self.local.stats()
+        lookups = local["hits"] + local["misses"]
+        return {
+            "local": local,
+            "shared": self.shared is not None and type(self.shared).__name__,
+            "shared_hits": self.shared_hits,
+            "shared_errors": self.shared_errors,
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "hit_rate": 1 - self.loads / lookups if lookups else 0.0,
+        }
+
+entity_cache = EntityCache(
+    TTLCache(maxsize=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_LOCAL_TTL),
+    shared_backend(ENTITY_CACHE_URL),
+)
+
+def _lookups() -> Dict[tuple, float]:
+    stats = entity_cache.stats()
+    return {
+        ("local_hit",): stats["local"]["hits"],
+        ("shared_hit",): stats["shared_hits"],
+        ("coalesced",): stats["coalesced"],
+        ("load",): stats["loads"],
+    }
+
+registry.register(Gauge(
+    "entity_cache_entries", "Entities held in this process's tier", (), lambda: {(): entity_cache.stats()["local"]["size"]}
+))
+registry.register(Gauge(
+    "entity_cache_lookups", "Entity cache lookups since start, by where they were served from", ("result",), _lookups
+))
+registry.register(Gauge(
+    "entity_cache_shared_errors", "Failed calls to the shared tier since start", (), lambda: {(): entity_cache.stats()["shared_errors"]}
+))
+registry.register(Gauge(
+    "entity_cache_hit_ratio", "Share of entity lookups served without a database load", (), lambda: {(): entity_cache.stats()["hit_rate"]}
+))
+
+def invalidate_on_commit(session: Session, kind: str, ids: Iterable[str]):
+    """Drop these entities from the cache when the session's transaction
+    commits, e.g. after a bulk UPDATE the ORM events don't see"""
+    session.info.setdefault(PENDING_KEY, set()).update((kind, id) for id in ids)
+
+def cache_model(model, kind: str):
+    """Invalidate a model's cached rows whenever the ORM updates or deletes them"""
+    def _pending(mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            invalidate_on_commit(session, kind, [target.id])
+    event.listen(model, "after_update", _pending)
+    event.listen(model, "after_delete", _pending)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if not pending:
+        return
+    by_kind: Dict[str, list] = {}
+    for kind, id in pending:
+        by_kind.setdefault(kind, []).append(id)
+    for kind, ids in by_kind.items():
+        entity_cache.invalidate(kind, ids)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session):
+    session.info.pop(PENDING_KEY, None)
+
+# Entities served through the cache
+cache_model(Client, "client")
+cache_model(Portfolio, "portfolio")
@@ -0,0 +1,147 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Iterator, Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import JSON, Date, DateTime, select
+
+from app.database import SessionLocal
+from app.models.client import Client
+from app.models.portfolio import Holding, Portfolio, PortfolioTransaction
+
+# Rows fetched from the server-side cursor (and written out) per batch
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# Internal columns that never leave the database
+EXCLUDED_COLUMNS = {"search_document"}
+
+def _columns(model):
+    return [column for column in model.__table__.columns if column.name not in EXCLUDED_COLUMNS]
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return str(value)  # Same as the API: no float rounding
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def _csv_converters(statement):
+    """(position, converter) for the columns csv.writer can't write as-is.
+    
+    None, text and Decimal are written natively; only dates and JSON need
+    converting, so most values skip the Python-level call entirely.
+    """
+    converters = []
+    for position, column in enumerate(statement.selected_columns):
+        if isinstance(column.type, (DateTime, Date)):
+            converters.append((position, _json_value))
+        elif isinstance(column.type, JSON):
+            converters.append((position, lambda value: json.dumps(value, default=_json_value, separators=(",", ":"))))
+    return converters
+
+def _format_csv(keys, rows, header: bool, converters) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(keys)
+    if converters:
+        rows = [list(row) for row in rows]
+        for values in rows:
+            for position, convert in converters:
+                if values[position] is not None:
+                    values[position] = convert(values[position])
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+def _format_ndjson(keys, rows, header: bool, converters) -> str:
+    return "".join(
+        json.dumps(dict(zip(keys, row)), default=_json_value, separators=(",", ":")) + "\n"
+        for row in rows
+    )
+
+def stream_rows(statement, export_format: str) -> Iterator[str]:
+    """Run a select on a server-side cursor and yield it as CSV or NDJSON text.
+    
+    Only one batch of rows is held at a time, so memory stays flat however
+    large the result. The session lives as long as the stream.
+    """
+    formatter = _format_csv if export_format == "csv" else _format_ndjson
+    converters = _csv_converters(statement) if export_format == "csv" else None
+    session = SessionLocal()
+    try:
+        result = session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        keys = list(result.keys())
+        header = True
+        for rows in result.partitions():
+            yield formatter(keys, rows, header, converters)
+            header = False
+        # An empty CSV still gets its header row
+        if header and export_format == "csv":
+            yield formatter(keys, [], header, converters)
+    finally:
+        session.close()
+
+def export_response(statement, export_format: str, name: str) -> StreamingResponse:
+    """Stream a select as a downloadable file"""
+    if export_format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported export format: {export_format}"
+        )
+    
+    filename = f"{name}-{datetime.now(timezone.utc):%Y%m%d}.{export_format}"
+    return StreamingResponse(
+        stream_rows(statement, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def clients_export(organization_id: str, client_status: Optional[str] = None):
+    """Select for every client of the organization, oldest first"""
+    statement = select(*_columns(Client)).where(Client.organization_id == organization_id)
+    if client_status:
+        statement = statement.where(Client.status == client_status)
+    return statement.order_by(Client.created_at, Client.id)
+
+def holdings_export(organization_id: str, portfolio_id: Optional[str] = None):
+    """Select for the organization's holdings, grouped by portfolio"""
+    statement = (
+        select(*_columns(Holding))
+        .join(Portfolio, Holding.portfolio_id == Portfolio.id)
+        .join(Client, Portfolio.client_id == Client.id)
+        .where(Client.organization_id == organization_id)
+    )
+    if portfolio_id:
+        statement = statement.where(Holding.portfolio_id == portfolio_id)
+    return statement.order_by(Holding.portfolio_id, Holding.symbol)
+
+def transactions_export(
+    organization_id: str,
+    portfolio_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """Select for the organization's transaction history, by portfolio and trade date"""
+    statement = (
+        select(*_columns(PortfolioTransaction))
+        .join(Portfolio, PortfolioTransaction.portfolio_id == Portfolio.id)
+        .join(Client, Portfolio.client_id == Client.id)
+        .where(Client.organization_id == organization_id)
+    )
+    if portfolio_id:
+        statement = statement.where(PortfolioTransaction.portfolio_id == portfolio_id)
+    if start:
+        statement = statement.where(PortfolioTransaction.trade_date >= start)
+    if end:
+        statement = statement.where(PortfolioTransaction.trade_date < end)
+    return statement.order_by(PortfolioTransaction.portfolio_id, PortfolioTransaction.trade_date, PortfolioTransaction.id)
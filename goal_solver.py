@@ -0,0 +1,210 @@
+import os
+import numpy as np
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from app.models.client import FinancialGoal
+from app.models.portfolio import Portfolio
+from app.services.monte_carlo import MONTHS_PER_YEAR
+
+# Funding order; goals with other priorities rank as medium
+PRIORITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+# Statuses of the goals that take part (a missing status counts as active)
+SOLVED_STATUSES = ("active",)
+
+# Simulation budget: paths are cut so paths x months of the longest horizon
+# stays within it, but never below MIN_PATHS
+MAX_PATH_MONTHS = int(os.getenv("GOAL_SOLVER_MAX_PATH_MONTHS", str(20000 * 240)))
+MIN_PATHS = 500
+
+def load_goal_inputs(session: Session, client_id: str) -> Tuple[list, float]:
+    """A client's active goals and the value of their active portfolios, in
+    two queries"""
+    goals = session.execute(
+        select(
+            FinancialGoal.id, FinancialGoal.name, FinancialGoal.priority, FinancialGoal.target_amount,
+            FinancialGoal.current_amount, FinancialGoal.target_date,
+        )
+        .where(
+            FinancialGoal.client_id == client_id,
+            or_(FinancialGoal.status.is_(None), FinancialGoal.status.in_(SOLVED_STATUSES))
+        )
+    ).all()
+    assets = session.execute(
+        select(func.coalesce(func.sum(Portfolio.total_value), 0))
+        .where(Portfolio.client_id == client_id, Portfolio.is_active.is_not(False))
+    ).scalar()
+    return goals, float(assets)
+
+def months_until(as_of: date, target) -> int:
+    """Whole months from as_of to a target date, never negative"""
+    target = target.date() if isinstance(target, datetime) else target
+    months = (target.year - as_of.year) * MONTHS_PER_YEAR + target.month - as_of.month
+    if target.day < as_of.day:
+        months -= 1
+    return max(months, 0)
+
+def _waterfall(needs: np.ndarray, available: float) -> np.ndarray:
+    """Allocate `available` to needs in order, each taking all it needs
+    until the money runs out"""
+    needs = np.maximum(needs, 0.0)
+    before = np.cumsum(needs) - needs
+    return np.clip(available - before, 0.0, needs)
+
+def _closed_form(months: np.ndarray, expected_return: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Growth of a lump sum and of 1 paid at the start of every month, over
+    each horizon"""
+    rate = (1.0 + expected_return / 100.0) ** (1.0 / MONTHS_PER_YEAR) - 1.0
+    growth = (1.0 + rate) ** months
+    if abs(rate) < 1e-12:
+        return growth, months.astype(np.float64)
+    return growth, (1.0 + rate) * (growth - 1.0) / rate
+
+def simulated_paths(months: np.ndarray, paths: int) -> int:
+    """Paths to simulate, fewer for long horizons so paths x months stays
+    within MAX_PATH_MONTHS"""
+    horizon = int(months.max()) if len(months) else 0
+    if horizon == 0:
+        return paths
+    return min(paths, max(MAX_PATH_MONTHS // horizon, MIN_PATHS))
+
+def _simulated(
+    months: np.ndarray, expected_return: float, volatility: float, paths: int, seed: Optional[int]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-path growth of a lump sum and of monthly contributions over each
+    horizon (paths x goals).
+    
+    One set of lognormal market paths, as in monte_carlo.simulate, serves
+    every goal. The paths are advanced month by month, a year of shocks per
+    draw, keeping only the running growth of 1 and of 1 paid at the start
+    of each month, and both are recorded as each goal's horizon is reached;
+    memory is paths x goals whatever the horizon.
+    """
+    rng = np.random.default_rng(seed)
+    horizon = int(months.max()) if len(months) else 0
+    sigma = volatility / 100.0 / np.sqrt(MONTHS_PER_YEAR)
+    mu = np.log1p(expected_return / 100.0) / MONTHS_PER_YEAR - 0.5 * sigma ** 2
+    
+    growth = np.ones((paths, len(months)))
+    annuity = np.zeros((paths, len(months)))
+    reached = defaultdict(list)
+    for column, month in enumerate(months.tolist()):
+        if month > 0:
+            reached[month].append(column)
+    
+    # Antithetic pairs, as in the scenario simulation
+    half = (paths + 1) // 2
+    draws = np.empty((MONTHS_PER_YEAR, half), dtype=np.float64)
+    shocks = np.empty((MONTHS_PER_YEAR, paths), dtype=np.float64)
+    cumulative = np.ones(paths, dtype=np.float64)
+    paid = np.zeros(paths, dtype=np.float64)
+    
+    for first in range(0, horizon, MONTHS_PER_YEAR):
+        rng.standard_normal(out=draws)
+        shocks[:, :half] = draws
+        np.negative(draws[:, :paths - half], out=shocks[:, half:])
+        shocks *= sigma
+        shocks += mu
+        np.exp(shocks, out=shocks)
+        for month, step in enumerate(shocks[:horizon - first], start=first + 1):
+            paid += 1.0
+            paid *= step
+            cumulative *= step
+            columns = reached.get(month)
+            if columns:
+                growth[:, columns] = cumulative[:, None]
+                annuity[:, columns] = paid[:, None]
+    
+    return growth, annuity
+
+def solve_goals(
+    goals: Sequence,
+    available_assets: float,
+    monthly_contribution: float,
+    expected_return: float,
+    volatility: Optional[float] = None,
+    confidence: float = 0.75,
+    paths: int = 2000,
+    seed: Optional[int] = None,
+    as_of: Optional[date] = None,
+) -> dict:
+    """Allocate assets and a monthly budget across goals by priority.
+    
+    Goals are funded in priority order, then by target date. Each goal's
+    current_amount is already set aside for it; the available assets (less
+    what the goals already hold) then go to each goal in turn as the lump
+    sum that meets its target on growth alone, and the monthly budget
+    covers the remaining gaps the same way. Targets are nominal.
+    
+    Without volatility the growth factors are closed-form annuity values.
+    With it they come from a Monte Carlo run shared by all goals, and each
+    allocation is sized to succeed with the given confidence, on fewer
+    paths than asked for when the horizon is long (see MAX_PATH_MONTHS).
+    Everything is computed across goals at once; there is no per-goal loop.
+    """
+    as_of = as_of or date.today()
+    goals = sorted(goals, key=lambda goal: (PRIORITY_ORDER.get(goal.priority, 1), goal.target_date, goal.id))
+    
+    months = np.array([months_until(as_of, goal.target_date) for goal in goals], dtype=np.int64)
+    targets = np.array([float(goal.target_amount) for goal in goals])
+    current = np.array([float(goal.current_amount or 0) for goal in goals])
+    assets = max(available_assets - float(current.sum()), 0.0)
+    
+    stochastic = bool(volatility) and len(goals) > 0
+    if stochastic:
+        paths = simulated_paths(months, paths)
+        growth, annuity = _simulated(months, expected_return, volatility, paths, seed)
+        def needed(values):
+            return np.quantile(values, confidence, axis=0)
+    else:
+        growth, annuity = _closed_form(months, expected_return)
+        def needed(values):
+            return values
+    
+    lump = _waterfall(needed(targets / growth - current), assets)
+    gap = targets - (current + lump) * growth
+    with np.errstate(divide="ignore", invalid="ignore"):
+        required = needed(np.where(annuity > 0, gap / annuity, np.where(gap > 0, np.inf, 0.0)))
+    required = np.maximum(required, 0.0)
+    # Past-dated goals can't be helped by contributions
+    contribution = _waterfall(np.where(np.isfinite(required), required, 0.0), monthly_contribution)
+    
+    projected = (current + lump) * growth + contribution * annuity
+    probability = None
+    if stochastic:
+        probability = (projected >= targets).mean(axis=0)
+        projected = np.median(projected, axis=0)
+    funded = np.divide(projected, targets, out=np.ones_like(projected), where=targets > 0)
+    
+    return {
+        "method": "monte_carlo" if stochastic else "closed_form",
+        "paths": paths if stochastic else None,
+        "available_assets": round(available_assets, 2),
+        "monthly_contribution": round(monthly_contribution, 2),
+        "unallocated_assets": round(max(assets - float(lump.sum()), 0.0), 2),
+        "unallocated_monthly_contribution": round(max(monthly_contribution - float(contribution.sum()), 0.0), 2),
+        "goals": [
+            {
+                "goal_id": goal.id,
+                "name": goal.name,
+                "priority": goal.priority or "medium",
+                "target_amount": float(goal.target_amount),
+                "target_date": goal.target_date,
+                "months": int(months[i]),
+                "current_amount": float(current[i]),
+                "allocated_assets": round(float(lump[i]), 2),
+                "allocated_monthly_contribution": round(float(contribution[i]), 2),
+                "required_monthly_contribution": round(float(required[i]), 2) if np.isfinite(required[i]) else None,
+                "projected_value": round(float(projected[i]), 2),
+                "funded_ratio": round(float(funded[i]), 4),
+                "shortfall": round(max(float(targets[i] - projected[i]), 0.0), 2),
+                "probability_of_success": None if probability is None else round(float(probability[i]), 4),
+            }
+            for i, goal in enumerate(goals)
+        ],
+    }
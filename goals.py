@@ -0,0 +1,39 @@
+from pydantic import BaseModel, Field
+from datetime import date, datetime
+from typing import List, Optional
+
+class GoalSolveRequest(BaseModel):
+    monthly_contribution: float = Field(0, ge=0)  # Budget shared by all goals
+    expected_return: float = Field(5.0, ge=-50, le=50)  # Annual, percent
+    volatility: Optional[float] = Field(None, ge=0, le=100)  # Annual, percent; set to simulate
+    confidence: float = Field(0.75, ge=0.5, le=0.99)  # Chance of success funded for when simulating
+    paths: int = Field(2000, ge=500, le=20000)
+    seed: Optional[int] = None
+    include_portfolios: bool = True  # Allocate the client's active portfolios
+    as_of: Optional[date] = None
+
+class GoalFunding(BaseModel):
+    goal_id: str
+    name: str
+    priority: str
+    target_amount: float
+    target_date: datetime
+    months: int
+    current_amount: float
+    allocated_assets: float  # From the portfolios, on top of current_amount
+    allocated_monthly_contribution: float
+    required_monthly_contribution: Optional[float] = None  # To fully fund; None once the date has passed
+    projected_value: float  # Median when simulating
+    funded_ratio: float
+    shortfall: float
+    probability_of_success: Optional[float] = None
+
+class GoalSolveResponse(BaseModel):
+    client_id: str
+    method: str  # closed_form or monte_carlo
+    paths: Optional[int] = None  # Simulated, after the horizon budget
+    available_assets: float
+    monthly_contribution: float
+    unallocated_assets: float
+    unallocated_monthly_contribution: float
+    goals: List[GoalFunding]
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from datetime import date
+from decimal import Decimal
+from typing import List
+
+class HistoryPoint(BaseModel):
+    date: date
+    value: Decimal  # Closing value on the last day of the period
+    net_flows: Decimal  # Deposits less withdrawals over the period
+
+class PortfolioHistoryResponse(BaseModel):
+    portfolio_id: str
+    granularity: str
+    points: List[HistoryPoint]
@@ -0,0 +1,248 @@
+import codecs
+import csv
+import io
+import json
+import os
+import uuid
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, Request, status
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.database import dialect_insert
+from app.models.client import Client
+from app.models.portfolio import Holding, Portfolio
+from app.schemas.bulk_holdings import HoldingImportRow
+from app.services.valuation import recompute_portfolio_values
+
+# Rows validated and upserted per statement
+HOLDINGS_UPSERT_CHUNK_SIZE = int(os.getenv("HOLDINGS_UPSERT_CHUNK_SIZE", "5000"))
+# Row errors returned in a response; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+_rows_adapter = TypeAdapter(List[HoldingImportRow])
+
+# Descriptive fields a feed may leave blank without clearing the stored value
+_KEEP_WHEN_MISSING = ("sector", "region", "average_cost")
+
+async def _iter_json_rows(request: Request) -> AsyncIterator[dict]:
+    try:
+        payload = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON body")
+    
+    if isinstance(payload, dict):
+        payload = payload.get("holdings")
+    if not isinstance(payload, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a list of holdings or {\"holdings\": [...]}"
+        )
+    
+    for row in payload:
+        yield row
+
+async def _iter_csv_rows(request: Request) -> AsyncIterator[dict]:
+    """Parse a CSV body as it arrives, without buffering the whole file"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    header: Optional[List[str]] = None
+    pending = ""
+    
+    def records(text: str):
+        nonlocal header
+        for record in csv.reader(io.StringIO(text)):
+            if not record:
+                continue
+            if header is None:
+                header = [column.strip().lower() for column in record]
+                continue
+            yield {column: (value if value != "" else None) for column, value in zip(header, record)}
+    
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        # Only parse up to a line break that isn't inside a quoted field
+        end = pending.rfind("\n")
+        while end != -1 and pending.count('"', 0, end) % 2:
+            end = pending.rfind("\n", 0, end)
+        if end == -1:
+            continue
+        complete, pending = pending[:end + 1], pending[end + 1:]
+        for row in records(complete):
+            yield row
+    
+    pending += decoder.decode(b"", final=True)
+    for row in records(pending):
+        yield row
+
+def iter_request_rows(request: Request) -> AsyncIterator[dict]:
+    """Holding rows from a JSON or CSV request body"""
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return _iter_csv_rows(request)
+    if content_type == "application/json":
+        return _iter_json_rows(request)
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail="Send holdings as application/json or text/csv"
+    )
+
+def validate_rows(rows: List[dict], first_row: int) -> Tuple[List[Tuple[int, HoldingImportRow]], List[dict]]:
+    """Validate a chunk in one pass, returning (row number, holding) pairs and row errors"""
+    try:
+        return list(enumerate(_rows_adapter.validate_python(rows), first_row)), []
+    except ValidationError as exc:
+        errors, failed = [], set()
+        for error in exc.errors():
+            location = error["loc"]
+            index = location[0] if location and isinstance(location[0], int) else 0
+            failed.add(index)
+            errors.append({
+                "row": first_row + index,
+                "field": ".".join(str(part) for part in location[1:]) or None,
+                "message": error["msg"]
+            })
+    
+    # Second pass over the rows that passed, so one bad row doesn't sink the chunk
+    valid_indexes = [index for index in range(len(rows)) if index not in failed]
+    valid = _rows_adapter.validate_python([rows[index] for index in valid_indexes])
+    return [(first_row + index, holding) for index, holding in zip(valid_indexes, valid)], errors
+
+def owned_portfolio_ids(session: Session, organization_id: str, portfolio_ids: Set[str]) -> Set[str]:
+    """The subset of portfolio_ids whose client belongs to the organization"""
+    if not portfolio_ids:
+        return set()
+    result = session.execute(
+        select(Portfolio.id).join(Client, Portfolio.client_id == Client.id).where(
+            Portfolio.id.in_(portfolio_ids),
+            Client.organization_id == organization_id
+        )
+    )
+    return set(result.scalars())
+
+def _upsert_statement(session: Session):
+    holdings = Holding.__table__
+    statement = dialect_insert(session)(holdings)
+    excluded = statement.excluded
+    updates = {
+        column: excluded[column]
+        for column in ("name", "asset_class", "quantity", "current_price", "market_value")
+    }
+    updates.update({column: func.coalesce(excluded[column], holdings.c[column]) for column in _KEEP_WHEN_MISSING})
+    updates["unrealized_gain_loss"] = excluded.market_value - excluded.quantity * updates["average_cost"]
+    updates["last_updated"] = func.now()
+    return statement.on_conflict_do_update(index_elements=["portfolio_id", "symbol"], set_=updates)
+
+def upsert_holdings(session: Session, holdings: List[HoldingImportRow]) -> int:
+    """Insert or update holdings on (portfolio_id, symbol) in one statement"""
+    # A key may appear once per statement; the last row for it wins
+    rows: Dict[Tuple[str, str], dict] = {}
+    for holding in holdings:
+        market_value = holding.market_value
+        if market_value is None:
+            market_value = round(holding.quantity * holding.current_price, 2)
+        unrealized = None
+        if holding.average_cost is not None:
+            unrealized = round(market_value - holding.quantity * holding.average_cost, 2)
+        rows[(holding.portfolio_id, holding.symbol)] = {
+            "id": str(uuid.uuid4()),
+            "portfolio_id": holding.portfolio_id,
+            "symbol": holding.symbol,
+            "name": holding.name or holding.symbol,
+            "asset_class": holding.asset_class,
+            "sector": holding.sector,
+            "region": holding.region,
+            "quantity": holding.quantity,
+            "average_cost": holding.average_cost,
+            "current_price": holding.current_price,
+            "market_value": market_value,
+            "unrealized_gain_loss": unrealized,
+        }
+    
+    if rows:
+        session.execute(_upsert_statement(session), list(rows.values()))
+    return len(rows)
+
+class HoldingImport:
+    """Streams rows through validation and upsert in chunks within one transaction"""
+    
+    def __init__(self, organization_id: str, portfolio_id: Optional[str] = None):
+        self.organization_id = organization_id
+        self.portfolio_id = portfolio_id  # Set for single-portfolio imports
+        self.received = 0
+        self.upserted = 0
+        self.error_count = 0
+        self.errors: List[dict] = []
+        self.errors_truncated = False
+        self.portfolio_ids: Set[str] = set()
+        self._owned: Set[str] = set()
+        self._not_owned: Set[str] = set()
+    
+    def _reject(self, errors: List[dict]):
+        self.error_count += len({error["row"] for error in errors})
+        room = MAX_REPORTED_ERRORS - len(self.errors)
+        if len(errors) > room:
+            self.errors_truncated = True
+        self.errors.extend(errors[:max(room, 0)])
+    
+    async def _check_ownership(self, db, candidates: List[Tuple[int, HoldingImportRow]]):
+        unknown = {holding.portfolio_id for _, holding in candidates} - self._owned - self._not_owned
+        if unknown:
+            owned = await db.run_sync(owned_portfolio_ids, self.organization_id, unknown)
+            self._owned |= owned
+            self._not_owned |= unknown - owned
+        
+        accepted, errors = [], []
+        for row, holding in candidates:
+            if holding.portfolio_id in self._owned:
+                accepted.append((row, holding))
+            elif holding.portfolio_id is None:
+                errors.append({"row": row, "field": "portfolio_id", "message": "Field required"})
+            else:
+                errors.append({"row": row, "field": "portfolio_id", "message": "Portfolio not found"})
+        return accepted, errors
+    
+    async def _process(self, db, chunk: List[dict]):
+        first_row = self.received + 1
+        self.received += len(chunk)
+        
+        if self.portfolio_id:
+            for row in chunk:
+                if isinstance(row, dict):
+                    row["portfolio_id"] = self.portfolio_id
+        
+        valid, errors = validate_rows(chunk, first_row)
+        if not self.portfolio_id:
+            valid, ownership_errors = await self._check_ownership(db, valid)
+            errors.extend(ownership_errors)
+        if errors:
+            self._reject(errors)
+        
+        holdings = [holding for _, holding in valid]
+        self.upserted += await db.run_sync(upsert_holdings, holdings)
+        self.portfolio_ids.update(holding.portfolio_id for holding in holdings)
+    
+    async def run(self, db, rows: AsyncIterator[dict]):
+        """Upsert every row, then revalue the touched portfolios (caller commits)"""
+        chunk = []
+        async for row in rows:
+            chunk.append(row)
+            if len(chunk) >= HOLDINGS_UPSERT_CHUNK_SIZE:
+                await self._process(db, chunk)
+                chunk = []
+        if chunk:
+            await self._process(db, chunk)
+        
+        await db.run_sync(recompute_portfolio_values, self.portfolio_ids)
+        return self
+    
+    def result(self) -> dict:
+        return {
+            "received": self.received,
+            "upserted": self.upserted,
+            "rejected": self.error_count,
+            "portfolios_updated": len(self.portfolio_ids),
+            "errors": self.errors,
+            "errors_truncated": self.errors_truncated,
+        }
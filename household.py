@@ -0,0 +1,31 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+class HouseholdMemberCreate(BaseModel):
+    client_id: str
+    relationship_type: str = Field("member", max_length=50)  # primary, spouse, partner, child, etc.
+
+class HouseholdMember(BaseModel):
+    client_id: str
+    first_name: str
+    last_name: str
+    relationship_type: Optional[str] = None
+    annual_income: Optional[Decimal] = None
+    net_worth: Optional[Decimal] = None
+    portfolio_count: int
+    portfolio_value: Decimal
+
+class HouseholdSummary(BaseModel):
+    id: str
+    name: str
+    primary_client_id: Optional[str] = None
+    member_count: int
+    joint_income: Optional[Decimal] = None
+    joint_net_worth: Optional[Decimal] = None
+    total_assets: Optional[Decimal] = None
+    asset_allocation: Dict[str, float]  # Percent of invested value by asset class
+    summary_stale: bool = False  # Figures await the next rollup refresh
+    summary_refreshed_at: Optional[datetime] = None
+    members: List[HouseholdMember]
@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+from sqlalchemy import event, func, inspect, or_, select, update
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.client import Client, Household, HouseholdClient
+from app.models.portfolio import Holding, Portfolio
+
+logger = logging.getLogger(__name__)
+
+# Households recomputed per set of rollup queries
+ROLLUP_BATCH_SIZE = int(os.getenv("HOUSEHOLD_ROLLUP_BATCH_SIZE", "500"))
+
+# Session.info key collecting the households a transaction has to refresh
+PENDING_KEY = "household_rollup_refresh"
+
+# Attributes a household's figures are derived from. Inserting or deleting
+# one of these rows, or changing a listed attribute, refreshes the
+# households it belongs to; the attribute named first links the row to them.
+ROLLUP_ATTRIBUTES = {
+    HouseholdClient: ("household_id", "client_id"),
+    Client: ("id", "annual_income", "net_worth"),
+    Portfolio: ("client_id", "total_value", "is_active"),
+    Holding: ("portfolio_id", "asset_class", "market_value"),
+}
+
+def _batches(ids: List[str], size: int = ROLLUP_BATCH_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def _given(ids) -> bool:
+    """True for a subquery or a non-empty list of ids"""
+    return ids is not None and not (isinstance(ids, (list, tuple, set)) and not ids)
+
+def refresh_households_on_commit(session: Session, household_ids=None, client_ids=None, portfolio_ids=None) -> None:
+    """Refresh the households holding these clients or portfolios when the
+    session's transaction commits.
+    
+    Each argument is a list or a subquery of ids, resolved now with one
+    SELECT; the rollup itself runs once per commit for every household
+    collected, just before the transaction ends.
+    """
+    conditions = []
+    if _given(household_ids):
+        conditions.append(Household.id.in_(household_ids))
+    if _given(client_ids):
+        conditions.append(Household.id.in_(
+            select(HouseholdClient.household_id).where(HouseholdClient.client_id.in_(client_ids))
+        ))
+    if _given(portfolio_ids):
+        conditions.append(Household.id.in_(
+            select(HouseholdClient.household_id)
+            .join(Portfolio, HouseholdClient.client_id == Portfolio.client_id)
+            .where(Portfolio.id.in_(portfolio_ids))
+        ))
+    if not conditions:
+        return
+    
+    affected = session.connection().execute(select(Household.id).where(or_(*conditions))).scalars()
+    session.info.setdefault(PENDING_KEY, set()).update(affected)
+
+def _link_ids(instance, added_or_deleted: bool) -> list:
+    """Old and new values of the attribute tying a row to its households,
+    or nothing when none of its rollup attributes changed"""
+    state = inspect(instance)
+    names = ROLLUP_ATTRIBUTES[type(instance)]
+    if not added_or_deleted and not any(state.attrs[name].history.has_changes() for name in names):
+        return []
+    return [value for value in state.attrs[names[0]].history.sum() if value is not None]
+
+@event.listens_for(Session, "after_flush")
+def _collect_on_flush(session: Session, flush_context):
+    """Queue households for refresh when a flush changes figures they roll
+    up, or creates them"""
+    ids = defaultdict(set)
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if type(instance) in ROLLUP_ATTRIBUTES:
+            ids[type(instance)].update(_link_ids(instance, instance not in session.dirty))
+        elif isinstance(instance, Household) and instance in session.new:
+            ids[HouseholdClient].add(instance.id)
+    if not ids:
+        return
+    
+    refresh_households_on_commit(
+        session,
+        list(ids[HouseholdClient]),
+        list(ids[Client] | ids[Portfolio]),
+        list(ids[Holding])
+    )
+
+def refresh_households(session: Session, household_ids: Iterable[str]) -> int:
+    """Recompute the joint figures and consolidated allocation of households.
+    
+    Three grouped queries per batch (member figures, portfolio totals,
+    holdings by asset class) and one bulk UPDATE by primary key, in the
+    caller's transaction. Returns the number of households refreshed.
+    """
+    ids = sorted(set(household_ids))
+    refreshed_at = datetime.now(timezone.utc)
+    
+    for batch in _batches(ids):
+        members = (
+            select(HouseholdClient.household_id, HouseholdClient.client_id)
+            .where(HouseholdClient.household_id.in_(batch))
+            .distinct()
+            .subquery()
+        )
+        figures = {
+            row.household_id: row for row in session.execute(
+                select(
+                    members.c.household_id,
+                    func.count(Client.id).label("member_count"),
+                    func.sum(Client.annual_income).label("joint_income"),
+                    func.sum(Client.net_worth).label("joint_net_worth"),
+                )
+                .join(Client, members.c.client_id == Client.id)
+                .group_by(members.c.household_id)
+            )
+        }
+        active_portfolios = (
+            select(members.c.household_id, Portfolio.id, Portfolio.total_value)
+            .join(Portfolio, members.c.client_id == Portfolio.client_id)
+            .where(Portfolio.is_active.is_not(False))
+            .subquery()
+        )
+        totals = dict(session.execute(
+            select(active_portfolios.c.household_id, func.sum(active_portfolios.c.total_value))
+            .group_by(active_portfolios.c.household_id)
+        ).all())
+        allocations = defaultdict(dict)
+        for household_id, asset_class, value in session.execute(
+            select(active_portfolios.c.household_id, Holding.asset_class, func.sum(Holding.market_value))
+            .join(Holding, Holding.portfolio_id == active_portfolios.c.id)
+            .group_by(active_portfolios.c.household_id, Holding.asset_class)
+        ):
+            if value:
+                allocations[household_id][asset_class] = value
+        
+        updates = []
+        for household_id in batch:
+            row = figures.get(household_id)
+            allocation = allocations.get(household_id, {})
+            invested = sum(allocation.values())
+            updates.append({
+                "id": household_id,
+                "member_count": row.member_count if row else 0,
+                "joint_income": row.joint_income if row else None,
+                "joint_net_worth": row.joint_net_worth if row else None,
+                "total_assets": totals.get(household_id),
+                "asset_allocation": {
+                    asset_class: round(float(value * 100 / invested), 2)
+                    for asset_class, value in sorted(allocation.items(), key=lambda item: -item[1])
+                } if invested else {},
+                "summary_stale": False,
+                "summary_refreshed_at": refreshed_at,
+            })
+        session.execute(update(Household), updates)
+    
+    return len(ids)
+
+@event.listens_for(Session, "before_commit")
+def _refresh_before_commit(session: Session):
+    """Recompute the households this transaction queued, as part of it"""
+    # Commit flushes after this hook; flush now so those changes queue too
+    session.flush()
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        refresh_households(session, pending)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session):
+    session.info.pop(PENDING_KEY, None)
+
+def refresh_stale_households(session: Session, organization_id: Optional[str] = None) -> int:
+    """Refresh every household still marked stale (created before the
+    rollup, or left by a write outside the ORM), batch by batch"""
+    query = select(Household.id).where(Household.summary_stale.is_(True))
+    if organization_id:
+        query = query.where(Household.organization_id == organization_id)
+    return refresh_households(session, session.execute(query).scalars().all())
+
+def drain_stale_households(organization_id: Optional[str] = None) -> int:
+    """refresh_stale_households in a session of its own, committed"""
+    db = SessionLocal()
+    try:
+        refreshed = refresh_stale_households(db, organization_id)
+        db.commit()
+    finally:
+        db.close()
+    return refreshed
+
+async def refresh_stale_periodically(interval: float):
+    """Drain stale households every `interval` seconds, off the event loop.
+    Refreshing is idempotent, so every worker can run this."""
+    while True:
+        try:
+            refreshed = await run_in_threadpool(drain_stale_households)
+            if refreshed:
+                logger.info("Refreshed %d stale households", refreshed)
+        except Exception:
+            logger.exception("Stale household refresh failed")
+        await asyncio.sleep(interval)
+
+def household_members(session: Session, household_id: str, organization_id: str) -> List[dict]:
+    """Members of a household with their figures and active portfolio totals,
+    in a single query"""
+    portfolios = (
+        select(
+            Portfolio.client_id,
+            func.count(Portfolio.id).label("portfolio_count"),
+            func.sum(Portfolio.total_value).label("portfolio_value"),
+        )
+        .where(
+            Portfolio.client_id.in_(select(HouseholdClient.client_id).where(HouseholdClient.household_id == household_id)),
+            Portfolio.is_active.is_not(False)
+        )
+        .group_by(Portfolio.client_id)
+        .subquery()
+    )
+    rows = session.execute(
+        select(
+            Client.id.label("client_id"), Client.first_name, Client.last_name,
+            HouseholdClient.relationship_type, Client.annual_income, Client.net_worth,
+            func.coalesce(portfolios.c.portfolio_count, 0).label("portfolio_count"),
+            func.coalesce(portfolios.c.portfolio_value, 0).label("portfolio_value"),
+        )
+        .join(Client, HouseholdClient.client_id == Client.id)
+        .outerjoin(portfolios, portfolios.c.client_id == Client.id)
+        .where(HouseholdClient.household_id == household_id, Client.organization_id == organization_id)
+        .order_by(HouseholdClient.created_at, HouseholdClient.id)
+    )
+    members = {}
+    for row in rows:
+        members.setdefault(row.client_id, dict(row._mapping))
+    return list(members.values())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh stale household rollups")
+    parser.add_argument("--organization", help="Only refresh this organization's households")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    started = time.perf_counter()
+    refreshed = drain_stale_households(args.organization)
+    logger.info("Refreshed %d households in %.2fs", refreshed, time.perf_counter() - started)
+
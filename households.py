@@ -1,56 +1,206 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, select
 from typing import List, Optional
-from app.database import get_db
-from app.models.client import Household
+from app.database import get_async_db
+from app.models.client import Household, HouseholdClient
 from app.models.user import User
 from app.schemas.client import HouseholdCreate, HouseholdUpdate, HouseholdResponse
+from app.schemas.household import HouseholdMemberCreate, HouseholdSummary
+from app.schemas.batch_lookup import BatchRequest, BatchResponse
 from app.core.auth import get_current_user, check_permissions
+from app.core.pagination import paginate
+from app.core.batch import fetch_batch, parse_ids
+from app.core.http_cache import (
+    conditional_response, entity_etag, page_not_modified
+)
+from app.core.responses import SerializedRoute
+from app.routers.clients import get_org_client
+from app.services.household_rollup import household_members
 
-router = APIRouter()
+router = APIRouter(route_class=SerializedRoute)
+
+# Columns that change whenever a household's representation does
+HOUSEHOLD_VERSION_COLUMNS = ("updated_at", "summary_stale")
+
+async def get_org_household(db: AsyncSession, household_id: str, organization_id: str) -> Household:
+    """Load a household belonging to the organization or raise 404"""
+    result = await db.execute(
+        select(Household).where(
+            and_(
+                Household.id == household_id,
+                Household.organization_id == organization_id
+            )
+        )
+    )
+    household = result.scalars().first()
+    
+    if not household:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Household not found"
+        )
+    
+    return household
+
+async def build_household_summary(db: AsyncSession, household: Household, organization_id: str) -> dict:
+    """A household's materialized figures plus its members, in one query"""
+    members = await db.run_sync(household_members, household.id, organization_id)
+    return {
+        "id": household.id,
+        "name": household.name,
+        "primary_client_id": household.primary_client_id,
+        "member_count": household.member_count or 0,
+        "joint_income": household.joint_income,
+        "joint_net_worth": household.joint_net_worth,
+        "total_assets": household.total_assets,
+        "asset_allocation": household.asset_allocation or {},
+        "summary_stale": household.summary_stale,
+        "summary_refreshed_at": household.summary_refreshed_at,
+        "members": members,
+    }
+
+async def commit_household_summary(db: AsyncSession, household: Household, organization_id: str) -> dict:
+    """Commit a membership change, which refreshes the household's figures
+    in the same transaction, and build its summary from the updated row"""
+    await db.commit()
+    await db.refresh(household)
+    return await build_household_summary(db, household, organization_id)
 
 @router.get("/", response_model=List[HouseholdResponse])
 async def get_households(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(check_permissions(["clients:view"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all households for the current organization"""
-    households = db.query(Household).filter(
+    """Get all households for the current organization; honours If-None-Match"""
+    query = select(Household).where(
         Household.organization_id == current_user.organization_id
-    ).offset(skip).limit(limit).all()
+    )
+    
+    not_modified = await page_not_modified(
+        db, request, response, query, Household, skip, limit, cursor, HOUSEHOLD_VERSION_COLUMNS
+    )
+    if not_modified:
+        return not_modified
     
-    return households
+    result = await db.execute(paginate(query, Household, skip, limit, cursor))
+    return result.scalars().all()
+
+async def fetch_households(db: AsyncSession, current_user: User, ids: List[str]) -> dict:
+    """Load the organization's households with the given ids in one query"""
+    query = select(Household).where(Household.organization_id == current_user.organization_id)
+    return await fetch_batch(db, query, Household, ids, "Household not found")
+
+@router.get("/batch", response_model=BatchResponse[HouseholdResponse])
+async def get_households_batch(
+    ids: str = Query(..., description="Comma-separated household IDs"),
+    current_user: User = Depends(check_permissions(["clients:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get up to MAX_BATCH_IDS households by ID in one query; ids that aren't
+    found are listed in `errors`"""
+    return await fetch_households(db, current_user, parse_ids(ids))
+
+@router.post("/batch", response_model=BatchResponse[HouseholdResponse])
+async def post_households_batch(
+    batch: BatchRequest,
+    current_user: User = Depends(check_permissions(["clients:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Same as GET /batch, for id lists too long for a URL"""
+    return await fetch_households(db, current_user, parse_ids(batch.ids))
 
 @router.get("/{household_id}", response_model=HouseholdResponse)
 async def get_household(
     household_id: str,
+    request: Request,
+    response: Response,
     current_user: User = Depends(check_permissions(["clients:view"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a specific household by ID; honours If-None-Match"""
+    household = await get_org_household(db, household_id, current_user.organization_id)
+    return conditional_response(request, response, entity_etag(household), household.updated_at) or household
+
+@router.get("/{household_id}/summary", response_model=HouseholdSummary)
+async def get_household_summary(
+    household_id: str,
+    current_user: User = Depends(check_permissions(["clients:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Joint figures, consolidated allocation and members of a household.
+    
+    The household figures are materialized and recomputed in the same
+    transaction as any change to a member, portfolio or holding; rows
+    still flagged `summary_stale` are drained in the background. Members
+    and their portfolio totals are read live, in one query.
+    """
+    household = await get_org_household(db, household_id, current_user.organization_id)
+    return await build_household_summary(db, household, current_user.organization_id)
+
+@router.post("/{household_id}/members", response_model=HouseholdSummary)
+async def add_household_member(
+    household_id: str,
+    member_data: HouseholdMemberCreate,
+    current_user: User = Depends(check_permissions(["clients:edit"])),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get a specific household by ID"""
-    household = db.query(Household).filter(
-        and_(
-            Household.id == household_id,
-            Household.organization_id == current_user.organization_id
+    """Add a client of the organization to a household"""
+    household = await get_org_household(db, household_id, current_user.organization_id)
+    await get_org_client(db, member_data.client_id, current_user.organization_id)
+    
+    existing = await db.execute(
+        select(HouseholdClient.id).where(
+            HouseholdClient.household_id == household_id,
+            HouseholdClient.client_id == member_data.client_id
+        )
+    )
+    if existing.first():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Client is already a member of this household"
         )
-    ).first()
     
-    if not household:
+    db.add(HouseholdClient(household_id=household_id, **member_data.model_dump()))
+    return await commit_household_summary(db, household, current_user.organization_id)
+
+@router.delete("/{household_id}/members/{client_id}", response_model=HouseholdSummary)
+async def remove_household_member(
+    household_id: str,
+    client_id: str,
+    current_user: User = Depends(check_permissions(["clients:edit"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Remove a client from a household"""
+    household = await get_org_household(db, household_id, current_user.organization_id)
+    
+    result = await db.execute(
+        select(HouseholdClient).where(
+            HouseholdClient.household_id == household_id,
+            HouseholdClient.client_id == client_id
+        )
+    )
+    links = result.scalars().all()
+    if not links:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Household not found"
+            detail="Client is not a member of this household"
         )
     
-    return household
+    for link in links:
+        await db.delete(link)
+    return await commit_household_summary(db, household, current_user.organization_id)
 
 @router.post("/", response_model=HouseholdResponse)
 async def create_household(
     household_data: HouseholdCreate,
     current_user: User = Depends(check_permissions(["clients:create"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new household"""
     # Ensure household belongs to current user's organization
@@ -59,8 +209,8 @@ async def create_household(
     # Create new household
     db_household = Household(**household_data.model_dump())
     db.add(db_household)
-    db.commit()
-    db.refresh(db_household)
+    await db.commit()
+    await db.refresh(db_household)
     
     return db_household
 
@@ -69,30 +219,19 @@ async def update_household(
     household_id: str,
     household_data: HouseholdUpdate,
     current_user: User = Depends(check_permissions(["clients:edit"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update an existing household"""
     # Find household
-    household = db.query(Household).filter(
-        and_(
-            Household.id == household_id,
-            Household.organization_id == current_user.organization_id
-        )
-    ).first()
-    
-    if not household:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Household not found"
-        )
+    household = await get_org_household(db, household_id, current_user.organization_id)
     
     # Update household fields
     update_data = household_data.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(household, field, value)
     
-    db.commit()
-    db.refresh(household)
+    await db.commit()
+    await db.refresh(household)
     
     return household
 
@@ -100,23 +239,12 @@ async def update_household(
 async def delete_household(
     household_id: str,
     current_user: User = Depends(check_permissions(["clients:delete"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a household"""
-    household = db.query(Household).filter(
-        and_(
-            Household.id == household_id,
-            Household.organization_id == current_user.organization_id
-        )
-    ).first()
-    
-    if not household:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Household not found"
-        )
+    household = await get_org_household(db, household_id, current_user.organization_id)
     
-    db.delete(household)
-    db.commit()
+    await db.delete(household)
+    await db.commit()
     
-    return {"message": "Household deleted successfully"}
\ No newline at end of file
+    return {"message": "Household deleted successfully"}
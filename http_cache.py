@@ -0,0 +1,139 @@
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+
+from fastapi import Request, Response, status
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.pagination import paginate, set_next_cursor
+
+# Responses may be stored by the browser but must be revalidated on each use
+CACHE_CONTROL = "private, no-cache"
+
+# Resolution of the stored updated_at timestamps: microseconds on
+# PostgreSQL, whole seconds for SQLite's CURRENT_TIMESTAMP
+TIMESTAMP_RESOLUTION = timedelta(seconds=float(os.getenv("HTTP_CACHE_TIMESTAMP_RESOLUTION", "1")))
+
+# Headers a 304 repeats from the response it stands in for
+NOT_MODIFIED_HEADERS = ("etag", "last-modified", "cache-control", "vary", "x-next-cursor")
+
+def make_etag(*parts) -> str:
+    """A strong validator for a sequence of plain values"""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+def entity_etag(instance) -> str:
+    """ETag of an ORM row, derived from every column value.
+    
+    Hashing the values rather than trusting updated_at alone keeps the tag
+    exact when two writes land within the timestamp's resolution.
+    """
+    columns = sa_inspect(type(instance)).column_attrs
+    return make_etag(type(instance).__name__, *(getattr(instance, attr.key) for attr in columns))
+
+def collection_etag(rows: Iterable, *version_columns: str) -> str:
+    """ETag of a page of rows from their ids and version columns, so it can
+    be computed from a narrow query without loading the rows themselves"""
+    return make_etag(*((row.id, *(getattr(row, name) for name in version_columns)) for row in rows))
+
+def last_modified(rows: Iterable, column: str = "updated_at") -> Optional[datetime]:
+    """Latest value of a timestamp column across rows"""
+    timestamps = [getattr(row, column) for row in rows if getattr(row, column, None) is not None]
+    return max(timestamps, default=None)
+
+def _utc(value: datetime) -> datetime:
+    # SQLite hands back naive timestamps; they are stored in UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match uses the weak comparison: W/ prefixes are ignored"""
+    if header.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in header.split(","))
+    return etag in (candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates)
+
+def _not_modified_since(header: str, modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since is None:
+        return False
+    return _utc(modified).replace(microsecond=0) <= _utc(since)
+
+def set_validators(response: Response, etag: str, modified: Optional[datetime] = None):
+    """Set ETag, Last-Modified and Cache-Control on a response"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    if modified is not None:
+        response.headers["Last-Modified"] = format_datetime(_utc(modified), usegmt=True)
+
+def conditional_response(request: Request, response: Response, etag: str, modified: Optional[datetime] = None) -> Optional[Response]:
+    """Set the validators on the response and evaluate the request's
+    conditional headers against them.
+    
+    Returns a 304 Not Modified response when the client's copy is current,
+    so the endpoint can return before building its body, or None to carry
+    on. If-None-Match takes precedence over If-Modified-Since.
+    """
+    set_validators(response, etag, modified)
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        current = _etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        current = bool(if_modified_since and modified and _not_modified_since(if_modified_since, modified))
+    if not current:
+        return None
+    
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={name: value for name, value in response.headers.items() if name in NOT_MODIFIED_HEADERS}
+    )
+
+def set_collection_validators(response: Response, rows, version_columns=("updated_at",)) -> Optional[str]:
+    """Set the collection ETag of a page of rows, returning it.
+    
+    Only If-None-Match applies to collections: a deleted row can leave the
+    newest timestamp unchanged. No ETag is issued while the page's newest
+    version is within TIMESTAMP_RESOLUTION of now, since a second write in
+    that window could store the same timestamp and go unnoticed.
+    """
+    newest = last_modified(rows)
+    if newest is not None and _utc(newest) > datetime.now(timezone.utc) - TIMESTAMP_RESOLUTION:
+        if "etag" in response.headers:
+            del response.headers["etag"]
+        return None
+    
+    etag = collection_etag(rows, *version_columns)
+    set_validators(response, etag)
+    return etag
+
+async def page_not_modified(
+    db: AsyncSession, request: Request, response: Response, query, model,
+    skip: int, limit: int, cursor: Optional[str] = None, version_columns=("updated_at",)
+) -> Optional[Response]:
+    """Conditional GET for a paginated list endpoint.
+    
+    Runs the page query for ids and version columns only, which the
+    (created_at, id) index and narrow rows make cheap, and derives the
+    collection ETag from them. Returns a 304 when the client's page is
+    current; otherwise the validators and next cursor are already set and
+    the endpoint loads the full page as usual.
+    """
+    columns = [getattr(model, name) for name in version_columns]
+    rows = (await db.execute(
+        paginate(query, model, skip, limit, cursor)
+        .with_only_columns(model.id, model.created_at, *columns, maintain_column_froms=True)
+    )).all()
+    set_next_cursor(response, rows, limit)
+    etag = set_collection_validators(response, rows, version_columns)
+    if etag is None:
+        return None
+    return conditional_response(request, response, etag)
@@ -1,11 +1,24 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import time
 import uvicorn
 import os
 
 # Import routers
-from .routers import auth, clients, households, portfolios, scenarios
-from .database import create_tables
+from .routers import auth, clients, households, portfolios, scenarios, analytics
+from .database import create_tables, get_async_db
+from .core.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from .core.pagination import NEXT_CURSOR_HEADER
+from .services.household_rollup import refresh_stale_periodically
+
+# Seconds the health check waits for the database to answer
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+
+# Seconds between drains of households still flagged stale; 0 turns it off
+HOUSEHOLD_REFRESH_INTERVAL = float(os.getenv("HOUSEHOLD_REFRESH_INTERVAL_SECONDS", "60"))
 
 app = FastAPI(
     title="Financial Planning Platform API",
@@ -20,12 +33,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Per-route latency, status and SQL work, exported at /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Create database tables on startup
 @app.on_event("startup")
 async def startup_event():
     create_tables()
+    if HOUSEHOLD_REFRESH_INTERVAL > 0:
+        app.state.household_refresh = asyncio.create_task(refresh_stale_periodically(HOUSEHOLD_REFRESH_INTERVAL))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    task = getattr(app.state, "household_refresh", None)
+    if task is not None:
+        task.cancel()
 
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
@@ -33,14 +58,31 @@ app.include_router(clients.router, prefix="/api/clients", tags=["Clients"])
 app.include_router(households.router, prefix="/api/households", tags=["Households"])
 app.include_router(portfolios.router, prefix="/api/portfolios", tags=["Portfolios"])
 app.include_router(scenarios.router, prefix="/api/scenarios", tags=["Scenarios"])
+app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
 
 @app.get("/")
 async def root():
     return {"message": "Financial Planning Platform API", "version": "2.0.0"}
 
 @app.get("/health")
-async def health_check():
-    return {"status": "healthy", "database": "connected"}
+async def health_check(response: Response, db: AsyncSession = Depends(get_async_db)):
+    """Ping the database; 503 when it doesn't answer within HEALTH_CHECK_TIMEOUT"""
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(db.execute(text("SELECT 1")), HEALTH_CHECK_TIMEOUT)
+    except Exception:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "unhealthy", "database": "unavailable"}
+    return {
+        "status": "healthy",
+        "database": "connected",
+        "database_latency_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
 
 if __name__ == "__main__":
     uvicorn.run(
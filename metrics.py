@@ -0,0 +1,266 @@
+import bisect
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+# Upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the queries-per-request buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+# Label for requests that matched no route, so unknown paths can't
+# multiply the number of series
+UNMATCHED_ROUTE = "unmatched"
+
+# Latest Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Set METRICS_ENABLED=false to skip per-request bookkeeping entirely
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() != "false"
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class Counter:
+    """Monotonic counter with a fixed set of label names"""
+    kind = "counter"
+    
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+    
+    def total(self) -> float:
+        """Sum across every label set"""
+        with self._lock:
+            return sum(self._values.values())
+    
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield self.name, _labels(self.label_names, labels), value
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed set of label names"""
+    kind = "histogram"
+    
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: counts per bucket (the last is +Inf), sum
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+    
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        names = self.label_names + ("le",)
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                yield f"{self.name}_bucket", _labels(names, (*labels, le)), cumulative
+            yield f"{self.name}_sum", _labels(self.label_names, labels), total
+            yield f"{self.name}_count", _labels(self.label_names, labels), cumulative
+
+class Gauge:
+    """Point-in-time values read from a callback at scrape time"""
+    kind = "gauge"
+    
+    def __init__(self, name: str, help: str, labels: Sequence[str], collect: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._collect = collect
+    
+    def samples(self):
+        for labels, value in sorted(self._collect().items()):
+            yield self.name, _labels(self.label_names, labels), value
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+    
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "Requests handled, by route and status", ("method", "route", "status")
+))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "Time to produce a response, by route", ("method", "route")
+))
+request_queries = registry.register(Histogram(
+    "http_request_db_queries", "SQL statements run per request, by route", ("method", "route"), QUERY_COUNT_BUCKETS
+))
+request_query_time = registry.register(Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request, by route", ("method", "route")
+))
+db_queries = registry.register(Counter(
+    "db_queries_total", "SQL statements executed, by engine", ("engine",)
+))
+db_query_time = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time, by engine", ("engine",)
+))
+pool_wait = registry.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time to get a connection from the pool, by engine", ("engine",)
+))
+
+class RequestStats:
+    """SQL work attributed to the request in progress. Mutated in place, so
+    statements run on worker threads (which get a copy of the context)
+    still add to the request's totals."""
+    __slots__ = ("queries", "query_seconds")
+    
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+# Pools reported at scrape time, by engine label
+_pools: Dict[str, object] = {}
+
+def _pool_gauge(method: str) -> Callable[[], Dict[Tuple[str, ...], float]]:
+    def collect():
+        return {
+            (label,): getattr(pool, method)()
+            for label, pool in _pools.items() if callable(getattr(pool, method, None))
+        }
+    return collect
+
+registry.register(Gauge("db_pool_size", "Configured pool size", ("engine",), _pool_gauge("size")))
+registry.register(Gauge("db_pool_checked_out", "Connections currently in use", ("engine",), _pool_gauge("checkedout")))
+registry.register(Gauge("db_pool_overflow", "Connections open beyond the pool size", ("engine",), _pool_gauge("overflow")))
+
+def instrument_engine(engine, label: str):
+    """Time every statement and pool checkout of a (sync) engine.
+    
+    Statement times also count towards the current request, if any. Pass
+    async engines' sync_engine.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+    
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_queries.inc(label)
+        db_query_time.observe(elapsed, label)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += elapsed
+    
+    @event.listens_for(engine, "handle_error")
+    def _failed_query(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+    
+    # The pool has no "before checkout" event, so time its connect() directly
+    pool = engine.pool
+    connect = pool.connect
+    
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            pool_wait.observe(time.perf_counter() - started, label)
+    
+    pool.connect = timed_connect
+    _pools[label] = pool
+
+def route_label(scope) -> str:
+    """Path template of the matched route, e.g. "/api/clients/{client_id}".
+    
+    Rebuilt from the request path and its path parameters, which routing
+    fills in, so the router prefix is included however routes were mounted.
+    """
+    if "endpoint" not in scope:
+        return UNMATCHED_ROUTE
+    names = {str(value): name for name, value in scope.get("path_params", {}).items()}
+    return "/".join(f"{{{names[segment]}}}" if segment in names else segment for segment in scope["path"].split("/"))
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and SQL work per route.
+    
+    Routes are labelled by their path template, so the number of series is
+    bounded by the number of routes.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+        
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stats.reset(token)
+            labels = (scope["method"], route_label(scope))
+            http_requests.inc(*labels, str(status_code))
+            http_latency.observe(elapsed, *labels)
+            request_queries.observe(stats.queries, *labels)
+            request_query_time.observe(stats.query_seconds, *labels)
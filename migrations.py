@@ -0,0 +1,276 @@
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, MetaData, Numeric, String, Table, bindparam, column, func, inspect, select, table, text
+
+logger = logging.getLogger(__name__)
+
+# Applied migrations are recorded here
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("id", String, primary_key=True),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+# PostgreSQL advisory lock serializing schema setup across processes
+MIGRATION_LOCK_KEY = 0x6D696772  # "migr"
+
+# Ordered (id, upgrade) pairs; each upgrade receives a Connection
+MIGRATIONS = []
+
+def migration(migration_id: str):
+    """Register an upgrade step; steps run once, in registration order"""
+    def register(upgrade):
+        MIGRATIONS.append((migration_id, upgrade))
+        return upgrade
+    return register
+
+def _has_column(conn, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+def lock_migrations(conn):
+    """Hold the migration lock until the connection's transaction ends, so
+    workers starting together take turns. Must run first in the transaction."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    elif conn.dialect.name == "sqlite":
+        # Takes the write lock up front; pysqlite hasn't begun a transaction yet
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+def prepare_database(engine):
+    """Install database extensions the models rely on (before create_all)"""
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            lock_migrations(conn)
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+def run_migrations(engine):
+    """Apply pending upgrades to tables that create_all can't alter.
+    
+    Each step runs in its own transaction under the migration lock and
+    re-reads the applied set inside it, so a step another worker applied
+    meanwhile is skipped rather than run twice.
+    """
+    with engine.begin() as conn:
+        lock_migrations(conn)
+        migration_metadata.create_all(bind=conn)
+    
+    for migration_id, upgrade in MIGRATIONS:
+        with engine.begin() as conn:
+            lock_migrations(conn)
+            applied = set(conn.execute(schema_migrations.select().with_only_columns(schema_migrations.c.id)).scalars())
+            if migration_id in applied:
+                continue
+            logger.info("Applying migration %s", migration_id)
+            upgrade(conn)
+            conn.execute(schema_migrations.insert().values(
+                id=migration_id, applied_at=datetime.now(timezone.utc)
+            ))
+
+# Client.search_document computed in SQL, by dialect
+SEARCH_DOCUMENT_SQL = {
+    "postgresql": "lower(concat_ws(' ', first_name, last_name, email, client_number))",
+    "sqlite": (
+        "lower(trim("
+        "coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || "
+        "coalesce(email, '') || ' ' || coalesce(client_number, '')))"
+    ),
+}
+
+def _search_document_sql(conn) -> str:
+    return SEARCH_DOCUMENT_SQL.get(conn.dialect.name, SEARCH_DOCUMENT_SQL["sqlite"])
+
+@migration("0001_client_search_document")
+def _client_search_document(conn):
+    if not _has_column(conn, "clients", "search_document"):
+        conn.execute(text("ALTER TABLE clients ADD COLUMN search_document TEXT"))
+    
+    conn.execute(text(
+        f"UPDATE clients SET search_document = {_search_document_sql(conn)} WHERE search_document IS NULL"
+    ))
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_clients_search_document_trgm "
+            "ON clients USING gin (search_document gin_trgm_ops)"
+        ))
+    else:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_clients_search_document_trgm ON clients (search_document)"
+        ))
+
+def _create_indexes(conn, indexes):
+    """Create (name, table, columns, unique) indexes unless they exist.
+    
+    Definitions are written out in each migration rather than read from the
+    models, so a later model change can't alter what a released step does.
+    """
+    for name, table_name, columns, unique in indexes:
+        conn.execute(text(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} "
+            f"ON {table_name} ({', '.join(columns)})"
+        ))
+
+def _renumber_duplicate_clients(conn):
+    """Give clients sharing a client number within an organization distinct
+    numbers, so the unique index can be built.
+    
+    The earliest created client keeps the number; the others get "-2",
+    "-3" and so on appended (skipping numbers already taken), and every
+    change is logged so it can be reviewed.
+    """
+    clients = table("clients", column("id"), column("organization_id"), column("client_number"), column("created_at"))
+    duplicates = conn.execute(
+        select(clients.c.organization_id, clients.c.client_number)
+        .group_by(clients.c.organization_id, clients.c.client_number)
+        .having(func.count() > 1)
+    ).all()
+    
+    renumbered = []
+    for organization_id, client_number in duplicates:
+        taken = set(conn.execute(
+            select(clients.c.client_number).where(clients.c.organization_id == organization_id)
+        ).scalars())
+        ids = conn.execute(
+            select(clients.c.id)
+            .where(clients.c.organization_id == organization_id, clients.c.client_number == client_number)
+            .order_by(clients.c.created_at, clients.c.id)
+        ).scalars().all()
+        
+        suffix = 2
+        for client_id in ids[1:]:
+            while f"{client_number}-{suffix}" in taken:
+                suffix += 1
+            new_number = f"{client_number}-{suffix}"
+            taken.add(new_number)
+            logger.warning(
+                "Client %s in organization %s shares client number %s; renumbered to %s",
+                client_id, organization_id, client_number, new_number
+            )
+            conn.execute(clients.update().where(clients.c.id == client_id).values(client_number=new_number))
+            renumbered.append(client_id)
+    
+    if renumbered and _has_column(conn, "clients", "search_document"):
+        conn.execute(
+            text(f"UPDATE clients SET search_document = {_search_document_sql(conn)} WHERE id IN :ids")
+            .bindparams(bindparam("ids", expanding=True)),
+            {"ids": renumbered}
+        )
+
+@migration("0002_tenant_indexes")
+def _tenant_indexes(conn):
+    _renumber_duplicate_clients(conn)
+    _create_indexes(conn, [
+        ("ix_clients_org_client_number", "clients", ("organization_id", "client_number"), True),
+        ("ix_clients_org_status", "clients", ("organization_id", "status"), False),
+        ("ix_clients_org_created", "clients", ("organization_id", "created_at", "id"), False),
+        ("ix_households_org_created", "households", ("organization_id", "created_at", "id"), False),
+        ("ix_household_clients_household", "household_clients", ("household_id", "client_id"), False),
+        ("ix_household_clients_client", "household_clients", ("client_id",), False),
+        ("ix_financial_goals_client", "financial_goals", ("client_id",), False),
+        ("ix_portfolios_client", "portfolios", ("client_id", "created_at", "id"), False),
+        ("ix_holdings_portfolio", "holdings", ("portfolio_id",), False),
+        ("ix_portfolio_transactions_portfolio_date", "portfolio_transactions", ("portfolio_id", "trade_date"), False),
+        ("ix_scenarios_client", "scenarios", ("client_id", "created_at", "id"), False),
+        ("ix_users_organization", "users", ("organization_id",), False),
+    ])
+
+def _merge_duplicate_holdings(conn) -> list:
+    """Fold every (portfolio_id, symbol) held in several rows into its most
+    recently updated row, returning the affected portfolio ids.
+    
+    Quantities and market values are summed and average_cost becomes the
+    quantity-weighted average of the lots that have one, so no position is
+    lost; the other rows are then deleted.
+    """
+    holdings = table(
+        "holdings",
+        column("id", String), column("portfolio_id", String), column("symbol", String),
+        column("quantity", Numeric(15, 6)), column("average_cost", Numeric(10, 4)),
+        column("market_value", Numeric(12, 2)), column("unrealized_gain_loss", Numeric(12, 2)),
+        column("last_updated", DateTime), column("created_at", DateTime),
+    )
+    duplicates = conn.execute(
+        select(holdings.c.portfolio_id, holdings.c.symbol)
+        .group_by(holdings.c.portfolio_id, holdings.c.symbol)
+        .having(func.count() > 1)
+    ).all()
+    
+    for portfolio_id, symbol in duplicates:
+        lots = conn.execute(
+            select(holdings.c.id, holdings.c.quantity, holdings.c.average_cost, holdings.c.market_value)
+            .where(holdings.c.portfolio_id == portfolio_id, holdings.c.symbol == symbol)
+            .order_by(holdings.c.last_updated.desc(), holdings.c.created_at.desc(), holdings.c.id.desc())
+        ).all()
+        
+        quantity = sum(lot.quantity or 0 for lot in lots)
+        market_value = sum(lot.market_value or 0 for lot in lots)
+        costed = [lot for lot in lots if lot.average_cost is not None]
+        costed_quantity = sum(lot.quantity or 0 for lot in costed)
+        average_cost = None
+        if costed_quantity:
+            average_cost = sum(lot.quantity * lot.average_cost for lot in costed) / costed_quantity
+        
+        logger.warning(
+            "Merging %d holdings of %s in portfolio %s into %s",
+            len(lots), symbol, portfolio_id, lots[0].id
+        )
+        conn.execute(holdings.update().where(holdings.c.id == lots[0].id).values(
+            quantity=quantity,
+            market_value=market_value,
+            average_cost=None if average_cost is None else round(average_cost, 4),
+            unrealized_gain_loss=None if average_cost is None else round(market_value - quantity * average_cost, 2)
+        ))
+        conn.execute(holdings.delete().where(holdings.c.id.in_([lot.id for lot in lots[1:]])))
+    
+    return sorted({portfolio_id for portfolio_id, _ in duplicates})
+
+@migration("0003_holdings_portfolio_symbol_unique")
+def _holdings_portfolio_symbol_unique(conn):
+    portfolio_ids = _merge_duplicate_holdings(conn)
+    if portfolio_ids:
+        # A merged row's weight covers one lot only; recompute weights, and
+        # totals in case they had drifted from the holdings
+        ids = {"ids": portfolio_ids}
+        conn.execute(text(
+            "UPDATE portfolios SET total_value = ("
+            "SELECT coalesce(sum(holdings.market_value), 0) FROM holdings "
+            "WHERE holdings.portfolio_id = portfolios.id"
+            ") WHERE id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True)), ids)
+        conn.execute(text(
+            "UPDATE holdings SET weight = ("
+            "SELECT CASE WHEN portfolios.total_value > 0 "
+            "THEN round(holdings.market_value * 100 / portfolios.total_value, 2) END "
+            "FROM portfolios WHERE portfolios.id = holdings.portfolio_id"
+            ") WHERE portfolio_id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True)), ids)
+        # Schemas already carrying the household rollup (0005) refresh the
+        # affected households in the background
+        if _has_column(conn, "households", "summary_stale"):
+            conn.execute(text(
+                "UPDATE households SET summary_stale = TRUE WHERE id IN ("
+                "SELECT household_clients.household_id FROM household_clients "
+                "JOIN portfolios ON portfolios.client_id = household_clients.client_id "
+                "WHERE portfolios.id IN :ids)"
+            ).bindparams(bindparam("ids", expanding=True)), ids)
+    
+    _create_indexes(conn, [("ix_holdings_portfolio_symbol", "holdings", ("portfolio_id", "symbol"), True)])
+    conn.execute(text("DROP INDEX IF EXISTS ix_holdings_portfolio"))
+
+@migration("0004_holdings_symbol_index")
+def _holdings_symbol_index(conn):
+    _create_indexes(conn, [("ix_holdings_symbol", "holdings", ("symbol",), False)])
+
+@migration("0005_household_rollup")
+def _household_rollup(conn):
+    columns = [
+        ("total_assets", "NUMERIC(14, 2)"),
+        ("asset_allocation", "JSON"),
+        ("member_count", "INTEGER DEFAULT 0"),
+        ("summary_stale", "BOOLEAN NOT NULL DEFAULT TRUE"),
+        ("summary_refreshed_at", "TIMESTAMP WITH TIME ZONE" if conn.dialect.name == "postgresql" else "DATETIME"),
+    ]
+    for name, definition in columns:
+        if not _has_column(conn, "households", name):
+            conn.execute(text(f"ALTER TABLE households ADD COLUMN {name} {definition}"))
@@ -0,0 +1,173 @@
+import numpy as np
+from typing import Dict, Optional, Sequence
+
+# Simulation defaults (percentages match the Scenario model columns)
+DEFAULT_PATHS = 10000
+MAX_PATHS = 100000
+DEFAULT_VOLATILITY = 15.0
+DEFAULT_INFLATION = 2.5
+DEFAULT_WITHDRAWAL_RATE = 4.0
+DEFAULT_PERCENTILES = (10, 25, 50, 75, 90)
+MONTHS_PER_YEAR = 12
+
+# Scenario inputs a sweep can vary, in the order of the grid's dimensions
+SWEEP_PARAMETERS = ("current_savings", "monthly_contribution", "expected_return", "inflation_rate", "target_age")
+
+def _as_float(value, default: float = 0.0) -> float:
+    """Convert a Numeric/JSON value to float, falling back to a default"""
+    return default if value is None else float(value)
+
+def scenario_inputs(scenario) -> dict:
+    """Extract the numeric projection inputs from a Scenario (or a row with its columns)"""
+    assumptions = scenario.assumptions or {}
+    return {
+        "current_savings": _as_float(scenario.current_savings),
+        "monthly_contribution": _as_float(scenario.monthly_contribution),
+        "expected_return": _as_float(scenario.expected_return),
+        "inflation_rate": _as_float(scenario.inflation_rate, DEFAULT_INFLATION),
+        "years": max(int(scenario.target_age) - int(scenario.current_age), 0),
+        "target_amount": None if scenario.target_amount is None else float(scenario.target_amount),
+        "volatility": _as_float(assumptions.get("volatility"), DEFAULT_VOLATILITY),
+        "withdrawal_rate": _as_float(assumptions.get("withdrawal_rate"), DEFAULT_WITHDRAWAL_RATE),
+    }
+
+def simulate(
+    current_savings: float,
+    monthly_contribution: float,
+    expected_return: float,
+    inflation_rate: float,
+    years: int,
+    volatility: float = DEFAULT_VOLATILITY,
+    target_amount: Optional[float] = None,
+    withdrawal_rate: float = DEFAULT_WITHDRAWAL_RATE,
+    paths: int = DEFAULT_PATHS,
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+    seed: Optional[int] = None,
+) -> dict:
+    """Run a Monte Carlo projection of a savings pot.
+    
+    Monthly returns are lognormal with the given annual expected return and
+    volatility (both in percent). Contributions are paid at the start of each
+    month. All paths are advanced together as one array, month by month, with
+    a year of shocks generated per draw. Shocks are drawn as antithetic pairs,
+    which halves random number generation and tightens the percentiles.
+    """
+    rng = np.random.default_rng(seed)
+    percentiles = [float(p) for p in percentiles]
+    
+    sigma = volatility / 100.0 / np.sqrt(MONTHS_PER_YEAR)
+    mu = np.log1p(expected_return / 100.0) / MONTHS_PER_YEAR - 0.5 * sigma ** 2
+    
+    half = (paths + 1) // 2
+    balances = np.full(paths, current_savings, dtype=np.float64)
+    draws = np.empty((MONTHS_PER_YEAR, half), dtype=np.float64)
+    shocks = np.empty((MONTHS_PER_YEAR, paths), dtype=np.float64)
+    
+    bands = np.empty((years + 1, len(percentiles)), dtype=np.float64)
+    bands[0] = current_savings
+    
+    for year in range(1, years + 1):
+        rng.standard_normal(out=draws)
+        shocks[:, :half] = draws
+        np.negative(draws[:, :paths - half], out=shocks[:, half:])
+        shocks *= sigma
+        shocks += mu
+        np.exp(shocks, out=shocks)
+        for growth in shocks:
+            balances += monthly_contribution
+            balances *= growth
+        bands[year] = np.percentile(balances, percentiles)
+    
+    deflator = (1.0 + inflation_rate / 100.0) ** np.arange(years + 1)
+    real_bands = bands / deflator[:, None]
+    real_terminal = balances / deflator[-1]
+    
+    median_terminal = float(np.median(balances))
+    real_median_terminal = float(np.median(real_terminal))
+    
+    probability_of_success = None
+    if target_amount is not None:
+        probability_of_success = float(np.mean(balances >= target_amount))
+    
+    def label(p: float) -> str:
+        return f"p{p:g}"
+    
+    return {
+        "paths": paths,
+        "years": years,
+        "seed": seed,
+        "volatility": volatility,
+        "percentiles": {
+            label(p): np.round(bands[:, i], 2).tolist() for i, p in enumerate(percentiles)
+        },
+        "real_percentiles": {
+            label(p): np.round(real_bands[:, i], 2).tolist() for i, p in enumerate(percentiles)
+        },
+        "median_terminal_value": round(median_terminal, 2),
+        "real_median_terminal_value": round(real_median_terminal, 2),
+        "target_amount": target_amount,
+        "probability_of_success": probability_of_success,
+        "projected_income": round(real_median_terminal * withdrawal_rate / 100.0, 2),
+    }
+
+def project(current_savings, monthly_contribution, expected_return, inflation_rate, years):
+    """Expected nominal and real value of a savings pot, in closed form.
+    
+    Uses simulate's conventions (contributions at the start of each month,
+    monthly growth averaging the annual expected return), so it gives the
+    mean of a simulation's outcomes. Arguments may be arrays of any
+    broadcastable shapes, and the results take the broadcast shape.
+    """
+    rate = np.power(1.0 + np.asarray(expected_return, dtype=np.float64) / 100.0, 1.0 / MONTHS_PER_YEAR) - 1.0
+    months = np.asarray(years, dtype=np.float64) * MONTHS_PER_YEAR
+    growth = np.power(1.0 + rate, months)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annuity = np.where(np.abs(rate) > 1e-12, (1.0 + rate) * (growth - 1.0) / rate, months)
+    
+    nominal = current_savings * growth + monthly_contribution * annuity
+    real = nominal / np.power(1.0 + np.asarray(inflation_rate, dtype=np.float64) / 100.0, years)
+    return nominal, real
+
+def sweep_scenario(scenario, axes: Dict[str, Sequence[float]]) -> dict:
+    """Project a Scenario over every combination of the given input values.
+    
+    Each swept input becomes one dimension of the grid, in SWEEP_PARAMETERS
+    order, and the whole grid is computed in one broadcast call to project.
+    Inputs not swept keep the scenario's values; target ages are whole years.
+    """
+    inputs = scenario_inputs(scenario)
+    inputs["target_age"] = int(scenario.target_age)
+    names = [name for name in SWEEP_PARAMETERS if name in axes]
+    
+    values = {}
+    for dimension, name in enumerate(names):
+        points = np.asarray(axes[name], dtype=np.float64)
+        if name == "target_age":
+            points = np.round(points)
+        shape = [1] * len(names)
+        shape[dimension] = len(points)
+        values[name] = points
+        inputs[name] = points.reshape(shape)
+    
+    years = np.maximum(inputs["target_age"] - int(scenario.current_age), 0)
+    nominal, real = project(
+        inputs["current_savings"], inputs["monthly_contribution"], inputs["expected_return"],
+        inputs["inflation_rate"], years
+    )
+    shape = tuple(len(points) for points in values.values())
+    nominal = np.broadcast_to(nominal, shape)
+    real = np.broadcast_to(real, shape)
+    
+    target_amount = inputs["target_amount"]
+    funded_ratio = None
+    if target_amount:
+        funded_ratio = np.round(nominal / target_amount, 4).tolist()
+    
+    return {
+        "axes": [{"name": name, "values": points.tolist()} for name, points in values.items()],
+        "cells": int(nominal.size),
+        "projected_value": np.round(nominal, 2).tolist(),
+        "real_projected_value": np.round(real, 2).tolist(),
+        "projected_income": np.round(real * inputs["withdrawal_rate"] / 100.0, 2).tolist(),
+        "funded_ratio": funded_ratio,
+    }
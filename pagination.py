@@ -0,0 +1,56 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+from fastapi import HTTPException, Response, status
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import aliased
+
+# Response header carrying the cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: datetime, id: str) -> str:
+    """Encode a (created_at, id) position as an opaque cursor"""
+    payload = json.dumps([created_at.isoformat(), id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), str(id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+def paginate(query, model, skip: int, limit: int, cursor: Optional[str] = None):
+    """Order a select on (created_at, id) and apply keyset or offset paging.
+    
+    With a cursor, rows after that position are read straight from the
+    (created_at, id) index, so deep pages cost the same as the first one.
+    Without one, the legacy skip/limit behaviour is kept.
+    """
+    query = query.order_by(model.created_at, model.id)
+    
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        # Compare against the stored timestamp of the last row when it still
+        # exists, so the comparison never depends on how the driver rounds or
+        # formats datetimes; fall back to the cursor value if it was deleted
+        anchor = aliased(model)
+        stored_created_at = select(anchor.created_at).where(anchor.id == last_id).scalar_subquery()
+        position = tuple_(func.coalesce(stored_created_at, created_at), last_id)
+        query = query.where(tuple_(model.created_at, model.id) > position)
+        return query.limit(limit)
+    
+    return query.offset(skip).limit(limit)
+
+def set_next_cursor(response: Response, items: Sequence, limit: int):
+    """Advertise the cursor for the next page when this page is full"""
+    if items and len(items) == limit:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
@@ -0,0 +1,486 @@
+import copy
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.models.client import Client, HouseholdClient
+from app.models.portfolio import Holding, Portfolio, PortfolioTransaction
+
+# Reconstructed portfolio histories kept between requests. Each entry holds
+# two float64 arrays with one slot per day since inception (~29 KB for five
+# years), so size this to the number of portfolios reported on together.
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "20000"))
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "86400"))
+
+DAYS_PER_YEAR = 365.25
+# Portfolio ids per IN (...) when loading
+LOAD_BATCH_SIZE = 1000
+
+# Direction of each transaction type's net_amount for the portfolio's cash,
+# which of them cross the portfolio boundary, and how trades move quantity
+CASH_EFFECTS = {"deposit": 1, "withdrawal": -1, "buy": -1, "sell": 1, "dividend": 1, "interest": 1, "fee": -1}
+EXTERNAL_FLOWS = {"deposit": 1, "withdrawal": -1}
+QUANTITY_EFFECTS = {"buy": 1, "sell": -1}
+
+history_cache = TTLCache(maxsize=ANALYTICS_CACHE_SIZE, ttl=ANALYTICS_CACHE_TTL)
+
+def _day(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+def _batches(ids: List[str], size: int = LOAD_BATCH_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+class ValueSeries:
+    """Daily closing values and the external flows made during each day.
+    
+    Flows are taken to land at the close, at the same prices as the trades
+    that usually accompany them.
+    """
+    
+    def __init__(self, start: date, values: np.ndarray, flows: np.ndarray):
+        self.start = start
+        self.values = values
+        self.flows = flows
+    
+    @property
+    def through(self) -> date:
+        return self.start + timedelta(days=len(self.values) - 1)
+    
+    def daily_returns(self) -> np.ndarray:
+        """Each day's return on the previous close, excluding that day's flows"""
+        previous = np.concatenate(([0.0], self.values[:-1]))
+        growth = np.divide(self.values - self.flows, previous, out=np.ones_like(previous), where=previous > 0)
+        return growth - 1
+
+class PortfolioHistory(ValueSeries):
+    """A portfolio's value series rebuilt from its transactions, plus the
+    position, price and cash state at its last day so it can be extended.
+    
+    Quantities move with buys and sells from an opening position (current
+    holdings less everything traded). Prices are carried forward from the
+    last observation: trade prices, and each holding's current_price on
+    the day it was last updated. Cash follows every transaction; a shortfall
+    is treated as money paid in, so portfolios without recorded deposits
+    still produce sensible returns.
+    """
+    
+    def __init__(self, start: date, symbols: List[str], opening: np.ndarray, net_traded: np.ndarray, first_prices: np.ndarray):
+        super().__init__(start, np.zeros(0), np.zeros(0))
+        self.symbols = list(symbols)
+        self.index = {symbol: position for position, symbol in enumerate(self.symbols)}
+        self.opening = opening
+        self.net_traded = net_traded
+        self.quantities = opening.copy()
+        self.prices = first_prices.copy()
+        self.cash = 0.0
+        self.shortfall = 0.0
+        self.transaction_count = 0  # Transactions dated up to `through`
+    
+    def copy(self) -> "PortfolioHistory":
+        """Copy that can be advanced without touching a cached instance"""
+        clone = copy.copy(self)
+        clone.symbols = list(self.symbols)
+        clone.index = dict(self.index)
+        return clone
+    
+    def _position(self, symbol: str) -> int:
+        position = self.index.get(symbol)
+        if position is None:
+            position = self.index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            self.opening = np.append(self.opening, 0.0)
+            self.net_traded = np.append(self.net_traded, 0.0)
+            self.quantities = np.append(self.quantities, 0.0)
+            self.prices = np.append(self.prices, np.nan)
+        return position
+    
+    def advance(self, through: date, transactions: Sequence, observations: Sequence = ()):
+        """Extend the series to `through`, applying transactions and
+        (date, symbol, price) observations dated after its current end"""
+        first = self.start + timedelta(days=len(self.values))
+        days = (through - first).days + 1
+        if days <= 0:
+            return self
+        
+        events, trades, prices = [], [], []
+        for transaction in transactions:
+            offset = (_day(transaction.trade_date) - first).days
+            if offset < 0 or offset >= days:
+                continue
+            self.transaction_count += 1
+            kind = (transaction.type or "").lower()
+            amount = abs(float(transaction.net_amount or 0))
+            events.append((offset, CASH_EFFECTS.get(kind, 0) * amount, EXTERNAL_FLOWS.get(kind, 0) * amount))
+            if transaction.symbol:
+                position = self._position(transaction.symbol)
+                if kind in QUANTITY_EFFECTS and transaction.quantity is not None:
+                    trades.append((position, offset, QUANTITY_EFFECTS[kind] * abs(float(transaction.quantity))))
+                if transaction.price is not None:
+                    prices.append((position, offset, float(transaction.price)))
+        for observed_on, symbol, price in observations:
+            offset = (observed_on - first).days
+            if 0 <= offset < days and price is not None:
+                prices.append((self._position(symbol), offset, float(price)))
+        
+        # Positions, prices and cash only change on days with activity, so
+        # work on those days alone and repeat each result until the next one
+        offsets = np.unique(np.array(
+            [0] + [event[0] for event in events] + [trade[1] for trade in trades] + [price[1] for price in prices]
+        ))
+        steps = len(offsets)
+        column = {offset: step for step, offset in enumerate(offsets.tolist())}
+        
+        cash_delta = np.zeros(steps)
+        external = np.zeros(steps)
+        for offset, cash_effect, external_effect in events:
+            cash_delta[column[offset]] += cash_effect
+            external[column[offset]] += external_effect
+        
+        symbols = len(self.symbols)
+        quantity_delta = np.zeros((symbols, steps))
+        for position, offset, quantity in trades:
+            quantity_delta[position, column[offset]] += quantity
+        quantities = self.quantities[:, None] + np.cumsum(quantity_delta, axis=1)
+        
+        # Carry the last observed price forward; column 0 is the state so far
+        grid = np.full((symbols, steps + 1), np.nan)
+        grid[:, 0] = self.prices
+        for position, offset, price in prices:
+            grid[position, column[offset] + 1] = price
+        latest = np.where(np.isnan(grid), 0, np.arange(steps + 1))
+        np.maximum.accumulate(latest, axis=1, out=latest)
+        grid = grid[np.arange(symbols)[:, None], latest][:, 1:]
+        
+        securities = (quantities * np.nan_to_num(grid)).sum(axis=0)
+        cash = self.cash + np.cumsum(cash_delta)
+        shortfall = np.maximum.accumulate(np.maximum(-cash, self.shortfall))
+        implied = np.diff(shortfall, prepend=self.shortfall)
+        
+        step_flows = external + implied
+        if not len(self.values):
+            # Positions held before the first transaction count as paid in on day one
+            step_flows[0] += float((self.opening * np.nan_to_num(grid[:, 0])).sum())
+        
+        values = np.repeat(securities + cash + shortfall, np.diff(np.append(offsets, days)))
+        flows = np.zeros(days)
+        flows[offsets] = step_flows
+        
+        self.values = np.concatenate((self.values, values))
+        self.flows = np.concatenate((self.flows, flows))
+        self.quantities = quantities[:, -1].copy()
+        self.prices = grid[:, -1].copy()
+        self.cash = float(cash[-1])
+        self.shortfall = float(shortfall[-1])
+        return self
+
+def _net_traded(transactions: Iterable, symbols: Dict[str, int]) -> np.ndarray:
+    net = np.zeros(len(symbols))
+    for transaction in transactions:
+        kind = (transaction.type or "").lower()
+        if kind in QUANTITY_EFFECTS and transaction.symbol and transaction.quantity is not None:
+            net[symbols[transaction.symbol]] += QUANTITY_EFFECTS[kind] * abs(float(transaction.quantity))
+    return net
+
+def _current_prices(holdings: Sequence) -> list:
+    """(date, symbol, price) observations from holdings' current prices"""
+    return [
+        (_day(holding.last_updated or holding.created_at), holding.symbol, holding.current_price)
+        for holding in holdings
+    ]
+
+def _opening(holdings: Sequence, symbols: Dict[str, int], net_traded: np.ndarray) -> np.ndarray:
+    current = np.zeros(len(symbols))
+    for holding in holdings:
+        current[symbols[holding.symbol]] += float(holding.quantity or 0)
+    # Holdings below what the trades imply are ignored rather than shorted
+    return np.maximum(current - net_traded, 0)
+
+def build_history(transactions: Sequence, holdings: Sequence, through: date) -> Optional[PortfolioHistory]:
+    """Reconstruct a portfolio's history from inception to `through`"""
+    transactions = sorted(transactions, key=lambda transaction: transaction.trade_date)
+    dates = [_day(transaction.trade_date) for transaction in transactions]
+    dates += [_day(holding.created_at) for holding in holdings if holding.created_at is not None]
+    if not dates:
+        return None
+    start = min(min(dates), through)
+    
+    names = sorted({holding.symbol for holding in holdings} | {t.symbol for t in transactions if t.symbol})
+    symbols = {symbol: position for position, symbol in enumerate(names)}
+    net_traded = _net_traded(transactions, symbols)
+    
+    # Value positions at their first known price until they trade
+    first_prices = np.full(len(names), np.nan)
+    for transaction in transactions:
+        if transaction.symbol and transaction.price is not None and np.isnan(first_prices[symbols[transaction.symbol]]):
+            first_prices[symbols[transaction.symbol]] = float(transaction.price)
+    for holding in holdings:
+        if np.isnan(first_prices[symbols[holding.symbol]]):
+            first_prices[symbols[holding.symbol]] = float(holding.current_price)
+    
+    history = PortfolioHistory(start, names, _opening(holdings, symbols, net_traded), net_traded, first_prices)
+    return history.advance(through, transactions, _current_prices(holdings))
+
+def _extend_history(history: PortfolioHistory, transactions: Sequence, holdings: Sequence, through: date) -> Optional[PortfolioHistory]:
+    """Extend a cached history with later transactions, or None if it must be rebuilt"""
+    history = history.copy()
+    for transaction in transactions:
+        if transaction.symbol:
+            history._position(transaction.symbol)
+    for holding in holdings:
+        history._position(holding.symbol)
+    
+    net_traded = history.net_traded + _net_traded(transactions, history.index)
+    # Holdings edited outside the transaction ledger change the opening position
+    if not np.allclose(_opening(holdings, history.index, net_traded), history.opening):
+        return None
+    history.net_traded = net_traded
+    return history.advance(through, transactions, _current_prices(holdings))
+
+def _load_holdings(session: Session, portfolio_ids: List[str]) -> Dict[str, list]:
+    holdings = defaultdict(list)
+    for batch in _batches(portfolio_ids):
+        result = session.execute(
+            select(
+                Holding.portfolio_id, Holding.symbol, Holding.quantity, Holding.current_price,
+                Holding.last_updated, Holding.created_at
+            ).where(Holding.portfolio_id.in_(batch))
+        )
+        for row in result:
+            holdings[row.portfolio_id].append(row)
+    return holdings
+
+def _load_transactions(session: Session, portfolio_ids: List[str], after: Optional[date] = None) -> Dict[str, list]:
+    transactions = defaultdict(list)
+    columns = (
+        PortfolioTransaction.portfolio_id, PortfolioTransaction.trade_date, PortfolioTransaction.type,
+        PortfolioTransaction.symbol, PortfolioTransaction.quantity, PortfolioTransaction.price,
+        PortfolioTransaction.net_amount,
+    )
+    for batch in _batches(portfolio_ids):
+        query = select(*columns).where(PortfolioTransaction.portfolio_id.in_(batch))
+        if after is not None:
+            query = query.where(PortfolioTransaction.trade_date >= datetime.combine(after + timedelta(days=1), datetime.min.time()))
+        for row in session.execute(query.order_by(PortfolioTransaction.trade_date)):
+            transactions[row.portfolio_id].append(row)
+    return transactions
+
+def _transaction_counts(session: Session, portfolio_ids: List[str], through: date) -> Dict[str, int]:
+    counts = {}
+    cutoff = datetime.combine(through + timedelta(days=1), datetime.min.time())
+    for batch in _batches(portfolio_ids):
+        result = session.execute(
+            select(PortfolioTransaction.portfolio_id, func.count())
+            .where(PortfolioTransaction.portfolio_id.in_(batch), PortfolioTransaction.trade_date < cutoff)
+            .group_by(PortfolioTransaction.portfolio_id)
+        )
+        counts.update(dict(result.all()))
+    return counts
+
+def load_histories(session: Session, portfolio_ids: Sequence[str], through: date) -> Dict[str, PortfolioHistory]:
+    """Histories for the given portfolios up to `through`.
+    
+    Completed days (before today) are cached per portfolio. A cached history
+    is extended with only the days since it was built; it is rebuilt when a
+    transaction is backdated into its range or holdings change outside the
+    ledger.
+    """
+    ids = list(dict.fromkeys(portfolio_ids))
+    today = datetime.now(timezone.utc).date()
+    through = min(through, today)
+    settled = min(through, today - timedelta(days=1))
+    holdings = _load_holdings(session, ids)
+    
+    cached: Dict[str, PortfolioHistory] = {}
+    for portfolio_id in ids:
+        history = history_cache.get(portfolio_id)
+        if history is not None:
+            cached[portfolio_id] = history
+    
+    # Backdated (or removed) transactions change the count within the cached range
+    by_through = defaultdict(list)
+    for portfolio_id, history in cached.items():
+        by_through[history.through].append(portfolio_id)
+    for cached_through, members in by_through.items():
+        counts = _transaction_counts(session, members, cached_through)
+        for portfolio_id in members:
+            if counts.get(portfolio_id, 0) != cached[portfolio_id].transaction_count:
+                del cached[portfolio_id]
+    
+    histories: Dict[str, PortfolioHistory] = {}
+    if cached:
+        newer = _load_transactions(session, list(cached), min(history.through for history in cached.values()))
+        for portfolio_id, history in cached.items():
+            recent = [t for t in newer.get(portfolio_id, ()) if _day(t.trade_date) > history.through]
+            extended = _extend_history(history, recent, holdings.get(portfolio_id, []), settled)
+            if extended is not None:
+                histories[portfolio_id] = extended
+    
+    missing = [portfolio_id for portfolio_id in ids if portfolio_id not in histories]
+    if missing:
+        transactions = _load_transactions(session, missing)
+        for portfolio_id in missing:
+            history = build_history(transactions.get(portfolio_id, []), holdings.get(portfolio_id, []), settled)
+            if history is not None:
+                histories[portfolio_id] = history
+    
+    for portfolio_id, history in histories.items():
+        if history.through == settled:
+            history_cache.set(portfolio_id, history)
+    
+    # Today is still moving, so it's added to a copy and never cached
+    if through > settled:
+        todays = _load_transactions(session, list(histories), settled)
+        for portfolio_id, history in list(histories.items()):
+            histories[portfolio_id] = history.copy().advance(
+                through, todays.get(portfolio_id, []), _current_prices(holdings.get(portfolio_id, []))
+            )
+    
+    return histories
+
+def combine(series: Iterable[ValueSeries]) -> Optional[ValueSeries]:
+    """Composite of several series: values and flows summed day by day"""
+    series = [item for item in series if len(item.values)]
+    if not series:
+        return None
+    start = min(item.start for item in series)
+    through = max(item.through for item in series)
+    days = (through - start).days + 1
+    values = np.zeros(days)
+    flows = np.zeros(days)
+    for item in series:
+        offset = (item.start - start).days
+        values[offset:offset + len(item.values)] += item.values
+        flows[offset:offset + len(item.flows)] += item.flows
+        # Carry the last value to the composite's end
+        values[offset + len(item.values):] += item.values[-1]
+    return ValueSeries(start, values, flows)
+
+def irr(cash_flows: np.ndarray, times: np.ndarray, iterations: int = 100, tolerance: float = 1e-9) -> np.ndarray:
+    """Annual internal rates of return, one per row, by vectorized Newton.
+    
+    cash_flows and times (in years) are (n, k) arrays padded with zeros.
+    Rows without a solution come back as NaN.
+    """
+    rate = np.full(cash_flows.shape[0], 0.05)
+    scale = np.maximum(np.abs(cash_flows).sum(axis=1), 1e-12)
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        for _ in range(iterations):
+            discount = (1 + rate)[:, None] ** -times
+            npv = (cash_flows * discount).sum(axis=1)
+            slope = (-times * cash_flows * discount).sum(axis=1) / (1 + rate)
+            step = np.where(slope != 0, npv / slope, 0.0)
+            rate = np.clip(rate - step, -0.999999, 1e6)
+            if np.all(np.abs(step) < tolerance):
+                break
+        discount = (1 + rate)[:, None] ** -times
+        npv = (cash_flows * discount).sum(axis=1)
+    return np.where(np.isfinite(rate) & (np.abs(npv) / scale < 1e-6), rate, np.nan)
+
+def _optional(value) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else float(value)
+
+def period_returns(series: Sequence[Optional[ValueSeries]], start: Optional[date], end: date) -> List[dict]:
+    """TWR and money-weighted returns of each series over [start, end].
+    
+    TWR chains daily returns; the money-weighted return is the IRR of the
+    opening value, the external flows and the closing value, solved for all
+    series in one vectorized pass.
+    """
+    results, flow_rows = [], []
+    for item in series:
+        if item is None or not len(item.values):
+            results.append(None)
+            flow_rows.append(None)
+            continue
+        first = 0 if start is None else max((start - item.start).days, 0)
+        last = min((end - item.start).days, len(item.values) - 1)
+        if last < first:
+            results.append(None)
+            flow_rows.append(None)
+            continue
+        
+        returns = item.daily_returns()[first:last + 1]
+        start_value = float(item.values[first - 1]) if first > 0 else 0.0
+        end_value = float(item.values[last])
+        flows = item.flows[first:last + 1]
+        days = last - first + 1
+        twr = float(np.prod(1 + returns) - 1)
+        years = days / DAYS_PER_YEAR
+        
+        flow_days = np.flatnonzero(flows)
+        amounts = np.concatenate(([-start_value], -flows[flow_days], [end_value]))
+        times = np.concatenate(([0.0], (flow_days + 1) / DAYS_PER_YEAR, [days / DAYS_PER_YEAR]))
+        flow_rows.append((amounts, times))
+        
+        results.append({
+            "start_date": item.start + timedelta(days=first),
+            "end_date": item.start + timedelta(days=last),
+            "start_value": round(start_value, 2),
+            "end_value": round(end_value, 2),
+            "net_flows": round(float(flows.sum()), 2),
+            "twr": twr,
+            "twr_annualized": (1 + twr) ** (1 / years) - 1 if years >= 1 and twr > -1 else None,
+            "years": years,
+        })
+    
+    solvable = [index for index, row in enumerate(flow_rows) if row is not None]
+    if solvable:
+        width = max(len(flow_rows[index][0]) for index in solvable)
+        cash_flows = np.zeros((len(solvable), width))
+        times = np.zeros((len(solvable), width))
+        for row, index in enumerate(solvable):
+            amounts, offsets = flow_rows[index]
+            cash_flows[row, :len(amounts)] = amounts
+            times[row, :len(offsets)] = offsets
+        rates = irr(cash_flows, times)
+        for row, index in enumerate(solvable):
+            result = results[index]
+            rate = _optional(rates[row])
+            result["irr"] = rate
+            result["mwr"] = None if rate is None else (1 + rate) ** result.pop("years") - 1
+            result.pop("years", None)
+            result["twr_annualized"] = _optional(result["twr_annualized"])
+    
+    return results
+
+def organization_portfolio_ids(session: Session, organization_id: str, client_id: Optional[str] = None) -> List[str]:
+    query = select(Portfolio.id).join(Client, Portfolio.client_id == Client.id).where(
+        Client.organization_id == organization_id,
+        Portfolio.is_active.is_not(False)
+    )
+    if client_id:
+        query = query.where(Portfolio.client_id == client_id)
+    return list(session.execute(query.order_by(Portfolio.id)).scalars())
+
+def household_portfolio_ids(session: Session, household_id: str) -> List[str]:
+    query = select(Portfolio.id).join(HouseholdClient, Portfolio.client_id == HouseholdClient.client_id).where(
+        HouseholdClient.household_id == household_id,
+        Portfolio.is_active.is_not(False)
+    )
+    return list(dict.fromkeys(session.execute(query.order_by(Portfolio.id)).scalars()))
+
+def portfolio_returns(session: Session, portfolio_ids: Sequence[str], start: Optional[date], end: date) -> List[dict]:
+    """Per-portfolio returns, in the order given (portfolios without history are omitted)"""
+    histories = load_histories(session, portfolio_ids, end)
+    ordered = [portfolio_id for portfolio_id in portfolio_ids if portfolio_id in histories]
+    results = period_returns([histories[portfolio_id] for portfolio_id in ordered], start, end)
+    return [
+        {"portfolio_id": portfolio_id, **result}
+        for portfolio_id, result in zip(ordered, results)
+        if result is not None
+    ]
+
+def composite_returns(session: Session, portfolio_ids: Sequence[str], start: Optional[date], end: date) -> Optional[dict]:
+    """Returns of the given portfolios taken together as one"""
+    histories = load_histories(session, portfolio_ids, end)
+    result = period_returns([combine(histories.values())], start, end)[0]
+    if result is not None:
+        result["portfolios"] = len(histories)
+    return result
@@ -1,6 +1,8 @@
-from sqlalchemy import Column, String, Text, DateTime, Numeric, Boolean, JSON
+from sqlalchemy import Column, String, Text, DateTime, Numeric, Boolean, JSON, Index
 from sqlalchemy.sql import func
+from sqlalchemy.orm import foreign, relationship
 from app.database import Base
+from app.models.client import Client
 import uuid
 
 class Portfolio(Base):
@@ -21,6 +23,15 @@ class Portfolio(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    holdings = relationship(
+        "Holding", primaryjoin="Portfolio.id == foreign(Holding.portfolio_id)",
+        order_by="Holding.symbol", viewonly=True, lazy="raise"
+    )
+    
+    __table_args__ = (
+        Index("ix_portfolios_client", "client_id", "created_at", "id"),
+    )
 
 class Holding(Base):
     __tablename__ = "holdings"
@@ -40,6 +51,13 @@ class Holding(Base):
     weight = Column(Numeric(5, 2))  # Percentage of portfolio
     last_updated = Column(DateTime(timezone=True), server_default=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        # Upsert key for bulk imports; also serves lookups by portfolio
+        Index("ix_holdings_portfolio_symbol", "portfolio_id", "symbol", unique=True),
+        # Finds the holdings a price tick revalues
+        Index("ix_holdings_symbol", "symbol"),
+    )
 
 class PortfolioTransaction(Base):
     __tablename__ = "portfolio_transactions"
@@ -57,4 +75,13 @@ class PortfolioTransaction(Base):
     settlement_date = Column(DateTime)
     description = Column(Text)
     reference = Column(Text)  # External reference
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_portfolio_transactions_portfolio_date", "portfolio_id", "trade_date"),
+    )
+
+Client.portfolios = relationship(
+    Portfolio, primaryjoin=Client.id == foreign(Portfolio.client_id),
+    order_by=(Portfolio.created_at, Portfolio.id), viewonly=True, lazy="raise"
+)
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, select
 from typing import List, Optional
-from app.database import get_db
+from datetime import date, datetime
+from app.database import get_async_db
 from app.models.portfolio import Portfolio, Holding
 from app.models.client import Client
 from app.models.user import User
@@ -11,41 +12,143 @@ from app.schemas.portfolio import (
     HoldingCreate, HoldingUpdate, HoldingResponse
 )
 from app.core.auth import get_current_user, check_permissions
+from app.core.pagination import paginate
+from app.core.batch import fetch_batch, parse_ids
+from app.core.entity_cache import CachedEntity, cache_entry, entity_cache
+from app.core.http_cache import conditional_response, page_not_modified
+from app.core.responses import SerializedRoute
+from app.routers.clients import get_org_client
+from app.schemas.batch_lookup import BatchRequest, BatchResponse
+from app.schemas.bulk_holdings import HoldingImportResult
+from app.schemas.history import PortfolioHistoryResponse
+from app.schemas.prices import PriceIngestRequest, PriceIngestResult
+from app.services.holdings import HoldingImport, iter_request_rows
+from app.services.export import export_response, holdings_export, transactions_export
+from app.services.pricing import apply_prices
+from app.services.snapshots import portfolio_history
 
-router = APIRouter()
+router = APIRouter(route_class=SerializedRoute)
+
+async def get_org_portfolio(db: AsyncSession, portfolio_id: str, organization_id: str) -> Portfolio:
+    """Load a portfolio whose client belongs to the organization or raise 404"""
+    result = await db.execute(
+        select(Portfolio).join(Client, Portfolio.client_id == Client.id).where(
+            and_(
+                Portfolio.id == portfolio_id,
+                Client.organization_id == organization_id
+            )
+        )
+    )
+    portfolio = result.scalars().first()
+    
+    if not portfolio:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Portfolio not found"
+        )
+    
+    return portfolio
+
+async def load_portfolio_entry(db: AsyncSession, portfolio_id: str) -> Optional[CachedEntity]:
+    """Load a portfolio and its client's organization for the entity cache"""
+    result = await db.execute(
+        select(Portfolio, Client.organization_id)
+        .join(Client, Portfolio.client_id == Client.id)
+        .where(Portfolio.id == portfolio_id)
+    )
+    row = result.first()
+    return cache_entry(row.Portfolio, row.organization_id) if row else None
 
 @router.get("/", response_model=List[PortfolioResponse])
 async def get_portfolios(
+    request: Request,
+    response: Response,
     client_id: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(check_permissions(["portfolios:view"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all portfolios, optionally filtered by client"""
-    query = db.query(Portfolio).join(Client).filter(
+    """Get all portfolios, optionally filtered by client; honours If-None-Match"""
+    query = select(Portfolio).join(Client, Portfolio.client_id == Client.id).where(
         Client.organization_id == current_user.organization_id
     )
     
     if client_id:
-        query = query.filter(Portfolio.client_id == client_id)
+        query = query.where(Portfolio.client_id == client_id)
+    
+    not_modified = await page_not_modified(db, request, response, query, Portfolio, skip, limit, cursor)
+    if not_modified:
+        return not_modified
+    
+    result = await db.execute(paginate(query, Portfolio, skip, limit, cursor))
+    return result.scalars().all()
+
+@router.get("/holdings/export")
+async def export_holdings(
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    portfolio_id: Optional[str] = Query(None),
+    current_user: User = Depends(check_permissions(["portfolios:view", "reports:export"]))
+):
+    """Stream the organization's holdings as CSV or NDJSON"""
+    statement = holdings_export(current_user.organization_id, portfolio_id)
+    return export_response(statement, export_format, "holdings")
+
+@router.get("/transactions/export")
+async def export_transactions(
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    portfolio_id: Optional[str] = Query(None),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    current_user: User = Depends(check_permissions(["portfolios:view", "reports:export"]))
+):
+    """Stream the organization's transaction history as CSV or NDJSON.
     
-    portfolios = query.offset(skip).limit(limit).all()
-    return portfolios
+    `from` is inclusive and `to` exclusive, both on trade date.
+    """
+    statement = transactions_export(current_user.organization_id, portfolio_id, start, end)
+    return export_response(statement, export_format, "transactions")
+
+async def fetch_portfolios(db: AsyncSession, current_user: User, ids: List[str]) -> dict:
+    """Load the organization's portfolios with the given ids in one query"""
+    query = select(Portfolio).join(Client, Portfolio.client_id == Client.id).where(
+        Client.organization_id == current_user.organization_id
+    )
+    return await fetch_batch(db, query, Portfolio, ids, "Portfolio not found")
+
+@router.get("/batch", response_model=BatchResponse[PortfolioResponse])
+async def get_portfolios_batch(
+    ids: str = Query(..., description="Comma-separated portfolio IDs"),
+    current_user: User = Depends(check_permissions(["portfolios:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get up to MAX_BATCH_IDS portfolios by ID in one query; ids that aren't
+    found are listed in `errors`"""
+    return await fetch_portfolios(db, current_user, parse_ids(ids))
+
+@router.post("/batch", response_model=BatchResponse[PortfolioResponse])
+async def post_portfolios_batch(
+    batch: BatchRequest,
+    current_user: User = Depends(check_permissions(["portfolios:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Same as GET /batch, for id lists too long for a URL"""
+    return await fetch_portfolios(db, current_user, parse_ids(batch.ids))
 
 @router.get("/{portfolio_id}", response_model=PortfolioResponse)
 async def get_portfolio(
     portfolio_id: str,
+    request: Request,
+    response: Response,
     current_user: User = Depends(check_permissions(["portfolios:view"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get a specific portfolio by ID"""
-    portfolio = db.query(Portfolio).join(Client).filter(
-        and_(
-            Portfolio.id == portfolio_id,
-            Client.organization_id == current_user.organization_id
-        )
-    ).first()
+    """Get a specific portfolio by ID, read through the entity cache;
+    honours If-None-Match"""
+    portfolio = await entity_cache.get(
+        "portfolio", portfolio_id, current_user.organization_id, lambda: load_portfolio_entry(db, portfolio_id)
+    )
     
     if not portfolio:
         raise HTTPException(
@@ -53,34 +156,23 @@ async def get_portfolio(
             detail="Portfolio not found"
         )
     
-    return portfolio
+    return conditional_response(request, response, portfolio.etag, portfolio.last_modified) or portfolio.values
 
 @router.post("/", response_model=PortfolioResponse)
 async def create_portfolio(
     portfolio_data: PortfolioCreate,
     current_user: User = Depends(check_permissions(["portfolios:create"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new portfolio"""
     # Verify client exists and belongs to organization
-    client = db.query(Client).filter(
-        and_(
-            Client.id == portfolio_data.client_id,
-            Client.organization_id == current_user.organization_id
-        )
-    ).first()
-    
-    if not client:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Client not found"
-        )
+    await get_org_client(db, portfolio_data.client_id, current_user.organization_id)
     
     # Create new portfolio
     db_portfolio = Portfolio(**portfolio_data.model_dump())
     db.add(db_portfolio)
-    db.commit()
-    db.refresh(db_portfolio)
+    await db.commit()
+    await db.refresh(db_portfolio)
     
     return db_portfolio
 
@@ -89,30 +181,19 @@ async def update_portfolio(
     portfolio_id: str,
     portfolio_data: PortfolioUpdate,
     current_user: User = Depends(check_permissions(["portfolios:edit"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update an existing portfolio"""
     # Find portfolio
-    portfolio = db.query(Portfolio).join(Client).filter(
-        and_(
-            Portfolio.id == portfolio_id,
-            Client.organization_id == current_user.organization_id
-        )
-    ).first()
-    
-    if not portfolio:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Portfolio not found"
-        )
+    portfolio = await get_org_portfolio(db, portfolio_id, current_user.organization_id)
     
     # Update portfolio fields
     update_data = portfolio_data.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(portfolio, field, value)
     
-    db.commit()
-    db.refresh(portfolio)
+    await db.commit()
+    await db.refresh(portfolio)
     
     return portfolio
 
@@ -120,25 +201,14 @@ async def update_portfolio(
 async def delete_portfolio(
     portfolio_id: str,
     current_user: User = Depends(check_permissions(["portfolios:delete"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a portfolio"""
-    portfolio = db.query(Portfolio).join(Client).filter(
-        and_(
-            Portfolio.id == portfolio_id,
-            Client.organization_id == current_user.organization_id
-        )
-    ).first()
-    
-    if not portfolio:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Portfolio not found"
-        )
+    portfolio = await get_org_portfolio(db, portfolio_id, current_user.organization_id)
     
     # Set to inactive instead of hard delete
     portfolio.is_active = False
-    db.commit()
+    await db.commit()
     
     return {"message": "Portfolio deactivated successfully"}
 
@@ -147,22 +217,105 @@ async def delete_portfolio(
 async def get_portfolio_holdings(
     portfolio_id: str,
     current_user: User = Depends(check_permissions(["portfolios:view"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all holdings for a portfolio"""
     # Verify portfolio exists and belongs to organization
-    portfolio = db.query(Portfolio).join(Client).filter(
-        and_(
-            Portfolio.id == portfolio_id,
-            Client.organization_id == current_user.organization_id
-        )
-    ).first()
+    await get_org_portfolio(db, portfolio_id, current_user.organization_id)
     
-    if not portfolio:
+    result = await db.execute(select(Holding).where(Holding.portfolio_id == portfolio_id))
+    return result.scalars().all()
+
+@router.get("/{portfolio_id}/history", response_model=PortfolioHistoryResponse)
+async def get_portfolio_history(
+    portfolio_id: str,
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    granularity: str = Query("day", pattern="^(day|week|month)$"),
+    current_user: User = Depends(check_permissions(["portfolios:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Daily, weekly or monthly value series for charting.
+    
+    Served from the precomputed daily snapshots; both ends are inclusive.
+    """
+    await get_org_portfolio(db, portfolio_id, current_user.organization_id)
+    
+    points = await db.run_sync(portfolio_history, portfolio_id, start, end, granularity)
+    return {"portfolio_id": portfolio_id, "granularity": granularity, "points": points}
+
+async def run_holding_import(db: AsyncSession, request: Request, holding_import: HoldingImport, strict: bool) -> dict:
+    """Run an import in one transaction; strict imports are rolled back on any row error"""
+    try:
+        await holding_import.run(db, iter_request_rows(request))
+    except Exception:
+        await db.rollback()
+        raise
+    
+    result = holding_import.result()
+    if strict and result["rejected"]:
+        await db.rollback()
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Portfolio not found"
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"message": "Import rejected; no holdings were written", **result, "upserted": 0, "portfolios_updated": 0}
         )
     
-    holdings = db.query(Holding).filter(Holding.portfolio_id == portfolio_id).all()
-    return holdings
\ No newline at end of file
+    await db.commit()
+    return result
+
+@router.post("/{portfolio_id}/holdings:bulk", response_model=HoldingImportResult)
+async def bulk_upsert_portfolio_holdings(
+    portfolio_id: str,
+    request: Request,
+    strict: bool = Query(False),
+    current_user: User = Depends(check_permissions(["portfolios:edit"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Insert or update many holdings of one portfolio, keyed by symbol.
+    
+    The body is a JSON list (or {"holdings": [...]}) or a CSV file with a
+    header row. Invalid rows are reported and skipped unless `strict` is set,
+    in which case any error rejects the whole import. Holding weights and the
+    portfolio total are recomputed in the same transaction.
+    """
+    await get_org_portfolio(db, portfolio_id, current_user.organization_id)
+    
+    holding_import = HoldingImport(current_user.organization_id, portfolio_id)
+    return await run_holding_import(db, request, holding_import, strict)
+
+@router.post("/holdings:bulk", response_model=HoldingImportResult)
+async def bulk_upsert_holdings(
+    request: Request,
+    strict: bool = Query(False),
+    current_user: User = Depends(check_permissions(["portfolios:edit"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Insert or update holdings across the organization's portfolios.
+    
+    Same as the per-portfolio import, but every row carries its own
+    `portfolio_id`; rows for portfolios outside the organization are rejected.
+    """
+    holding_import = HoldingImport(current_user.organization_id)
+    return await run_holding_import(db, request, holding_import, strict)
+
+@router.post("/prices", response_model=PriceIngestResult)
+async def ingest_prices(
+    price_data: PriceIngestRequest,
+    current_user: User = Depends(check_permissions(["portfolios:edit"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Apply a batch of (symbol, price) ticks to the organization's holdings.
+    
+    Only holdings whose price changed are rewritten; their portfolios'
+    totals and weights are updated in the same transaction. The ticks are
+    kept as `price_date`'s closes for the organization's risk figures.
+    """
+    ticks = [(tick.symbol, tick.price) for tick in price_data.prices]
+    try:
+        result = await db.run_sync(apply_prices, ticks, current_user.organization_id, price_data.price_date)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    
+    return result
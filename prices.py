@@ -0,0 +1,24 @@
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional
+
+class PriceTick(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True)
+    
+    symbol: str = Field(..., min_length=1, max_length=32)  # Ticker or ISIN
+    price: Decimal = Field(..., gt=0)
+    
+    @field_validator("symbol")
+    @classmethod
+    def normalize_symbol(cls, value: str) -> str:
+        return value.upper()
+
+class PriceIngestRequest(BaseModel):
+    prices: List[PriceTick] = Field(..., min_length=1, max_length=50000)
+    price_date: Optional[date] = None  # Day the prices closed (default today); earlier days only backfill history
+
+class PriceIngestResult(BaseModel):
+    symbols: int
+    holdings_updated: int
+    portfolios_updated: int
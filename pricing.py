@@ -0,0 +1,153 @@
+import argparse
+import csv
+import logging
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import Column, MetaData, Numeric, String, Table, Text, case, func, insert, literal, select, true, update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, dialect_insert
+from app.models.client import Client
+from app.models.portfolio import Holding, Portfolio
+from app.models.security_price import MARKET_FEED, SecurityPrice
+from app.core.entity_cache import invalidate_on_commit
+from app.services.household_rollup import refresh_households_on_commit
+from app.services.valuation import update_weights
+
+logger = logging.getLogger(__name__)
+
+# Per-connection scratch tables; rows only live for one ingest
+scratch_metadata = MetaData()
+price_ticks = Table(
+    "price_ticks",
+    scratch_metadata,
+    Column("symbol", Text, primary_key=True),
+    Column("price", Numeric(10, 4), nullable=False),
+    prefixes=["TEMPORARY"],
+)
+portfolio_value_deltas = Table(
+    "portfolio_value_deltas",
+    scratch_metadata,
+    Column("portfolio_id", String, primary_key=True),
+    Column("delta", Numeric(14, 2), nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+def _reset_scratch_tables(session: Session):
+    connection = session.connection()
+    for table in scratch_metadata.sorted_tables:
+        table.create(connection, checkfirst=True)
+        session.execute(table.delete())
+
+def record_prices(session: Session, price_date: date, organization_id: Optional[str] = None):
+    """Add the loaded ticks to the price history as the given day's closes,
+    replacing any already recorded for that day"""
+    prices = SecurityPrice.__table__
+    statement = dialect_insert(session)(prices).from_select(
+        ["organization_id", "symbol", "price_date", "price"],
+        select(literal(organization_id or MARKET_FEED), price_ticks.c.symbol, literal(price_date), price_ticks.c.price)
+        # SQLite needs a WHERE before ON CONFLICT to parse INSERT ... SELECT
+        .where(true())
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=["organization_id", "symbol", "price_date"],
+        set_={"price": statement.excluded.price, "created_at": func.now()}
+    )
+    session.execute(statement)
+
+def apply_prices(
+    session: Session, prices: Iterable[Tuple[str, Decimal]], organization_id: Optional[str] = None,
+    price_date: Optional[date] = None
+) -> dict:
+    """Revalue the holdings of the given symbols and their portfolios.
+    
+    Ticks are loaded into a temporary table and joined to holdings through
+    the symbol index, so only holdings whose price actually changed are
+    touched. Portfolio totals move by the summed change in market value
+    rather than being re-aggregated, and weights (and household rollups) are
+    refreshed only for the affected portfolios. Everything runs in the
+    caller's transaction; pass organization_id to limit the update to one
+    tenant. The ticks are also recorded as price_date's closes (today by
+    default) in the price history risk figures are computed from; backdated
+    ticks only fill in that history.
+    """
+    ticks: Dict[str, Decimal] = {symbol: price for symbol, price in prices}
+    _reset_scratch_tables(session)
+    if not ticks:
+        return {"symbols": 0, "holdings_updated": 0, "portfolios_updated": 0}
+    
+    session.execute(insert(price_ticks), [{"symbol": symbol, "price": price} for symbol, price in ticks.items()])
+    today = datetime.now(timezone.utc).date()
+    record_prices(session, price_date or today, organization_id)
+    if price_date is not None and price_date < today:
+        return {"symbols": len(ticks), "holdings_updated": 0, "portfolios_updated": 0}
+    
+    new_price = price_ticks.c.price
+    new_market_value = func.round(Holding.quantity * new_price, 2)
+    changed = [Holding.symbol == price_ticks.c.symbol, Holding.current_price != new_price]
+    if organization_id:
+        changed.append(Holding.portfolio_id.in_(
+            select(Portfolio.id).join(Client, Portfolio.client_id == Client.id).where(
+                Client.organization_id == organization_id
+            )
+        ))
+    
+    # Capture each portfolio's change in value before the old prices are overwritten
+    session.execute(insert(portfolio_value_deltas).from_select(
+        ["portfolio_id", "delta"],
+        select(Holding.portfolio_id, func.sum(new_market_value - Holding.market_value))
+        .where(*changed)
+        .group_by(Holding.portfolio_id)
+    ))
+    
+    holdings_updated = session.execute(
+        update(Holding).where(*changed).values(
+            current_price=new_price,
+            market_value=new_market_value,
+            unrealized_gain_loss=case(
+                (Holding.average_cost.is_(None), None),
+                else_=new_market_value - Holding.quantity * Holding.average_cost
+            ),
+            last_updated=func.now()
+        ),
+        execution_options={"synchronize_session": False}
+    ).rowcount
+    
+    portfolios_updated = session.execute(
+        update(Portfolio).where(Portfolio.id == portfolio_value_deltas.c.portfolio_id).values(
+            total_value=func.coalesce(Portfolio.total_value, 0) + portfolio_value_deltas.c.delta
+        ),
+        execution_options={"synchronize_session": False}
+    ).rowcount
+    update_weights(session, select(portfolio_value_deltas.c.portfolio_id))
+    refresh_households_on_commit(session, portfolio_ids=select(portfolio_value_deltas.c.portfolio_id))
+    invalidate_on_commit(session, "portfolio", session.execute(select(portfolio_value_deltas.c.portfolio_id)).scalars())
+    
+    return {
+        "symbols": len(ticks),
+        "holdings_updated": holdings_updated,
+        "portfolios_updated": portfolios_updated,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply an end-of-day price file (symbol,price CSV) to every organization")
+    parser.add_argument("path")
+    parser.add_argument("--date", type=date.fromisoformat, help="Day the prices closed (default: today)")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    with open(args.path, newline="") as handle:
+        rows = [(row["symbol"].strip().upper(), Decimal(row["price"])) for row in csv.DictReader(handle)]
+    
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        result = apply_prices(db, rows, price_date=args.date)
+        db.commit()
+    finally:
+        db.close()
+    logger.info("Applied %d prices in %.2fs", len(rows), time.perf_counter() - started)
+    print(result)
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.core.entity_cache import shared_backend
+from app.core.metrics import Counter, Gauge, registry
+from app.core.responses import dumps
+from app.services.monte_carlo import scenario_inputs, simulate
+
+logger = logging.getLogger(__name__)
+
+# In-process limits: projections cached, and their approximate total size
+PROJECTION_CACHE_SIZE = int(os.getenv("PROJECTION_CACHE_SIZE", "5000"))
+PROJECTION_CACHE_MAX_BYTES = int(os.getenv("PROJECTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Optional persistence across restarts and workers: a redis:// URL, or
+# "memory" for an in-process stand-in
+PROJECTION_CACHE_URL = os.getenv("PROJECTION_CACHE_URL")
+PROJECTION_CACHE_TTL = int(os.getenv("PROJECTION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+projection_lookups = registry.register(Counter(
+    "projection_cache_lookups_total", "Projection cache lookups, by outcome", ("result",)
+))
+
+def _digest(value) -> str:
+    return hashlib.blake2b(json.dumps(value, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+def inputs_key(scenario) -> str:
+    """Content address of a scenario's projection inputs: its numeric inputs
+    plus assumptions, but not its identity, so identical scenarios share
+    results"""
+    return _digest([scenario_inputs(scenario), scenario.assumptions or {}])
+
+def options_key(options: dict) -> str:
+    return _digest({key: value for key, value in options.items() if value is not None})
+
+class ProjectionCache:
+    """Content-addressed cache of simulation results.
+    
+    Results are grouped by the digest of the scenario inputs, one entry per
+    set of simulation options. A group can serve any number of scenarios,
+    so an edited scenario's old inputs are left to age out: groups are
+    evicted least recently used first once either the entry count or the
+    byte budget is exceeded.
+    An optional shared backend persists groups, as one JSON document each.
+    """
+    
+    def __init__(self, maxsize: int = PROJECTION_CACHE_SIZE, max_bytes: int = PROJECTION_CACHE_MAX_BYTES, shared=None, shared_ttl: int = PROJECTION_CACHE_TTL, namespace: str = "projection"):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.namespace = namespace
+        # inputs key -> {options key: (result, size)}
+        self._groups: "OrderedDict[str, Dict[str, tuple]]" = OrderedDict()
+        self._entries = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.shared_errors = 0
+    
+    def _shared_key(self, inputs: str) -> str:
+        return f"{self.namespace}:{inputs}"
+    
+    def get(self, inputs: str, options: str) -> Optional[dict]:
+        """A cached result, checking the shared backend on a local miss"""
+        with self._lock:
+            group = self._groups.get(inputs)
+            if group is not None and options in group:
+                self._groups.move_to_end(inputs)
+                self.hits += 1
+                projection_lookups.inc("hit")
+                return group[options][0]
+        
+        raw = self._shared_call(self.shared.get, self._shared_key(inputs)) if self.shared is not None else None
+        if raw:
+            stored = json.loads(raw)
+            if options in stored:
+                with self._lock:
+                    self.shared_hits += 1
+                self._store(inputs, options, stored[options], len(dumps(stored[options])))
+                projection_lookups.inc("shared_hit")
+                return stored[options]
+        
+        with self._lock:
+            self.misses += 1
+        projection_lookups.inc("miss")
+        return None
+    
+    def set(self, inputs: str, options: str, result: dict):
+        """Cache a result locally and, if configured, in the shared backend"""
+        encoded = dumps(result)
+        self._store(inputs, options, result, len(encoded))
+        if self.shared is None:
+            return
+        
+        # Read-modify-write: a lost race only costs a recomputation later
+        key = self._shared_key(inputs)
+        raw = self._shared_call(self.shared.get, key)
+        stored = json.loads(raw) if raw else {}
+        stored[options] = json.loads(encoded)
+        self._shared_call(self.shared.set, key, dumps(stored), self.shared_ttl)
+    
+    def _store(self, inputs: str, options: str, result: dict, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            group = self._groups.setdefault(inputs, {})
+            previous = group.pop(options, None)
+            if previous is not None:
+                self._entries -= 1
+                self._bytes -= previous[1]
+            group[options] = (result, size)
+            self._entries += 1
+            self._bytes += size
+            self._groups.move_to_end(inputs)
+            
+            while self._entries > self.maxsize or self._bytes > self.max_bytes:
+                _, evicted = self._groups.popitem(last=False)
+                self._entries -= len(evicted)
+                self._bytes -= sum(size for _, size in evicted.values())
+                self.evictions += len(evicted)
+    
+    def clear(self):
+        with self._lock:
+            self.invalidations += self._entries
+            self._groups.clear()
+            self._entries = 0
+            self._bytes = 0
+    
+    def _shared_call(self, method, *args):
+        """Call the shared backend; an outage degrades to recomputing"""
+        try:
+            return method(*args)
+        except Exception:
+            with self._lock:
+                self.shared_errors += 1
+            logger.warning("Projection cache shared backend unavailable", exc_info=True)
+            return None
+    
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.shared_hits + self.misses
+        return (self.hits + self.shared_hits) / lookups if lookups else 0.0
+    
+    def stats(self) -> dict:
+        """Counters for monitoring"""
+        return {
+            "entries": self._entries,
+            "maxsize": self.maxsize,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "shared": self.shared is not None and type(self.shared).__name__,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "shared_errors": self.shared_errors,
+        }
+
+projection_cache = ProjectionCache(shared=shared_backend(PROJECTION_CACHE_URL))
+
+registry.register(Gauge(
+    "projection_cache_entries", "Projections held in this process", (), lambda: {(): projection_cache.stats()["entries"]}
+))
+registry.register(Gauge(
+    "projection_cache_bytes", "Approximate size of the projections held in this process", (), lambda: {(): projection_cache.stats()["bytes"]}
+))
+registry.register(Gauge(
+    "projection_cache_hit_ratio", "Share of projection lookups served from the cache", (), lambda: {(): projection_cache.hit_rate()}
+))
+
+def simulate_scenario_cached(scenario, **options) -> dict:
+    """Run a Monte Carlo projection for a Scenario row, memoized on the
+    scenario's inputs and the options.
+    
+    Scenarios with identical inputs share results. Without a seed the first
+    run's results are reused until the inputs change, just as the stored
+    results would be. The returned dict is shared; don't mutate it.
+    """
+    inputs = inputs_key(scenario)
+    options = {key: value for key, value in options.items() if value is not None}
+    key = options_key(options)
+    
+    results = projection_cache.get(inputs, key)
+    if results is None:
+        arguments = scenario_inputs(scenario)
+        arguments.update(options)
+        results = simulate(**arguments)
+        projection_cache.set(inputs, key, results)
+    return results
@@ -0,0 +1,278 @@
+import argparse
+import logging
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.database import SessionLocal
+from app.models.client import Client
+from app.models.scenario import Scenario, ScenarioRecomputeJob
+from app.services.monte_carlo import scenario_inputs, simulate
+
+logger = logging.getLogger(__name__)
+
+# Batch recompute configuration
+RECOMPUTE_CHUNK_SIZE = int(os.getenv("SCENARIO_RECOMPUTE_CHUNK_SIZE", "500"))
+RECOMPUTE_PATHS = int(os.getenv("SCENARIO_RECOMPUTE_PATHS", "2000"))
+RECOMPUTE_WORKERS = int(os.getenv("SCENARIO_RECOMPUTE_WORKERS", "0")) or os.cpu_count() or 1
+# Seconds without progress after which an unfinished job counts as lost
+# (its worker restarted) and no longer blocks a new one
+RECOMPUTE_STALE_SECONDS = float(os.getenv("SCENARIO_RECOMPUTE_STALE_SECONDS", "600"))
+
+# Columns needed to project a scenario; full ORM objects are never loaded
+PROJECTION_COLUMNS = (
+    Scenario.id,
+    Scenario.current_age,
+    Scenario.target_age,
+    Scenario.current_savings,
+    Scenario.monthly_contribution,
+    Scenario.expected_return,
+    Scenario.inflation_rate,
+    Scenario.target_amount,
+    Scenario.assumptions,
+)
+
+# Statuses of a job that hasn't finished; an organization has at most one
+ACTIVE_STATUSES = ("pending", "running")
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps read back from SQLite are naive; they are stored in UTC"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+class RecomputeJob:
+    """Progress of a bulk scenario recompute for one organization, mirrored
+    to its scenario_recompute_jobs row so any worker can report it"""
+
+    def __init__(self, record: ScenarioRecomputeJob):
+        self.id = record.id
+        self.organization_id = record.organization_id
+        self.overrides = record.overrides or {}
+        self.paths = record.paths
+        self.status = record.status
+        self.total = record.total or 0
+        self.processed = record.processed or 0
+        self.error: Optional[str] = record.error
+        self.started_at: Optional[datetime] = _utc(record.started_at)
+        self.finished_at: Optional[datetime] = _utc(record.finished_at)
+
+    @property
+    def elapsed_seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return ((self.finished_at or datetime.now(timezone.utc)) - self.started_at).total_seconds()
+
+    @property
+    def throughput(self) -> float:
+        """Scenarios projected per second"""
+        elapsed = self.elapsed_seconds
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "organization_id": self.organization_id,
+            "status": self.status,
+            "overrides": self.overrides,
+            "paths": self.paths,
+            "total": self.total,
+            "processed": self.processed,
+            "progress": self.processed / self.total if self.total else 0.0,
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "throughput": round(self.throughput, 1),
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+def _record(db, job: RecomputeJob):
+    """Write a job's progress to its row, in the caller's transaction"""
+    db.execute(
+        update(ScenarioRecomputeJob).where(ScenarioRecomputeJob.id == job.id).values(
+            status=job.status,
+            total=job.total,
+            processed=job.processed,
+            error=job.error,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+            heartbeat_at=datetime.now(timezone.utc),
+        )
+    )
+
+def _fail_abandoned(db, organization_id: str):
+    """Mark unfinished jobs with no progress for RECOMPUTE_STALE_SECONDS as
+    failed: the worker running them is gone"""
+    now = datetime.now(timezone.utc)
+    db.execute(
+        update(ScenarioRecomputeJob)
+        .where(
+            ScenarioRecomputeJob.organization_id == organization_id,
+            ScenarioRecomputeJob.status.in_(ACTIVE_STATUSES),
+            ScenarioRecomputeJob.heartbeat_at < now - timedelta(seconds=RECOMPUTE_STALE_SECONDS)
+        )
+        .values(status="failed", error="Abandoned: the worker stopped reporting progress", finished_at=now)
+    )
+
+def create_job(organization_id: str, overrides: Optional[dict] = None, paths: int = RECOMPUTE_PATHS) -> Optional[RecomputeJob]:
+    """Record a new recompute job, or return None while the organization
+    already has one pending or running"""
+    db = SessionLocal()
+    try:
+        _fail_abandoned(db, organization_id)
+        record = ScenarioRecomputeJob(
+            organization_id=organization_id,
+            overrides={key: value for key, value in (overrides or {}).items() if value is not None},
+            paths=paths,
+            status="pending",
+            heartbeat_at=datetime.now(timezone.utc),
+        )
+        db.add(record)
+        db.commit()
+        return RecomputeJob(record)
+    except IntegrityError:
+        # The partial unique index admits one unfinished job per organization
+        db.rollback()
+        return None
+    finally:
+        db.close()
+
+def get_job(job_id: str) -> Optional[RecomputeJob]:
+    """Look up a recompute job by id"""
+    db = SessionLocal()
+    try:
+        record = db.get(ScenarioRecomputeJob, job_id)
+        return RecomputeJob(record) if record else None
+    finally:
+        db.close()
+
+def _project_chunk(chunk: List[Tuple[str, dict]], paths: int) -> List[dict]:
+    """Project a chunk of scenarios (runs in a worker process)"""
+    updates = []
+    for scenario_id, inputs in chunk:
+        results = simulate(paths=paths, **inputs)
+        updates.append({
+            "id": scenario_id,
+            "projected_value": results["median_terminal_value"],
+            "projected_income": results["projected_income"],
+            "results": results,
+        })
+    return updates
+
+def _scenario_query(organization_id: str):
+    return (
+        select(*PROJECTION_COLUMNS)
+        .join(Client, Scenario.client_id == Client.id)
+        .where(Client.organization_id == organization_id, Scenario.is_active == True)
+    )
+
+def run_job(
+    job: RecomputeJob,
+    chunk_size: int = RECOMPUTE_CHUNK_SIZE,
+    workers: int = RECOMPUTE_WORKERS,
+    on_progress: Optional[Callable[[RecomputeJob], None]] = None,
+) -> RecomputeJob:
+    """Re-project every active scenario in an organization.
+
+    Scenarios are read from the database in keyset-paged chunks, projected
+    across a process pool and written back with one bulk UPDATE per chunk. At
+    most two chunks per worker are in flight so memory stays flat for any
+    table size.
+    """
+    job.status = "running"
+    job.started_at = datetime.now(timezone.utc)
+
+    db = SessionLocal()
+    context = multiprocessing.get_context("spawn")
+    try:
+        query = _scenario_query(job.organization_id)
+        job.total = db.execute(select(func.count()).select_from(query.subquery())).scalar_one()
+        _record(db, job)
+        db.commit()
+
+        def write(updates: List[dict]):
+            if job.overrides:
+                for row in updates:
+                    row.update(job.overrides)
+            db.execute(update(Scenario), updates)
+            job.processed += len(updates)
+            _record(db, job)
+            db.commit()
+            logger.info(
+                "Recompute %s: %d/%d scenarios (%.0f/s)",
+                job.id, job.processed, job.total, job.throughput
+            )
+            if on_progress:
+                on_progress(job)
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            pending = set()
+            last_id = None
+            while True:
+                # Page on the primary key so no cursor stays open during writes
+                page = query.order_by(Scenario.id).limit(chunk_size)
+                if last_id is not None:
+                    page = page.where(Scenario.id > last_id)
+                rows = db.execute(page).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+
+                chunk = []
+                for row in rows:
+                    inputs = scenario_inputs(row)
+                    inputs.update(job.overrides)
+                    chunk.append((row.id, inputs))
+                pending.add(executor.submit(_project_chunk, chunk, job.paths))
+
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        write(future.result())
+
+            for future in pending:
+                write(future.result())
+
+        job.status = "completed"
+    except Exception as exc:
+        logger.exception("Recompute %s failed", job.id)
+        db.rollback()
+        job.status = "failed"
+        job.error = str(exc)
+    finally:
+        job.finished_at = datetime.now(timezone.utc)
+        try:
+            _record(db, job)
+            db.commit()
+        except Exception:
+            logger.exception("Recompute %s: couldn't record its outcome", job.id)
+            db.rollback()
+        db.close()
+
+    return job
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-project every active scenario in an organization")
+    parser.add_argument("organization_id")
+    parser.add_argument("--expected-return", type=float)
+    parser.add_argument("--inflation-rate", type=float)
+    parser.add_argument("--paths", type=int, default=RECOMPUTE_PATHS)
+    parser.add_argument("--chunk-size", type=int, default=RECOMPUTE_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=RECOMPUTE_WORKERS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    job = create_job(
+        args.organization_id,
+        {"expected_return": args.expected_return, "inflation_rate": args.inflation_rate},
+        args.paths,
+    )
+    if job is None:
+        parser.exit(1, "A recompute is already running for this organization\n")
+    run_job(job, chunk_size=args.chunk_size, workers=args.workers)
+    print(job.to_dict())
@@ -0,0 +1,131 @@
+import functools
+import inspect
+import json
+from decimal import Decimal
+from typing import Any, Callable, Dict
+
+from fastapi import Response
+from fastapi.datastructures import Default, DefaultPlaceholder
+from fastapi.exceptions import ResponseValidationError
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from sqlalchemy import inspect as sa_inspect
+
+try:
+    import orjson
+except ImportError:  # Optional; the standard library encoder is used instead
+    orjson = None
+
+def _default(value: Any) -> Any:
+    """Encode the types orjson (or json) doesn't handle natively"""
+    if isinstance(value, Decimal):
+        return str(value)  # Same as response models: no float rounding
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Serialize plain Python content to compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when available.
+    
+    Decimals are written as strings and datetimes in ISO 8601, matching what
+    the Pydantic response models produce.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+# Column keys per mapped class, for telling fully loaded rows apart
+_column_keys: Dict[type, frozenset] = {}
+
+def _values(instance):
+    """An ORM instance's loaded column values, or the instance itself when
+    any column isn't loaded (expired or deferred)"""
+    cls = type(instance)
+    keys = _column_keys.get(cls)
+    if keys is None:
+        keys = _column_keys[cls] = frozenset(attr.key for attr in sa_inspect(cls).column_attrs)
+    values = instance.__dict__
+    return values if keys <= values.keys() else instance
+
+def loaded_values(content: Any) -> Any:
+    """Swap ORM rows in a result (or in a top-level list or dict of them) for
+    their loaded column values.
+    
+    Validating from attributes goes through SQLAlchemy's instrumented
+    descriptors for every field of every row, which costs more than the
+    JSON encoding itself; reading the instance dict gives the same values.
+    """
+    if isinstance(content, (list, tuple)):
+        return [loaded_values(item) for item in content]
+    if isinstance(content, dict):
+        return {key: loaded_values(value) for key, value in content.items()}
+    if hasattr(content, "_sa_instance_state"):
+        return _values(content)
+    return content
+
+def _serialized(endpoint: Callable, response_model: Any, status_code: int) -> Callable:
+    """Wrap an async endpoint so its result is written to JSON bytes directly.
+    
+    With a response model the result's loaded values are validated and
+    dumped by a TypeAdapter built once per route, skipping FastAPI's
+    intermediate dicts and json.dumps; other results go through
+    FastJSONResponse. Headers and status
+    set on an injected Response parameter are carried over.
+    """
+    adapter = TypeAdapter(response_model) if response_model is not None else None
+    
+    @functools.wraps(endpoint)
+    async def serialized_endpoint(*args, **kwargs):
+        content = await endpoint(*args, **kwargs)
+        if isinstance(content, Response):
+            return content
+        
+        if adapter is None:
+            response = FastJSONResponse(content, status_code=status_code)
+        else:
+            try:
+                body = adapter.dump_json(adapter.validate_python(loaded_values(content), from_attributes=True))
+            except ValidationError as exc:
+                raise ResponseValidationError(errors=exc.errors(include_url=False), body=content)
+            response = Response(body, status_code=status_code, media_type="application/json")
+        
+        for value in kwargs.values():
+            if isinstance(value, Response):
+                response.raw_headers.extend(value.raw_headers)
+                if value.status_code:
+                    response.status_code = value.status_code
+        return response
+    
+    serialized_endpoint.__serialized__ = True
+    return serialized_endpoint
+
+class SerializedRoute(APIRoute):
+    """APIRoute that serializes responses on the fast path above.
+    
+    Routes using response_model_include/exclude options, custom response
+    classes or sync endpoints keep FastAPI's default handling.
+    """
+    
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        response_model = kwargs.get("response_model")
+        if isinstance(response_model, DefaultPlaceholder):
+            response_model = None
+        customized = any(kwargs.get(option) for option in (
+            "response_model_include", "response_model_exclude", "response_model_exclude_unset",
+            "response_model_exclude_defaults", "response_model_exclude_none",
+        )) or not isinstance(kwargs.get("response_class", Default(JSONResponse)), DefaultPlaceholder)
+        
+        if inspect.iscoroutinefunction(endpoint) and not customized and not getattr(endpoint, "__serialized__", False):
+            endpoint = _serialized(endpoint, response_model, kwargs.get("status_code") or 200)
+        super().__init__(path, endpoint, **kwargs)
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from datetime import date
+from typing import Optional
+
+class ReturnMetrics(BaseModel):
+    start_date: date
+    end_date: date
+    start_value: float
+    end_value: float
+    net_flows: float  # External money in (+) or out (-) over the period
+    twr: float  # Time-weighted, as a fraction of 1
+    twr_annualized: Optional[float] = None  # Periods of a year or more
+    mwr: Optional[float] = None  # Money-weighted over the period
+    irr: Optional[float] = None  # Money-weighted, annualized
+
+class PortfolioReturns(ReturnMetrics):
+    portfolio_id: str
+
+class CompositeReturns(ReturnMetrics):
+    portfolios: int
+
+class HouseholdReturns(CompositeReturns):
+    household_id: str
@@ -0,0 +1,267 @@
+import hashlib
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from statistics import NormalDist
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.models.client import Client
+from app.models.portfolio import Holding, Portfolio
+from app.models.security_price import MARKET_FEED, SecurityPrice
+
+# Return covariances kept per organization, universe and window. Prices
+# arrive daily, so a same-day correction shows once its entry expires.
+RISK_CACHE_SIZE = int(os.getenv("RISK_CACHE_SIZE", "256"))
+RISK_CACHE_TTL = float(os.getenv("RISK_CACHE_TTL_SECONDS", "900"))
+
+TRADING_DAYS_PER_YEAR = 252
+# Daily closes a symbol needs within the window to be modelled
+MIN_OBSERVATIONS = int(os.getenv("RISK_MIN_OBSERVATIONS", "20"))
+# Symbols per IN (...) when loading prices
+LOAD_BATCH_SIZE = 1000
+# Portfolios scored per matrix multiply
+RISK_BATCH_SIZE = 1000
+
+# Highest annualized volatility suited to each Client.risk_tolerance
+RISK_TOLERANCE_VOLATILITY = {"conservative": 0.08, "moderate": 0.14, "aggressive": 0.22}
+
+EXPOSURE_DIMENSIONS = ("asset_class", "sector", "region")
+UNCLASSIFIED = "unclassified"
+
+universe_cache = TTLCache(maxsize=RISK_CACHE_SIZE, ttl=RISK_CACHE_TTL)
+
+class Universe(NamedTuple):
+    """Daily returns of the modelled symbols and their moments"""
+    symbols: List[str]  # Column order of the arrays
+    returns: np.ndarray  # Days x symbols
+    mean: np.ndarray
+    covariance: np.ndarray
+    start: Optional[date]
+    end: Optional[date]
+    
+    @property
+    def index(self) -> Dict[str, int]:
+        return {symbol: column for column, symbol in enumerate(self.symbols)}
+
+def _batches(items: List, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def load_prices(session: Session, organization_id: str, symbols: List[str], start: date, end: date) -> Dict[tuple, float]:
+    """Closes by (symbol, day) from the market feed and the organization's
+    own ingests, the organization's taking precedence"""
+    prices = {}
+    for batch in _batches(symbols, LOAD_BATCH_SIZE):
+        result = session.execute(
+            select(SecurityPrice.organization_id, SecurityPrice.symbol, SecurityPrice.price_date, SecurityPrice.price)
+            .where(
+                SecurityPrice.organization_id.in_([MARKET_FEED, organization_id]),
+                SecurityPrice.symbol.in_(batch),
+                SecurityPrice.price_date > start,
+                SecurityPrice.price_date <= end
+            )
+        )
+        for row in sorted(result, key=lambda row: row.organization_id == organization_id):
+            prices[row.symbol, row.price_date] = float(row.price)
+    return prices
+
+def build_universe(session: Session, organization_id: str, symbols: Sequence[str], end: date, lookback_days: int) -> Universe:
+    """Daily returns over the lookback window ending at `end`.
+    
+    Closes are aligned on the days any symbol priced and carried forward
+    over gaps, so a day without a price counts as unchanged. Symbols with
+    fewer than MIN_OBSERVATIONS closes are left out.
+    """
+    symbols = sorted(set(symbols))
+    prices = load_prices(session, organization_id, symbols, end - timedelta(days=lookback_days), end)
+    days = sorted({day for _, day in prices})
+    
+    closes = np.full((len(days), len(symbols)), np.nan)
+    if prices:
+        rows = {day: row for row, day in enumerate(days)}
+        columns = {symbol: column for column, symbol in enumerate(symbols)}
+        keys = list(prices)
+        closes[[rows[day] for _, day in keys], [columns[symbol] for symbol, _ in keys]] = list(prices.values())
+    
+    modelled = np.count_nonzero(~np.isnan(closes), axis=0) >= max(MIN_OBSERVATIONS, 2)
+    closes = closes[:, modelled]
+    
+    # Carry each close forward to the days its symbol didn't price
+    last_priced = np.where(np.isnan(closes), 0, np.arange(len(days))[:, None])
+    np.maximum.accumulate(last_priced, axis=0, out=last_priced)
+    closes = closes[last_priced, np.arange(closes.shape[1])]
+    
+    with np.errstate(invalid="ignore"):
+        returns = np.nan_to_num(closes[1:] / closes[:-1] - 1.0, nan=0.0)
+    count = returns.shape[1]
+    if len(returns) > 1:
+        covariance = np.cov(returns, rowvar=False).reshape(count, count)
+    else:
+        covariance = np.zeros((count, count))
+    
+    return Universe(
+        symbols=[symbol for symbol, keep in zip(symbols, modelled) if keep],
+        returns=returns,
+        mean=returns.mean(axis=0) if len(returns) else np.zeros(count),
+        covariance=covariance,
+        start=days[0] if days else None,
+        end=days[-1] if days else None,
+    )
+
+def get_universe(session: Session, organization_id: str, symbols: Sequence[str], end: date, lookback_days: int) -> Universe:
+    """build_universe, cached per organization, symbol set and window"""
+    digest = hashlib.blake2b("\n".join(sorted(set(symbols))).encode(), digest_size=16).hexdigest()
+    key = (organization_id, digest, end, lookback_days)
+    universe = universe_cache.get(key)
+    if universe is None:
+        universe = build_universe(session, organization_id, symbols, end, lookback_days)
+        universe_cache.set(key, universe)
+    return universe
+
+def load_positions(
+    session: Session, organization_id: str, portfolio_ids: Optional[Sequence[str]] = None, client_id: Optional[str] = None
+) -> list:
+    """Holdings of the organization's active portfolios (or of the given
+    ones, or one client's), with each owner's risk tolerance"""
+    query = (
+        select(
+            Holding.portfolio_id, Portfolio.client_id, Client.risk_tolerance, Holding.symbol,
+            Holding.asset_class, Holding.sector, Holding.region, Holding.market_value
+        )
+        .join(Portfolio, Holding.portfolio_id == Portfolio.id)
+        .join(Client, Portfolio.client_id == Client.id)
+        .where(Client.organization_id == organization_id, Portfolio.is_active.is_not(False))
+    )
+    if portfolio_ids is not None:
+        query = query.where(Portfolio.id.in_(list(portfolio_ids)))
+    if client_id:
+        query = query.where(Portfolio.client_id == client_id)
+    return session.execute(query.order_by(Holding.portfolio_id)).all()
+
+def _exposures(positions: Sequence, rows: np.ndarray, values: np.ndarray, totals: np.ndarray) -> List[Dict[str, Dict[str, float]]]:
+    """Share of each portfolio's value by asset class, sector and region,
+    summed for all portfolios at once"""
+    exposures = [{dimension: {} for dimension in EXPOSURE_DIMENSIONS} for _ in totals]
+    for dimension in EXPOSURE_DIMENSIONS:
+        labels, codes = np.unique(
+            [getattr(position, dimension) or UNCLASSIFIED for position in positions], return_inverse=True
+        )
+        cells = rows * len(labels) + codes
+        shape = (len(totals), len(labels))
+        sums = np.bincount(cells, weights=values, minlength=shape[0] * shape[1]).reshape(shape)
+        shares = np.round(np.divide(sums, totals[:, None], out=np.zeros(shape), where=totals[:, None] > 0), 6)
+        held_rows, held_labels = np.nonzero(np.bincount(cells, minlength=shape[0] * shape[1]).reshape(shape))
+        labels = labels.tolist()
+        for row, label, share in zip(held_rows.tolist(), held_labels.tolist(), shares[held_rows, held_labels].tolist()):
+            exposures[row][dimension][labels[label]] = share
+    return exposures
+
+def score(universe: Universe, weights: np.ndarray, confidence: float) -> dict:
+    """Risk of a batch of portfolios given as rows of weights over the
+    universe's symbols, each measure an array with one value per row.
+    
+    Volatility comes from the covariance matrix (w Σ wᵀ for every row in one
+    multiply); historical VaR and CVaR from replaying the window's returns
+    against every row at once. VaR and CVaR are one-day losses as
+    fractions of the portfolio's value.
+    """
+    daily = np.sqrt(np.maximum(np.einsum("ij,ij->i", weights @ universe.covariance, weights), 0.0))
+    mean = weights @ universe.mean
+    
+    z = NormalDist().inv_cdf(confidence)
+    tail_density = np.exp(-0.5 * z * z) / np.sqrt(2 * np.pi) / (1.0 - confidence)
+    
+    replayed = universe.returns @ weights.T  # Days x portfolios
+    cutoff = np.quantile(replayed, 1.0 - confidence, axis=0)
+    tail = replayed <= cutoff
+    
+    return {
+        "volatility": daily * np.sqrt(TRADING_DAYS_PER_YEAR),
+        "var_parametric": z * daily - mean,
+        "cvar_parametric": tail_density * daily - mean,
+        "var_historical": -cutoff,
+        "cvar_historical": -(replayed * tail).sum(axis=0) / tail.sum(axis=0),
+    }
+
+def _rounded(value) -> float:
+    return round(float(value), 6)
+
+def portfolio_risk(
+    session: Session,
+    organization_id: str,
+    portfolio_ids: Optional[Sequence[str]] = None,
+    client_id: Optional[str] = None,
+    confidence: float = 0.95,
+    lookback_days: int = 365,
+    as_of: Optional[date] = None,
+) -> List[dict]:
+    """Volatility, VaR, CVaR and exposures of each portfolio with holdings.
+    
+    Weights are market values over the portfolio's total. Holdings without
+    enough price history carry no risk and are reported through `coverage`.
+    All portfolios share one cached covariance matrix for their combined
+    symbols and are scored RISK_BATCH_SIZE at a time.
+    """
+    end = as_of or datetime.now(timezone.utc).date()
+    positions = load_positions(session, organization_id, portfolio_ids, client_id)
+    if not positions:
+        return []
+    
+    by_portfolio: Dict[str, list] = defaultdict(list)
+    for position in positions:
+        by_portfolio[position.portfolio_id].append(position)
+    ordered = list(by_portfolio)
+    
+    universe = get_universe(session, organization_id, [position.symbol for position in positions], end, lookback_days)
+    columns = universe.index
+    modelled = len(universe.symbols) > 0 and len(universe.returns) > 1
+    
+    # One entry per holding: its portfolio's row, its symbol's column (-1
+    # if unmodelled) and its value. Positions come sorted by portfolio.
+    rows = np.repeat(np.arange(len(ordered)), [len(by_portfolio[portfolio_id]) for portfolio_id in ordered])
+    symbol_columns = np.array([columns.get(position.symbol, -1) for position in positions])
+    values = np.array([float(position.market_value or 0) for position in positions])
+    totals = np.bincount(rows, weights=values, minlength=len(ordered))
+    shares = np.divide(values, totals[rows], out=np.zeros_like(values), where=totals[rows] > 0)
+    exposures = _exposures(positions, rows, values, totals)
+    
+    results = []
+    for first in range(0, len(ordered), RISK_BATCH_SIZE):
+        batch = ordered[first:first + RISK_BATCH_SIZE]
+        low, high = np.searchsorted(rows, [first, first + len(batch)])
+        held = slice(low, high)
+        known = symbol_columns[held] >= 0
+        weights = np.zeros((len(batch), len(universe.symbols)))
+        np.add.at(weights, (rows[held][known] - first, symbol_columns[held][known]), shares[held][known])
+        
+        measures = score(universe, weights, confidence) if modelled else None
+        for row, portfolio_id in enumerate(batch):
+            holdings = by_portfolio[portfolio_id]
+            tolerance = holdings[0].risk_tolerance
+            result = {
+                "portfolio_id": portfolio_id,
+                "client_id": holdings[0].client_id,
+                "total_value": round(float(totals[first + row]), 2),
+                "confidence": confidence,
+                "coverage": _rounded(weights[row].sum()),
+                "observations": len(universe.returns),
+                "start_date": universe.start,
+                "end_date": universe.end,
+                "exposures": exposures[first + row],
+                "risk_tolerance": tolerance,
+                "within_risk_tolerance": None,
+            }
+            for name in ("volatility", "var_parametric", "cvar_parametric", "var_historical", "cvar_historical"):
+                result[name] = _rounded(measures[name][row]) if measures else None
+            
+            limit = RISK_TOLERANCE_VOLATILITY.get(tolerance)
+            if measures and limit is not None:
+                result["within_risk_tolerance"] = bool(measures["volatility"][row] <= limit)
+            results.append(result)
+    
+    return results
@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+from datetime import date
+from typing import Dict, Optional
+
+class PortfolioRisk(BaseModel):
+    portfolio_id: str
+    client_id: str
+    total_value: float  # Market value of the holdings
+    confidence: float
+    coverage: float  # Share of the value with enough price history to model
+    observations: int  # Daily returns in the window
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    # None when no holding has enough price history
+    volatility: Optional[float] = None  # Annualized, as a fraction of 1
+    var_parametric: Optional[float] = None  # One-day loss as a fraction of value
+    cvar_parametric: Optional[float] = None
+    var_historical: Optional[float] = None
+    cvar_historical: Optional[float] = None
+    exposures: Dict[str, Dict[str, float]]  # Share of value by asset_class, sector and region
+    risk_tolerance: Optional[str] = None  # The client's
+    within_risk_tolerance: Optional[bool] = None  # Volatility within the tolerance's band
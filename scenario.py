@@ -1,6 +1,8 @@
-from sqlalchemy import Column, String, Text, DateTime, Numeric, Boolean, JSON, Integer
+from sqlalchemy import Column, String, Text, DateTime, Numeric, Boolean, JSON, Integer, Index, text
 from sqlalchemy.sql import func
+from sqlalchemy.orm import foreign, relationship
 from app.database import Base
+from app.models.client import Client
 import uuid
 
 class Scenario(Base):
@@ -24,4 +26,39 @@ class Scenario(Base):
     results = Column(JSON, default=dict)  # Detailed scenario results
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index("ix_scenarios_client", "client_id", "created_at", "id"),
+    )
+
+Client.scenarios = relationship(
+    Scenario, primaryjoin=Client.id == foreign(Scenario.client_id),
+    order_by=(Scenario.created_at, Scenario.id), viewonly=True, lazy="raise"
+)
+
+class ScenarioRecomputeJob(Base):
+    """A bulk scenario recompute, shared by every worker polling it"""
+    __tablename__ = "scenario_recompute_jobs"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    organization_id = Column(String, nullable=False)
+    status = Column(Text, nullable=False, default="pending")  # pending, running, completed, failed
+    overrides = Column(JSON, default=dict)
+    paths = Column(Integer, nullable=False)
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    heartbeat_at = Column(DateTime(timezone=True))  # Last progress written by the running worker
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        # At most one unfinished job per organization
+        Index(
+            "ix_scenario_recompute_jobs_org_active", "organization_id", unique=True,
+            postgresql_where=text("status IN ('pending', 'running')"),
+            sqlite_where=text("status IN ('pending', 'running')")
+        ),
+    )
@@ -1,83 +1,171 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, select
 from typing import List, Optional
-from app.database import get_db
+from app.database import get_async_db
 from app.models.scenario import Scenario
 from app.models.client import Client
 from app.models.user import User
 from app.schemas.portfolio import ScenarioCreate, ScenarioUpdate, ScenarioResponse
-from app.core.auth import get_current_user, check_permissions
+from app.schemas.simulation import (
+    SimulationRequest, SimulationResponse, RecomputeRequest, RecomputeJobResponse,
+    SweepRequest, SweepResponse
+)
+from app.schemas.batch_lookup import BatchRequest, BatchResponse
+from app.services.monte_carlo import SWEEP_PARAMETERS, sweep_scenario
+from app.services import recompute
+from app.services.projection_cache import simulate_scenario_cached
+from app.core.auth import get_current_user, check_permissions, require_permissions
+from app.core.pagination import paginate
+from app.core.batch import fetch_batch, parse_ids
+from app.core.http_cache import conditional_response, entity_etag, page_not_modified
+from app.core.responses import SerializedRoute
+from app.routers.clients import get_org_client
 
-router = APIRouter()
+router = APIRouter(route_class=SerializedRoute)
+
+async def get_org_scenario(db: AsyncSession, scenario_id: str, organization_id: str) -> Scenario:
+    """Load a scenario whose client belongs to the organization or raise 404"""
+    result = await db.execute(
+        select(Scenario).join(Client, Scenario.client_id == Client.id).where(
+            and_(
+                Scenario.id == scenario_id,
+                Client.organization_id == organization_id
+            )
+        )
+    )
+    scenario = result.scalars().first()
+    
+    if not scenario:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Scenario not found"
+        )
+    
+    return scenario
 
 @router.get("/", response_model=List[ScenarioResponse])
 async def get_scenarios(
+    request: Request,
+    response: Response,
     client_id: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(check_permissions(["planning:view"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all scenarios, optionally filtered by client"""
-    query = db.query(Scenario).join(Client).filter(
+    """Get all scenarios, optionally filtered by client; honours If-None-Match"""
+    query = select(Scenario).join(Client, Scenario.client_id == Client.id).where(
         Client.organization_id == current_user.organization_id
     )
     
     if client_id:
-        query = query.filter(Scenario.client_id == client_id)
+        query = query.where(Scenario.client_id == client_id)
+    
+    not_modified = await page_not_modified(db, request, response, query, Scenario, skip, limit, cursor)
+    if not_modified:
+        return not_modified
     
-    scenarios = query.offset(skip).limit(limit).all()
-    return scenarios
+    result = await db.execute(paginate(query, Scenario, skip, limit, cursor))
+    return result.scalars().all()
 
-@router.get("/{scenario_id}", response_model=ScenarioResponse)
-async def get_scenario(
-    scenario_id: str,
-    current_user: User = Depends(check_permissions(["planning:view"])),
-    db: Session = Depends(get_db)
+@router.post("/recompute", response_model=RecomputeJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def recompute_scenarios(
+    options: RecomputeRequest,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(check_permissions(["planning:edit", "org:settings"]))
 ):
-    """Get a specific scenario by ID"""
-    scenario = db.query(Scenario).join(Client).filter(
-        and_(
-            Scenario.id == scenario_id,
-            Client.organization_id == current_user.organization_id
+    """Re-project every active scenario in the organization in the background.
+    
+    One job runs per organization at a time; 409 while another is pending
+    or running.
+    """
+    job = await run_in_threadpool(
+        recompute.create_job,
+        current_user.organization_id,
+        {"expected_return": options.expected_return, "inflation_rate": options.inflation_rate},
+        options.paths
+    )
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A recompute is already running for this organization"
         )
-    ).first()
+    background_tasks.add_task(recompute.run_job, job)
     
-    if not scenario:
+    return job.to_dict()
+
+@router.get("/recompute/{job_id}", response_model=RecomputeJobResponse)
+async def get_recompute_job(
+    job_id: str,
+    current_user: User = Depends(check_permissions(["planning:view"]))
+):
+    """Get progress and throughput of a recompute job"""
+    job = await run_in_threadpool(recompute.get_job, job_id)
+    
+    if not job or job.organization_id != current_user.organization_id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Scenario not found"
+            detail="Recompute job not found"
         )
     
-    return scenario
+    return job.to_dict()
+
+async def fetch_scenarios(db: AsyncSession, current_user: User, ids: List[str]) -> dict:
+    """Load the organization's scenarios with the given ids in one query"""
+    query = select(Scenario).join(Client, Scenario.client_id == Client.id).where(
+        Client.organization_id == current_user.organization_id
+    )
+    return await fetch_batch(db, query, Scenario, ids, "Scenario not found")
+
+@router.get("/batch", response_model=BatchResponse[ScenarioResponse])
+async def get_scenarios_batch(
+    ids: str = Query(..., description="Comma-separated scenario IDs"),
+    current_user: User = Depends(check_permissions(["planning:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get up to MAX_BATCH_IDS scenarios by ID in one query; ids that aren't
+    found are listed in `errors`"""
+    return await fetch_scenarios(db, current_user, parse_ids(ids))
+
+@router.post("/batch", response_model=BatchResponse[ScenarioResponse])
+async def post_scenarios_batch(
+    batch: BatchRequest,
+    current_user: User = Depends(check_permissions(["planning:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Same as GET /batch, for id lists too long for a URL"""
+    return await fetch_scenarios(db, current_user, parse_ids(batch.ids))
+
+@router.get("/{scenario_id}", response_model=ScenarioResponse)
+async def get_scenario(
+    scenario_id: str,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(check_permissions(["planning:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a specific scenario by ID; honours If-None-Match"""
+    scenario = await get_org_scenario(db, scenario_id, current_user.organization_id)
+    return conditional_response(request, response, entity_etag(scenario), scenario.updated_at) or scenario
 
 @router.post("/", response_model=ScenarioResponse)
 async def create_scenario(
     scenario_data: ScenarioCreate,
     current_user: User = Depends(check_permissions(["planning:create"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new scenario"""
     # Verify client exists and belongs to organization
-    client = db.query(Client).filter(
-        and_(
-            Client.id == scenario_data.client_id,
-            Client.organization_id == current_user.organization_id
-        )
-    ).first()
-    
-    if not client:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Client not found"
-        )
+    await get_org_client(db, scenario_data.client_id, current_user.organization_id)
     
     # Create new scenario
     db_scenario = Scenario(**scenario_data.model_dump())
     db.add(db_scenario)
-    db.commit()
-    db.refresh(db_scenario)
+    await db.commit()
+    await db.refresh(db_scenario)
     
     return db_scenario
 
@@ -86,30 +174,19 @@ async def update_scenario(
     scenario_id: str,
     scenario_data: ScenarioUpdate,
     current_user: User = Depends(check_permissions(["planning:edit"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update an existing scenario"""
     # Find scenario
-    scenario = db.query(Scenario).join(Client).filter(
-        and_(
-            Scenario.id == scenario_id,
-            Client.organization_id == current_user.organization_id
-        )
-    ).first()
-    
-    if not scenario:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Scenario not found"
-        )
+    scenario = await get_org_scenario(db, scenario_id, current_user.organization_id)
     
     # Update scenario fields
     update_data = scenario_data.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(scenario, field, value)
     
-    db.commit()
-    db.refresh(scenario)
+    await db.commit()
+    await db.refresh(scenario)
     
     return scenario
 
@@ -117,24 +194,74 @@ async def update_scenario(
 async def delete_scenario(
     scenario_id: str,
     current_user: User = Depends(check_permissions(["planning:edit"])),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a scenario"""
-    scenario = db.query(Scenario).join(Client).filter(
-        and_(
-            Scenario.id == scenario_id,
-            Client.organization_id == current_user.organization_id
-        )
-    ).first()
-    
-    if not scenario:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Scenario not found"
-        )
+    scenario = await get_org_scenario(db, scenario_id, current_user.organization_id)
     
     # Set to inactive instead of hard delete
     scenario.is_active = False
-    db.commit()
+    await db.commit()
+    
+    return {"message": "Scenario deactivated successfully"}
+
+@router.post("/{scenario_id}/simulate", response_model=SimulationResponse)
+async def simulate_scenario_projection(
+    scenario_id: str,
+    options: SimulationRequest = SimulationRequest(),
+    current_user: User = Depends(check_permissions(["planning:edit"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Run a Monte Carlo projection for a scenario and store the results.
+    
+    Projections are memoized on the scenario's inputs, so re-opening an
+    unchanged scenario (or one identical to it) doesn't simulate again.
+    """
+    scenario = await get_org_scenario(db, scenario_id, current_user.organization_id)
+    
+    # Keep the CPU-bound simulation off the event loop
+    results = await run_in_threadpool(
+        simulate_scenario_cached,
+        scenario,
+        paths=options.paths,
+        volatility=options.volatility,
+        percentiles=options.percentiles,
+        seed=options.seed
+    )
+    
+    if options.persist:
+        scenario.projected_value = results["median_terminal_value"]
+        scenario.projected_income = results["projected_income"]
+        scenario.results = results
+        await db.commit()
+    
+    return {"scenario_id": scenario_id, **results}
+
+@router.post("/{scenario_id}/sweep", response_model=SweepResponse)
+async def sweep_scenario_projection(
+    scenario_id: str,
+    options: SweepRequest,
+    current_user: User = Depends(check_permissions(["planning:view"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Project a scenario over a grid of what-if inputs in one call.
+    
+    Each swept input adds a dimension to the grid; the projection is the
+    closed-form expected value, so even large grids return in milliseconds.
+    Nothing is stored unless `persist` is set.
+    """
+    if options.persist:
+        require_permissions(current_user, frozenset(["planning:edit"]))
+    
+    scenario = await get_org_scenario(db, scenario_id, current_user.organization_id)
+    axes = {
+        name: getattr(options, name).points()
+        for name in SWEEP_PARAMETERS if getattr(options, name) is not None
+    }
+    results = await run_in_threadpool(sweep_scenario, scenario, axes)
+    
+    if options.persist:
+        scenario.results = {**(scenario.results or {}), "sweep": results}
+        await db.commit()
     
-    return {"message": "Scenario deactivated successfully"}
\ No newline at end of file
+    return {"scenario_id": scenario_id, **results}
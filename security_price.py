@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, Text, Date, DateTime, Numeric
+from sqlalchemy.sql import func
+from app.database import Base
+
+# organization_id of prices from the operator's feed, which every tenant sees
+MARKET_FEED = "*"
+
+class SecurityPrice(Base):
+    """Closing price of a symbol; one row per source per symbol per day"""
+    __tablename__ = "security_prices"
+    
+    # A symbol's history sits together in date order, so building a
+    # return series is one primary key range scan per source
+    organization_id = Column(String, primary_key=True)  # MARKET_FEED, or the tenant that ingested it
+    symbol = Column(Text, primary_key=True)
+    price_date = Column(Date, primary_key=True)
+    price = Column(Numeric(10, 4), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
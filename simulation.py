@@ -0,0 +1,105 @@
+from pydantic import BaseModel, Field, model_validator
+from datetime import datetime
+from typing import Annotated, Any, Dict, List, Optional
+
+class SimulationRequest(BaseModel):
+    paths: int = Field(10000, ge=1000, le=100000)
+    volatility: Optional[float] = Field(None, ge=0, le=100)  # Annual, percent
+    percentiles: List[Annotated[float, Field(ge=0, le=100)]] = Field(
+        default_factory=lambda: [10, 25, 50, 75, 90], min_length=1, max_length=20
+    )
+    seed: Optional[int] = None
+    persist: bool = True  # Store projected_value, projected_income and results
+
+class SimulationResponse(BaseModel):
+    scenario_id: str
+    paths: int
+    years: int
+    seed: Optional[int] = None
+    volatility: float
+    percentiles: Dict[str, List[float]]
+    real_percentiles: Dict[str, List[float]]
+    median_terminal_value: float
+    real_median_terminal_value: float
+    target_amount: Optional[float] = None
+    probability_of_success: Optional[float] = None
+    projected_income: float
+
+class RecomputeRequest(BaseModel):
+    expected_return: Optional[float] = Field(None, ge=-50, le=50)  # New house view, percent
+    inflation_rate: Optional[float] = Field(None, ge=-10, le=50)
+    paths: int = Field(2000, ge=100, le=100000)
+
+class RecomputeJobResponse(BaseModel):
+    id: str
+    organization_id: str
+    status: str
+    overrides: Dict[str, float]
+    paths: int
+    total: int
+    processed: int
+    progress: float
+    elapsed_seconds: float
+    throughput: float  # Scenarios per second
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+# Largest grid a sweep may request, in cells
+MAX_SWEEP_CELLS = 100000
+
+class SweepAxis(BaseModel):
+    """Values of one swept input: listed, or `steps` evenly spaced from
+    `start` to `stop` inclusive"""
+    values: Optional[List[float]] = Field(None, min_length=1, max_length=1000)
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    steps: Optional[int] = Field(None, ge=1, le=1000)
+    
+    @model_validator(mode="after")
+    def check_range(self):
+        if self.values is None and None in (self.start, self.stop, self.steps):
+            raise ValueError("give either values or start, stop and steps")
+        return self
+    
+    def points(self) -> List[float]:
+        if self.values is not None:
+            return self.values
+        if self.steps == 1:
+            return [self.start]
+        step = (self.stop - self.start) / (self.steps - 1)
+        return [self.start + step * i for i in range(self.steps)]
+
+class SweepRequest(BaseModel):
+    # Inputs not given keep the scenario's value
+    current_savings: Optional[SweepAxis] = None
+    monthly_contribution: Optional[SweepAxis] = None
+    expected_return: Optional[SweepAxis] = None  # Annual, percent
+    inflation_rate: Optional[SweepAxis] = None
+    target_age: Optional[SweepAxis] = None
+    persist: bool = False  # Store the grid under the scenario's results["sweep"]
+    
+    @model_validator(mode="after")
+    def check_size(self):
+        cells = 1
+        for name in type(self).model_fields:
+            axis = getattr(self, name)
+            if isinstance(axis, SweepAxis):
+                cells *= len(axis.points())
+        if cells > MAX_SWEEP_CELLS:
+            raise ValueError(f"a sweep may have at most {MAX_SWEEP_CELLS} cells")
+        return self
+
+class SweepAxisResponse(BaseModel):
+    name: str
+    values: List[float]
+
+class SweepResponse(BaseModel):
+    scenario_id: str
+    axes: List[SweepAxisResponse]  # In the order of the grid dimensions
+    cells: int
+    # Nested lists, one level per axis; a single value when nothing is swept
+    projected_value: Any
+    real_projected_value: Any
+    projected_income: Any
+    funded_ratio: Any = None  # Of the scenario's target_amount, if it has one
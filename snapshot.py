@@ -0,0 +1,21 @@
+from sqlalchemy import Column, String, Date, DateTime, Numeric, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+class PortfolioSnapshot(Base):
+    """End-of-day value of a portfolio; one row per portfolio per day"""
+    __tablename__ = "portfolio_snapshots"
+    
+    # Rows of one portfolio sit together in date order, so a chart range
+    # is a single contiguous primary key scan
+    portfolio_id = Column(String, primary_key=True)
+    snapshot_date = Column(Date, primary_key=True)
+    total_value = Column(Numeric(14, 2), nullable=False)
+    net_flows = Column(Numeric(14, 2), nullable=False, default=0)  # Deposits less withdrawals that day
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        # Snapshots are appended in date order, so a BRIN index keeps
+        # date-wide scans (rollups, retention) cheap at a tiny size
+        Index("ix_portfolio_snapshots_date", "snapshot_date", postgresql_using="brin"),
+    )
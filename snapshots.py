@@ -0,0 +1,126 @@
+import argparse
+import logging
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import List, Optional
+
+from sqlalchemy import Numeric, case, cast, func, literal, select
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, dialect_insert
+from app.models.client import Client
+from app.models.portfolio import Portfolio, PortfolioTransaction
+from app.models.snapshot import PortfolioSnapshot
+
+logger = logging.getLogger(__name__)
+
+def take_snapshots(session: Session, snapshot_date: Optional[date] = None, organization_id: Optional[str] = None) -> int:
+    """Record every active portfolio's total value for one day.
+    
+    A single INSERT ... SELECT joins portfolios to that day's deposits and
+    withdrawals, so the job costs one statement however many portfolios
+    there are. Re-running for the same day overwrites its rows. Runs in the
+    caller's transaction; pass organization_id to snapshot one tenant.
+    """
+    snapshot_date = snapshot_date or datetime.now(timezone.utc).date()
+    day_start = datetime.combine(snapshot_date, datetime.min.time())
+    
+    amount = func.abs(PortfolioTransaction.net_amount)
+    flows = (
+        select(
+            PortfolioTransaction.portfolio_id,
+            func.sum(case(
+                (PortfolioTransaction.type == "deposit", amount),
+                else_=-amount
+            )).label("net_flows")
+        )
+        .where(
+            PortfolioTransaction.type.in_(["deposit", "withdrawal"]),
+            PortfolioTransaction.trade_date >= day_start,
+            PortfolioTransaction.trade_date < day_start + timedelta(days=1)
+        )
+        .group_by(PortfolioTransaction.portfolio_id)
+        .subquery()
+    )
+    
+    rows = (
+        select(
+            Portfolio.id,
+            literal(snapshot_date),
+            func.coalesce(Portfolio.total_value, 0),
+            cast(func.coalesce(flows.c.net_flows, 0), Numeric(14, 2))
+        )
+        .outerjoin(flows, flows.c.portfolio_id == Portfolio.id)
+        .where(Portfolio.is_active.is_not(False))
+    )
+    if organization_id:
+        rows = rows.join(Client, Portfolio.client_id == Client.id).where(Client.organization_id == organization_id)
+    
+    snapshots = PortfolioSnapshot.__table__
+    statement = dialect_insert(session)(snapshots).from_select(
+        ["portfolio_id", "snapshot_date", "total_value", "net_flows"], rows
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=["portfolio_id", "snapshot_date"],
+        set_={
+            "total_value": statement.excluded.total_value,
+            "net_flows": statement.excluded.net_flows,
+            "created_at": func.now(),
+        }
+    )
+    return session.execute(statement).rowcount
+
+def _bucket(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+def portfolio_history(
+    session: Session,
+    portfolio_id: str,
+    start: Optional[date],
+    end: Optional[date],
+    granularity: str = "day"
+) -> List[dict]:
+    """Snapshot series for one portfolio, from `start` to `end` inclusive.
+    
+    Reads a contiguous primary key range of the snapshots table only. Weeks
+    and months report their last snapshot's value and the flows summed over
+    the period, dated at the period's last snapshot.
+    """
+    statement = (
+        select(PortfolioSnapshot.snapshot_date, PortfolioSnapshot.total_value, PortfolioSnapshot.net_flows)
+        .where(PortfolioSnapshot.portfolio_id == portfolio_id)
+    )
+    if start:
+        statement = statement.where(PortfolioSnapshot.snapshot_date >= start)
+    if end:
+        statement = statement.where(PortfolioSnapshot.snapshot_date <= end)
+    statement = statement.order_by(PortfolioSnapshot.snapshot_date)
+    
+    points = OrderedDict()
+    for snapshot_date, total_value, net_flows in session.execute(statement):
+        key = _bucket(snapshot_date, granularity)
+        flows = (points[key]["net_flows"] if key in points else Decimal("0")) + (net_flows or 0)
+        points[key] = {"date": snapshot_date, "value": total_value, "net_flows": flows}
+    return list(points.values())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record the daily portfolio value snapshot")
+    parser.add_argument("--date", type=date.fromisoformat, help="Snapshot date (default: today, UTC)")
+    parser.add_argument("--organization", help="Only snapshot this organization's portfolios")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        written = take_snapshots(db, args.date, args.organization)
+        db.commit()
+    finally:
+        db.close()
+    logger.info("Wrote %d snapshots in %.2fs", written, time.perf_counter() - started)
@@ -0,0 +1,61 @@
+from typing import Iterable, List
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+from app.models.portfolio import Holding, Portfolio
+from app.core.entity_cache import invalidate_on_commit
+from app.services.household_rollup import refresh_households_on_commit
+
+# Ids per UPDATE ... WHERE id IN (...) statement
+VALUATION_BATCH_SIZE = 1000
+
+def _batches(ids: List[str], size: int = VALUATION_BATCH_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def holding_weight():
+    """A holding's share of its portfolio's stored total, in percent"""
+    portfolio_total = (
+        select(Portfolio.total_value)
+        .where(Portfolio.id == Holding.portfolio_id)
+        .scalar_subquery()
+    )
+    return case(
+        (portfolio_total > 0, func.round(Holding.market_value * 100 / portfolio_total, 2)),
+        else_=None
+    )
+
+def update_weights(session: Session, portfolio_ids):
+    """Recompute holding weights for a list or subquery of portfolio ids"""
+    session.execute(
+        update(Holding).where(Holding.portfolio_id.in_(portfolio_ids)).values(weight=holding_weight()),
+        execution_options={"synchronize_session": False}
+    )
+
+def recompute_portfolio_values(session: Session, portfolio_ids: Iterable[str]) -> int:
+    """Recompute total_value and holding weights for the given portfolios.
+    
+    Runs as two set-based UPDATEs per batch of portfolios inside the caller's
+    transaction: totals are summed from holdings, then each holding's weight
+    is its share of the new total. The portfolios' households are refreshed
+    when the transaction commits. Returns the number of portfolios updated.
+    """
+    ids = sorted(set(portfolio_ids))
+    
+    holdings_total = (
+        select(func.coalesce(func.sum(Holding.market_value), 0))
+        .where(Holding.portfolio_id == Portfolio.id)
+        .scalar_subquery()
+    )
+    
+    for batch in _batches(ids):
+        session.execute(
+            update(Portfolio).where(Portfolio.id.in_(batch)).values(total_value=holdings_total),
+            execution_options={"synchronize_session": False}
+        )
+        update_weights(session, batch)
+        refresh_households_on_commit(session, portfolio_ids=batch)
+        invalidate_on_commit(session, "portfolio", batch)
+    
+    return len(ids)